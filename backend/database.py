@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -13,6 +13,28 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def add_missing_columns(bind=engine) -> None:
+    """Add model columns that are missing from existing tables.
+    
+    ``create_all`` never alters tables that already exist, so columns added to
+    a model after the database was created are appended here. New columns
+    must be nullable (or have a server default) for this to work.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                connection.execute(text(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                ))
+
+
 
 
 
@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 """Initialize database with sample data."""
-from backend.database import SessionLocal, engine, Base
+from backend.database import SessionLocal, engine, Base, add_missing_columns
 from backend.models import Material, Problem
+import backend.services.markdown_render  # noqa: F401 - renders material HTML on insert
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+add_missing_columns(engine)
 
 db = SessionLocal()
 
@@ -904,7 +906,7 @@ try:
     
     db.commit()
     print("Problems initialized successfully!")
-    
+
 except Exception as e:
     db.rollback()
     print(f"Error initializing database: {e}")
@@ -1,18 +1,27 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, json as flask_json, stream_with_context
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room, leave_room
 import os
+import time
 import traceback
 from datetime import datetime
 
-from backend.database import engine, SessionLocal, Base
+from backend.database import engine, SessionLocal, Base, add_missing_columns
 from backend.models import Material, Problem
 from backend.services import pair_programming
-from backend.services.notion_sync import notion_service
+from backend.services.notion_sync_worker import notion_sync_worker
+from backend.services.markdown_render import save_stale_renders
+from backend.services.offload import ASYNC_MODE, offload
+from backend.services.pair_chat import CHAT_FLUSH_INTERVAL, ChatArchive
+from backend.services.pair_persistence import PERSIST_INTERVAL, PairSessionPersister
+from backend.services.pair_recording import RECORDING_FLUSH_INTERVAL, SessionRecorder
+from backend.services.presence import PresenceAggregator
 from backend.services.tutor import tutor_service
+from backend.services.tutor_index import LOCAL_INDEX_ENABLED
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+add_missing_columns(engine)
 
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "dev-secret-key-change-in-production")
@@ -25,8 +34,14 @@ CORS(app,
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
      expose_headers=["Content-Type"])
 
-# Initialize SocketIO with CORS support
-socketio = SocketIO(app, cors_allowed_origins=["http://localhost:5173", "http://localhost:5001", "http://127.0.0.1:5173"], async_mode='threading')
+# Initialize SocketIO with CORS support. Flask's JSON encoder is used so
+# session payloads with datetimes serialize the same way as the REST API.
+# With SOCKETIO_MESSAGE_QUEUE set (e.g. redis://localhost:6379/0), emits are
+# relayed through the queue so rooms span every server process. Pair
+# sessions must then be shared too, via SESSION_STORE_URL. SOCKETIO_ASYNC_MODE
+# selects threading (the default) or an event loop; see backend/serve.py.
+socketio = SocketIO(app, cors_allowed_origins=["http://localhost:5173", "http://localhost:5001", "http://127.0.0.1:5173"], async_mode=ASYNC_MODE, json=flask_json,
+                    message_queue=os.getenv("SOCKETIO_MESSAGE_QUEUE"))
 
 # Add explicit OPTIONS handler for all routes
 @app.before_request
@@ -47,6 +62,7 @@ def get_db():
         db.close()
 
 @app.route("/api/materials", methods=["GET"])
+@offload
 def get_materials():
     """Get all materials - no authentication required"""
     # #region agent log
@@ -80,6 +96,12 @@ def get_materials():
         
         materials = query.order_by(Material.order_index, Material.created_at).all()
         
+        content_format = request.args.get("format", "markdown")
+        if content_format not in ("markdown", "html"):
+            return jsonify({"error": "Format must be 'markdown' or 'html'"}), 400
+        # Rebuild missing renders or ones made by an older renderer version
+        rebuilt = content_format == "html" and save_stale_renders(db, materials)
+        
         # #region agent log
         try:
             with open(log_path, 'a') as f:
@@ -88,14 +110,19 @@ def get_materials():
             pass
         # #endregion
         
-        return jsonify([{
+        result = [{
             "id": m.id,
             "title": m.title,
-            "content": m.content,
+            "content": m.content_html if content_format == "html" else m.content,
+            "format": content_format,
             "category": m.category,
             "notion_url": m.notion_url,
             "created_at": m.created_at.isoformat() if m.created_at else None
-        } for m in materials])
+        } for m in materials]
+        if rebuilt:
+            db.commit()
+        
+        return jsonify(result)
     except Exception as e:
         # #region agent log
         try:
@@ -113,6 +140,7 @@ def get_materials():
         db.close()
 
 @app.route("/api/materials/<int:material_id>", methods=["GET"])
+@offload
 def get_material(material_id):
     """Get a specific material - no authentication required"""
     db = SessionLocal()
@@ -121,19 +149,30 @@ def get_material(material_id):
         if not material:
             return jsonify({"error": "Material not found"}), 404
         
-        return jsonify({
+        content_format = request.args.get("format", "markdown")
+        if content_format not in ("markdown", "html"):
+            return jsonify({"error": "Format must be 'markdown' or 'html'"}), 400
+        rebuilt = content_format == "html" and save_stale_renders(db, [material])
+        
+        result = {
             "id": material.id,
             "title": material.title,
-            "content": material.content,
+            "content": material.content_html if content_format == "html" else material.content,
+            "format": content_format,
             "category": material.category,
             "notion_url": material.notion_url,
             "created_at": material.created_at.isoformat() if material.created_at else None
-        })
+        }
+        if rebuilt:
+            db.commit()
+        
+        return jsonify(result)
     finally:
         db.close()
 
 # Categories endpoint
 @app.route("/api/materials/categories", methods=["GET"])
+@offload
 def get_categories():
     """Get all material categories - no authentication required"""
     # #region agent log
@@ -190,28 +229,36 @@ def get_categories():
     finally:
         db.close()
 
-# Notion sync endpoint
+# Notion sync endpoints
 @app.route("/api/materials/sync-notion", methods=["POST"])
 def sync_notion():
-    """Sync materials from Notion database"""
-    import asyncio
-    db = SessionLocal()
+    """Start a background sync from the Notion database and return its job ID"""
     try:
-        # Run async sync in sync context
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(notion_service.sync_to_database(db))
-        loop.close()
+        # An already running sync is returned instead of starting a second one
+        job, created = notion_sync_worker.submit()
         
-        return jsonify(result)
+        return jsonify({
+            "success": True,
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "deduplicated": not created
+        }), 202
     except Exception as e:
         app.logger.error(f"Notion sync error: {str(e)}\n{traceback.format_exc()}")
         return jsonify({"error": str(e), "success": False}), 500
-    finally:
-        db.close()
+
+@app.route("/api/materials/sync-notion/<job_id>", methods=["GET"])
+def get_sync_notion_job(job_id):
+    """Get the progress of a Notion sync job"""
+    job = notion_sync_worker.get_job(job_id)
+    if not job:
+        return jsonify({"error": "Sync job not found"}), 404
+    
+    return jsonify({"success": True, **job})
 
 # Problems API endpoints
 @app.route("/api/problems", methods=["GET"])
+@offload
 def get_problems():
     """Get all problems - no authentication required"""
     db = SessionLocal()
@@ -279,6 +326,7 @@ def get_problems():
         db.close()
 
 @app.route("/api/problems/<int:problem_id>", methods=["GET"])
+@offload
 def get_problem(problem_id):
     """Get a specific problem - no authentication required"""
     db = SessionLocal()
@@ -307,6 +355,7 @@ def get_problem(problem_id):
         db.close()
 
 @app.route("/api/problems/topics", methods=["GET"])
+@offload
 def get_problem_topics():
     """Get all unique topics/tags from problems - no authentication required"""
     db = SessionLocal()
@@ -334,6 +383,7 @@ def get_problem_topics():
         db.close()
 
 @app.route("/api/problems/categories", methods=["GET"])
+@offload
 def get_problem_categories():
     """Get all unique categories from problems - no authentication required"""
     db = SessionLocal()
@@ -348,6 +398,7 @@ def get_problem_categories():
         db.close()
 
 @app.route("/api/problems/difficulties", methods=["GET"])
+@offload
 def get_problem_difficulties():
     """Get all unique difficulty levels from problems - no authentication required"""
     db = SessionLocal()
@@ -362,6 +413,7 @@ def get_problem_difficulties():
         db.close()
 
 @app.route("/api/problems", methods=["POST"])
+@offload
 def create_problem():
     """Create a new problem - no authentication required (for MVP)"""
     try:
@@ -422,6 +474,7 @@ def create_problem():
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/problems/<int:problem_id>", methods=["PUT"])
+@offload
 def update_problem(problem_id):
     """Update a problem - no authentication required (for MVP)"""
     try:
@@ -486,6 +539,7 @@ def update_problem(problem_id):
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/problems/<int:problem_id>", methods=["DELETE"])
+@offload
 def delete_problem(problem_id):
     """Delete a problem - no authentication required (for MVP)"""
     try:
@@ -507,6 +561,7 @@ def delete_problem(problem_id):
 
 # Global Search endpoint - searches across all content types
 @app.route("/api/search", methods=["GET"])
+@offload
 def global_search():
     """Search across materials, problems, and other content - no authentication required"""
     db = SessionLocal()
@@ -939,6 +994,7 @@ def export_work():
 
 # Test Coverage API endpoints
 @app.route("/api/test-coverage", methods=["GET"])
+@offload
 def get_test_coverage():
     """Get test coverage statistics - no authentication required"""
     try:
@@ -1021,6 +1077,7 @@ def get_test_coverage():
         }), 500
 
 @app.route("/api/test-coverage/run", methods=["POST"])
+@offload
 def run_test_coverage():
     """Run tests and generate coverage report - no authentication required"""
     try:
@@ -1053,6 +1110,7 @@ def run_test_coverage():
 
 # Code Execution API endpoints
 @app.route("/api/execute", methods=["POST"])
+@offload
 def execute_code():
     """Execute Python code server-side - no authentication required"""
     try:
@@ -1102,13 +1160,14 @@ def execute_code():
                 "stdout": "",
                 "stderr": str(e)
             }), 400
-            
+    
     except Exception as e:
         app.logger.error(f"Code execution error: {str(e)}\n{traceback.format_exc()}")
         return jsonify({"error": str(e)}), 500
 
 # Problem Submission API endpoints
 @app.route("/api/problems/<int:problem_id>/submit", methods=["POST"])
+@offload
 def submit_problem_solution(problem_id):
     """Submit and validate a solution for a problem - no authentication required"""
     try:
@@ -1239,7 +1298,7 @@ except Exception as e:
             })
         finally:
             db.close()
-            
+    
     except Exception as e:
         app.logger.error(f"Problem submission error: {str(e)}\n{traceback.format_exc()}")
         return jsonify({"error": str(e)}), 500
@@ -1409,26 +1468,42 @@ def url_decode():
         return jsonify({"error": str(e)}), 500
 
 # Tutor API endpoints
+# Answer from course materials and problems before searching the web, keeping
+# the index current as they are written (see services/tutor_index.py)
+if LOCAL_INDEX_ENABLED:
+    tutor_service.local_index.watch(SessionLocal)
+
+def _parse_tutor_question(data):
+    """Return the (question, language) of a tutor request, or raise ValueError"""
+    question = data.get("question", "").strip()
+    language = data.get("language", "Python").strip()
+    
+    if not question:
+        raise ValueError("Question is required")
+    
+    if len(question) > 1000:
+        raise ValueError("Question must be 1000 characters or less")
+    
+    if not language:
+        raise ValueError("Language is required")
+    
+    if len(language) > 50:
+        raise ValueError("Language name must be 50 characters or less")
+    
+    return question, language
+
+def _sse(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {flask_json.dumps(data)}\n\n"
+
 @app.route("/api/tutor/ask", methods=["POST"])
 def ask_tutor():
     """Ask the AI tutor a question about a programming language"""
     try:
-        data = request.json or {}
-        question = data.get("question", "").strip()
-        language = data.get("language", "Python").strip()
-        
-        # Validation
-        if not question:
-            return jsonify({"error": "Question is required"}), 400
-        
-        if len(question) > 1000:
-            return jsonify({"error": "Question must be 1000 characters or less"}), 400
-        
-        if not language:
-            return jsonify({"error": "Language is required"}), 400
-        
-        if len(language) > 50:
-            return jsonify({"error": "Language name must be 50 characters or less"}), 400
+        try:
+            question, language = _parse_tutor_question(request.json or {})
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         # Generate tutor response
         result = tutor_service.create_tutor_response(question, language)
@@ -1439,15 +1514,40 @@ def ask_tutor():
         return jsonify({
             "success": True,
             "session_id": result["session_id"],
-            "markdown": result["markdown"]
+            "markdown": result["markdown"],
+            "search": result["search"]
         })
     except Exception as e:
         app.logger.error(f"Tutor ask error: {str(e)}\n{traceback.format_exc()}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/tutor/ask/stream", methods=["POST"])
+def ask_tutor_stream():
+    """Ask the AI tutor, streaming the answer as Server-Sent Events section by section"""
+    started = time.perf_counter()
+    try:
+        try:
+            question, language = _parse_tutor_question(request.json or {})
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        def generate():
+            try:
+                for event, data in tutor_service.stream_tutor_response(question, language, started=started):
+                    yield _sse(event, data)
+            except Exception as e:
+                app.logger.error(f"Tutor stream error: {str(e)}\n{traceback.format_exc()}")
+                yield _sse("error", {"error": str(e)})
+        
+        return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    except Exception as e:
+        app.logger.error(f"Tutor stream error: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route("/api/tutor/feedback", methods=["POST"])
 def tutor_feedback():
-    """Provide feedback (like/dislike) and delete the markdown file"""
+    """Provide feedback (like/dislike) and discard the stored answer"""
     try:
         data = request.json or {}
         session_id = data.get("session_id", "").strip()
@@ -1459,18 +1559,39 @@ def tutor_feedback():
         if feedback not in ["like", "dislike"]:
             return jsonify({"error": "Feedback must be 'like' or 'dislike'"}), 400
         
-        # Delete the markdown file
-        deleted = tutor_service.delete_tutor_file(session_id)
+        answer = tutor_service.discard_response(session_id)
+        if answer is not None:
+            app.logger.info(f"Tutor feedback {feedback} for {answer['language']} question: {answer['question'][:100]}")
         
         return jsonify({
             "success": True,
-            "deleted": deleted,
+            "deleted": answer is not None,
             "message": "Thank you for your feedback!"
         })
     except Exception as e:
         app.logger.error(f"Tutor feedback error: {str(e)}\n{traceback.format_exc()}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/tutor/metrics", methods=["GET"])
+def tutor_metrics():
+    """Local index, web search, circuit breaker, search cache, request coalescing, answer store, streaming and example counters for the tutor"""
+    try:
+        cache = tutor_service.search_cache
+        return jsonify({
+            "success": True,
+            "local_index": tutor_service.local_index.get_stats(),
+            "search": dict(tutor_service.search_stats),
+            "breaker": tutor_service.breaker.get_stats(),
+            "search_cache": dict(cache.stats, size=len(cache), max_size=cache.maxsize),
+            "single_flight": tutor_service.get_flight_stats(),
+            "responses": tutor_service.responses.get_stats(),
+            "streaming": tutor_service.get_stream_stats(),
+            "examples": tutor_service.examples.get_stats()
+        })
+    except Exception as e:
+        app.logger.error(f"Tutor metrics error: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": str(e)}), 500
+
 # Learning Paths API endpoints
 @app.route("/api/learning-paths", methods=["GET"])
 def get_learning_paths():
@@ -2055,6 +2176,42 @@ if __name__ == '__main__':
     return jsonify(template)
 
 # Pair Programming API Endpoints
+# Changed sessions are snapshotted to the database in the background and
+# restored on first access after a restart (see services/pair_persistence.py)
+pair_persister = PairSessionPersister()
+if PERSIST_INTERVAL > 0:
+    pair_programming.persistence = pair_persister
+# Every code edit is also recorded, so sessions can be replayed later
+# (see services/pair_recording.py)
+pair_recorder = SessionRecorder()
+if RECORDING_FLUSH_INTERVAL > 0:
+    pair_programming.recorder = pair_recorder
+# Chat messages pushed out of a session's buffer are archived for paging back
+# (see services/pair_chat.py)
+chat_archive = ChatArchive()
+if CHAT_FLUSH_INTERVAL > 0:
+    pair_programming.chat_archive = chat_archive
+
+def _start_pair_workers():
+    """Start the background writers for pair sessions, once"""
+    pair_persister.start(socketio.start_background_task, socketio.sleep)
+    pair_recorder.start(socketio.start_background_task, socketio.sleep)
+    chat_archive.start(socketio.start_background_task, socketio.sleep)
+
+def _chat_message_json(message):
+    """Format a chat message for clients"""
+    return {**message, "timestamp": message["timestamp"].isoformat()}
+
+def _parse_chat_page(before, limit):
+    """Validate chat paging parameters, returning (before, limit) or raising ValueError"""
+    before = int(before) if before not in (None, "") else None
+    limit = int(limit) if limit not in (None, "") else 50
+    if before is not None and before < 1:
+        raise ValueError("before must be positive")
+    if limit < 1 or limit > 200:
+        raise ValueError("limit must be between 1 and 200")
+    return before, limit
+
 @app.route("/api/pair-programming/create", methods=["POST"])
 def create_pair_session():
     """Create a new pair programming session"""
@@ -2074,8 +2231,9 @@ def create_pair_session():
             except (ValueError, TypeError):
                 return jsonify({"error": "Invalid user_id"}), 400
         
+        _start_pair_workers()
         session_id = pair_programming.create_session(host_user_id, host_username)
-        session = pair_programming.get_session(session_id)
+        session = pair_programming.get_summary(session_id)
         
         if not session:
             return jsonify({"error": "Failed to create session"}), 500
@@ -2098,7 +2256,7 @@ def create_pair_session():
 def get_pair_session(session_id):
     """Get pair programming session data"""
     try:
-        session = pair_programming.get_session(session_id)
+        session = pair_programming.get_summary(session_id)
         if not session:
             return jsonify({"error": "Session not found"}), 404
         
@@ -2156,7 +2314,7 @@ def list_pair_sessions():
             sessions_list.append({
                 "session_id": session_id,
                 "host_username": session.get("host_username", "Host"),
-                "participant_count": len(session.get("participants", [])),
+                "participant_count": session.get("participant_count", 0),
                 "created_at": session.get("created_at").isoformat() if session.get("created_at") else None,
                 "expires_at": session.get("expires_at").isoformat() if session.get("expires_at") else None
             })
@@ -2170,7 +2328,144 @@ def list_pair_sessions():
         app.logger.error(f"List sessions error: {str(e)}\n{traceback.format_exc()}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/pair-programming/metrics", methods=["GET"])
+def pair_session_metrics():
+    """Memory, presence, persistence, recording and chat metrics for pair programming sessions"""
+    try:
+        return jsonify({
+            "success": True,
+            "memory": pair_programming.get_memory_stats(),
+            "presence": dict(presence_aggregator.stats),
+            "persistence": dict(pair_persister.stats),
+            "recording": dict(pair_recorder.stats),
+            "chat_archive": dict(chat_archive.stats)
+        })
+    except Exception as e:
+        app.logger.error(f"Session metrics error: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/pair-programming/<session_id>/messages", methods=["GET"])
+@offload
+def get_pair_messages(session_id):
+    """Page back through a session's chat, using the cursor from the previous page"""
+    try:
+        try:
+            before, limit = _parse_chat_page(request.args.get("before"), request.args.get("limit"))
+        except (ValueError, TypeError) as e:
+            return jsonify({"error": f"Invalid paging parameters: {e}"}), 400
+        
+        page = pair_programming.get_messages(session_id, before, limit)
+        if page is None:
+            return jsonify({"error": "Session not found"}), 404
+        
+        return jsonify({
+            "success": True,
+            "messages": [_chat_message_json(m) for m in page["messages"]],
+            "cursor": page["cursor"]
+        })
+    except Exception as e:
+        app.logger.error(f"Get messages error: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/pair-programming/<session_id>/recording", methods=["GET"])
+@offload
+def get_pair_recording(session_id):
+    """List the recorded segments of a pair programming session"""
+    try:
+        segments = pair_recorder.get_timeline(session_id)
+        if not segments:
+            return jsonify({"error": "No recording found"}), 404
+        
+        return jsonify({
+            "success": True,
+            "start_time": segments[0]["start_time"].isoformat(),
+            "end_time": segments[-1]["end_time"].isoformat(),
+            "revision": segments[-1]["end_revision"],
+            "segments": [
+                {
+                    **segment,
+                    "start_time": segment["start_time"].isoformat(),
+                    "end_time": segment["end_time"].isoformat()
+                }
+                for segment in segments
+            ]
+        })
+    except Exception as e:
+        app.logger.error(f"Get recording error: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/pair-programming/<session_id>/recording/seek", methods=["GET"])
+@offload
+def seek_pair_recording(session_id):
+    """Get the code of a recorded session as it was at a given time"""
+    try:
+        try:
+            at = datetime.fromisoformat(request.args.get("at", ""))
+        except ValueError:
+            return jsonify({"error": "Invalid time, expected ISO 8601"}), 400
+        
+        state = pair_recorder.seek(session_id, at)
+        if not state:
+            return jsonify({"error": "No recording at that time"}), 404
+        
+        return jsonify({
+            "success": True,
+            "code": state["code"],
+            "revision": state["revision"],
+            "timestamp": state["timestamp"].isoformat()
+        })
+    except Exception as e:
+        app.logger.error(f"Seek recording error: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/pair-programming/<session_id>/recording/edits", methods=["GET"])
+@offload
+def get_pair_recording_edits(session_id):
+    """Get recorded edits after a revision, for playing a session forward"""
+    try:
+        try:
+            after_revision = int(request.args.get("after_revision", 0))
+            limit = int(request.args.get("limit", 500))
+            if after_revision < 0:
+                return jsonify({"error": "after_revision must not be negative"}), 400
+            if limit < 1 or limit > 2000:
+                return jsonify({"error": "limit must be between 1 and 2000"}), 400
+        except (ValueError, TypeError):
+            return jsonify({"error": "Invalid after_revision or limit"}), 400
+        
+        edits = pair_recorder.get_edits(session_id, after_revision, limit)
+        return jsonify({
+            "success": True,
+            "edits": [{**edit, "timestamp": edit["timestamp"].isoformat()} for edit in edits]
+        })
+    except Exception as e:
+        app.logger.error(f"Get recording edits error: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": str(e)}), 500
+
 # WebSocket Events for Pair Programming
+# Cursor, selection and typing events are coalesced per room and broadcast
+# in batches as 'presence_updated' (see backend/services/presence.py)
+presence_aggregator = PresenceAggregator(
+    lambda room, payload: socketio.emit('presence_updated', payload, room=room)
+)
+
+def _queue_presence(session_id, **fields):
+    """Queue a presence update from the current socket"""
+    presence_aggregator.start(socketio.start_background_task, socketio.sleep)
+    presence_aggregator.update(session_id, request.sid, **fields)
+
+def _on_sessions_reaped(reaped):
+    """Tell rooms about expired sessions and participants dropped for inactivity"""
+    for session_id in reaped['sessions']:
+        socketio.emit('session_expired', {'session_id': session_id}, room=session_id)
+        socketio.close_room(session_id)
+    for session_id, socket_ids in reaped['participants'].items():
+        for socket_id in socket_ids:
+            presence_aggregator.discard(session_id, socket_id)
+        socketio.emit('participant_left', {
+            'participants': pair_programming.get_participants(session_id)
+        }, room=session_id)
+
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection"""
@@ -2179,7 +2474,15 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection"""
-    pass
+    try:
+        # Remove the socket from every session it joined and tell the rooms
+        for session_id in pair_programming.disconnect_socket(request.sid):
+            presence_aggregator.discard(session_id, request.sid)
+            emit('participant_left', {
+                'participants': pair_programming.get_participants(session_id)
+            }, room=session_id, include_self=False)
+    except Exception as e:
+        app.logger.error(f"Disconnect error: {str(e)}\n{traceback.format_exc()}")
 
 @socketio.on('join_session')
 def handle_join_session(data):
@@ -2193,8 +2496,10 @@ def handle_join_session(data):
             emit('error', {'message': 'Session ID required'})
             return
         
-        session = pair_programming.get_session(session_id)
-        if not session:
+        pair_programming.start_reaper(socketio.start_background_task, socketio.sleep, _on_sessions_reaped)
+        _start_pair_workers()
+        
+        if not pair_programming.session_exists(session_id):
             emit('error', {'message': 'Session not found'})
             return
         
@@ -2203,21 +2508,29 @@ def handle_join_session(data):
         if success:
             join_room(session_id)
             
-            # Send current session state
-            session = pair_programming.get_session(session_id)
+            # Send current session state. The code is the last compacted
+            # snapshot; the client applies the operations after it to catch up.
+            state = pair_programming.get_join_state(session_id)
+            if not state:
+                emit('error', {'message': 'Session not found'})
+                return
             emit('session_state', {
-                'code': session['code'],
-                'output': session['output'],
-                'participants': session['participants'],
-                'messages': session.get('messages', [])[-50:],  # Last 50 messages
-                'cursors': session.get('cursors', {}),
-                'selections': session.get('selections', {})
+                'code': state['code'],
+                'revision': state['snapshot_revision'],
+                'operations': state['operations'],
+                'output': state['output'],
+                'participants': state['participants'],
+                # Latest chat messages; older pages are fetched with chat_history
+                'messages': [_chat_message_json(m) for m in state['messages']],
+                'chat_cursor': state['chat_cursor'],
+                'cursors': state['cursors'],
+                'selections': state['selections']
             })
             
             # Notify others
             emit('participant_joined', {
                 'username': username,
-                'participants': session['participants']
+                'participants': state['participants']
             }, room=session_id, include_self=False)
         else:
             emit('error', {'message': 'Failed to join session'})
@@ -2232,20 +2545,58 @@ def handle_leave_session(data):
         session_id = data.get('session_id')
         if session_id:
             pair_programming.remove_participant(session_id, request.sid)
+            presence_aggregator.discard(session_id, request.sid)
             leave_room(session_id)
             
             # Notify others
-            session = pair_programming.get_session(session_id)
-            if session:
+            if pair_programming.session_exists(session_id):
                 emit('participant_left', {
-                    'participants': session['participants']
+                    'participants': pair_programming.get_participants(session_id)
                 }, room=session_id, include_self=False)
     except Exception as e:
         app.logger.error(f"Leave session error: {str(e)}\n{traceback.format_exc()}")
 
+def _broadcast_code_operation(session_id, entry, username):
+    """Send an accepted operation to everyone in the session except the sender"""
+    emit('code_operation', {
+        'revision': entry['revision'],
+        'ops': entry['ops'],
+        'from': pair_programming.get_username(session_id, request.sid) or username,
+        'socket_id': request.sid
+    }, room=session_id, include_self=False)
+
+@socketio.on('code_operation')
+def handle_code_operation(data):
+    """Handle an edit sent as a text operation against a known revision"""
+    try:
+        session_id = data.get('session_id')
+        revision = data.get('revision')
+        ops = data.get('ops')
+        
+        if not session_id or ops is None:
+            return
+        
+        try:
+            entry = pair_programming.apply_code_operation(session_id, revision, ops, request.sid)
+        except ValueError as e:
+            # The client's document has diverged; send it the current state
+            code_state = pair_programming.get_code_state(session_id)
+            if code_state:
+                emit('code_resync', {**code_state, 'reason': str(e)})
+            return
+        
+        if entry is None:
+            emit('error', {'message': 'Session not found'})
+            return
+        
+        emit('code_ack', {'revision': entry['revision']})
+        _broadcast_code_operation(session_id, entry, data.get('username', 'Anonymous'))
+    except Exception as e:
+        app.logger.error(f"Code operation error: {str(e)}\n{traceback.format_exc()}")
+
 @socketio.on('code_change')
 def handle_code_change(data):
-    """Handle code changes from clients"""
+    """Handle full-text code changes from clients that don't send operations"""
     try:
         session_id = data.get('session_id')
         code = data.get('code')
@@ -2253,14 +2604,10 @@ def handle_code_change(data):
         if not session_id or code is None:
             return
         
-        # Update session code
-        pair_programming.update_session_code(session_id, code)
-        
-        # Broadcast to all participants except sender
-        emit('code_updated', {
-            'code': code,
-            'from': data.get('username', 'Anonymous')
-        }, room=session_id, include_self=False)
+        # Record the change as an operation and broadcast only the delta
+        entry = pair_programming.update_session_code(session_id, code)
+        if entry:
+            _broadcast_code_operation(session_id, entry, data.get('username', 'Anonymous'))
     except Exception as e:
         app.logger.error(f"Code change error: {str(e)}\n{traceback.format_exc()}")
 
@@ -2291,24 +2638,7 @@ def handle_cursor_change(data):
         session_id = data.get('session_id')
         position = data.get('position')
         if session_id and position:
-            # Update cursor in session
-            pair_programming.update_cursor(session_id, request.sid, position)
-            
-            # Get username from participants
-            session = pair_programming.get_session(session_id)
-            username = 'Anonymous'
-            if session:
-                for p in session.get('participants', []):
-                    if p.get('socket_id') == request.sid:
-                        username = p.get('username', 'Anonymous')
-                        break
-            
-            # Broadcast cursor position to others
-            emit('cursor_updated', {
-                'position': position,
-                'username': username,
-                'socket_id': request.sid
-            }, room=session_id, include_self=False)
+            _queue_presence(session_id, position=position)
     except Exception as e:
         app.logger.error(f"Cursor change error: {str(e)}\n{traceback.format_exc()}")
 
@@ -2317,26 +2647,8 @@ def handle_selection_change(data):
     """Handle code selection changes"""
     try:
         session_id = data.get('session_id')
-        selection = data.get('selection')
         if session_id:
-            # Update selection in session
-            pair_programming.update_selection(session_id, request.sid, selection)
-            
-            # Get username from participants
-            session = pair_programming.get_session(session_id)
-            username = 'Anonymous'
-            if session:
-                for p in session.get('participants', []):
-                    if p.get('socket_id') == request.sid:
-                        username = p.get('username', 'Anonymous')
-                        break
-            
-            # Broadcast selection to others
-            emit('selection_updated', {
-                'selection': selection,
-                'username': username,
-                'socket_id': request.sid
-            }, room=session_id, include_self=False)
+            _queue_presence(session_id, selection=data.get('selection'))
     except Exception as e:
         app.logger.error(f"Selection change error: {str(e)}\n{traceback.format_exc()}")
 
@@ -2352,39 +2664,48 @@ def handle_chat_message(data):
             return
         
         # Store message in session
-        pair_programming.add_message(session_id, username, message, request.sid)
+        entry = pair_programming.add_message(session_id, username, message, request.sid)
+        if not entry:
+            return
         
         # Broadcast chat message to all participants
-        emit('chat_message', {
-            'id': f"{session_id}-{int(__import__('time').time() * 1000)}",
-            'username': username,
-            'message': message,
-            'timestamp': data.get('timestamp', __import__('datetime').datetime.now().isoformat())
-        }, room=session_id)
+        emit('chat_message', _chat_message_json(entry), room=session_id)
     except Exception as e:
         app.logger.error(f"Chat message error: {str(e)}\n{traceback.format_exc()}")
 
+@socketio.on('chat_history')
+def handle_chat_history(data):
+    """Send the requesting client a page of older chat messages"""
+    try:
+        session_id = data.get('session_id')
+        if not session_id:
+            return
+        
+        try:
+            before, limit = _parse_chat_page(data.get('before'), data.get('limit'))
+        except (ValueError, TypeError) as e:
+            emit('error', {'message': f'Invalid chat history request: {e}'})
+            return
+        
+        page = pair_programming.get_messages(session_id, before, limit)
+        if page is None:
+            emit('error', {'message': 'Session not found'})
+            return
+        
+        emit('chat_history', {
+            'messages': [_chat_message_json(m) for m in page['messages']],
+            'cursor': page['cursor']
+        })
+    except Exception as e:
+        app.logger.error(f"Chat history error: {str(e)}\n{traceback.format_exc()}")
+
 @socketio.on('typing_start')
 def handle_typing_start(data):
     """Handle typing start indicator"""
     try:
         session_id = data.get('session_id')
         if session_id:
-            # Update typing status in session
-            pair_programming.set_typing(session_id, request.sid, True)
-            
-            # Get username from participants
-            session = pair_programming.get_session(session_id)
-            username = 'Anonymous'
-            if session:
-                for p in session.get('participants', []):
-                    if p.get('socket_id') == request.sid:
-                        username = p.get('username', 'Anonymous')
-                        break
-            
-            emit('typing_start', {
-                'username': username
-            }, room=session_id, include_self=False)
+            _queue_presence(session_id, is_typing=True)
     except Exception as e:
         app.logger.error(f"Typing start error: {str(e)}\n{traceback.format_exc()}")
 
@@ -2394,23 +2715,13 @@ def handle_typing_stop(data):
     try:
         session_id = data.get('session_id')
         if session_id:
-            # Update typing status in session
-            pair_programming.set_typing(session_id, request.sid, False)
-            
-            # Get username from participants
-            session = pair_programming.get_session(session_id)
-            username = 'Anonymous'
-            if session:
-                for p in session.get('participants', []):
-                    if p.get('socket_id') == request.sid:
-                        username = p.get('username', 'Anonymous')
-                        break
-            
-            emit('typing_stop', {
-                'username': username
-            }, room=session_id, include_self=False)
+            _queue_presence(session_id, is_typing=False)
     except Exception as e:
         app.logger.error(f"Typing stop error: {str(e)}\n{traceback.format_exc()}")
 
 if __name__ == "__main__":
+    # Periodic Notion sync, enabled by setting NOTION_SYNC_INTERVAL (seconds).
+    # Only the serving process schedules it, not the debug reloader's watcher.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        notion_sync_worker.start_schedule()
     socketio.run(app, debug=True, port=5001, allow_unsafe_werkzeug=True)
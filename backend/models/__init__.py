@@ -1,7 +1,8 @@
 from .student import Student
 from .material import Material
 from .problem import Problem
+from .pair_session import PairSessionSnapshot, PairRecordingSegment, PairChatMessage
 
-__all__ = ["Student", "Material", "Problem"]
+__all__ = ["Student", "Material", "Problem", "PairSessionSnapshot", "PairRecordingSegment", "PairChatMessage"]
 
 
@@ -11,6 +11,9 @@ class Material(Base):
     content = Column(Text)  # Markdown or HTML content
     notion_page_id = Column(String, unique=True, index=True)  # Notion page ID if synced
     notion_url = Column(String)  # Original Notion URL
+    content_hash = Column(String(32))  # BLAKE2 digest of synced title, category and content
+    content_html = Column(Text)  # Sanitized HTML rendered from content
+    html_render_version = Column(Integer)  # Renderer version that produced content_html
     category = Column(String)  # e.g., "Python", "Web Dev", etc.
     order_index = Column(Integer, default=0)  # For ordering materials
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -18,14 +21,3 @@ class Material(Base):
     
     def __repr__(self):
         return f"<Material(id={self.id}, title={self.title[:50]})>"
-
-
-
-
-
-
-
-
-
-
-
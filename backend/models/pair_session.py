@@ -0,0 +1,44 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, LargeBinary, Index
+from sqlalchemy.sql import func
+from backend.database import Base
+
+class PairSessionSnapshot(Base):
+    __tablename__ = "pair_session_snapshots"
+    
+    session_id = Column(String, primary_key=True)
+    revision = Column(Integer, nullable=False, default=0)  # Code revision at snapshot time
+    state = Column(Text, nullable=False)  # Session fields encoded by session_store.encode_value
+    expires_at = Column(DateTime, index=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<PairSessionSnapshot(session_id={self.session_id}, revision={self.revision})>"
+
+class PairRecordingSegment(Base):
+    # A run of recorded edits that starts from a full copy of the code
+    __tablename__ = "pair_recording_segments"
+    __table_args__ = (Index("ix_pair_recording_segments_session_time", "session_id", "start_time"),)
+    
+    session_id = Column(String, primary_key=True)
+    base_revision = Column(Integer, primary_key=True)  # Revision of the checkpoint
+    end_revision = Column(Integer, nullable=False)  # Revision after the last edit
+    start_time = Column(DateTime, nullable=False)  # Time of the first edit
+    end_time = Column(DateTime, nullable=False, index=True)  # Time of the last edit
+    checkpoint = Column(Text, nullable=False)  # Code at base_revision
+    data = Column(LargeBinary, nullable=False)  # zlib-compressed JSON list of edits
+    
+    def __repr__(self):
+        return f"<PairRecordingSegment(session_id={self.session_id}, revisions={self.base_revision}-{self.end_revision})>"
+
+class PairChatMessage(Base):
+    # Chat messages that no longer fit in a session's in-memory buffer
+    __tablename__ = "pair_chat_messages"
+    
+    session_id = Column(String, primary_key=True)
+    seq = Column(Integer, primary_key=True)  # Message id, increasing within a session
+    username = Column(String, nullable=False)
+    message = Column(Text, nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f"<PairChatMessage(session_id={self.session_id}, seq={self.seq})>"
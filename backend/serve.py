@@ -0,0 +1,53 @@
+"""
+Production entry point for the API and Socket.IO server.
+
+The development server started by ``python -m backend.main`` runs one OS
+thread per connected client. This entry point serves every client from a
+single event loop instead, so a host can hold thousands of pair-programming
+connections:
+    
+    SOCKETIO_ASYNC_MODE=gevent python -m backend.serve
+
+SOCKETIO_ASYNC_MODE may be gevent (the default here), eventlet or threading.
+Blocking calls in request handlers go through backend.services.offload.
+"""
+import os
+import signal
+import sys
+
+ASYNC_MODE = os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'gevent')
+
+# The standard library must be patched before anything else imports it
+if ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+elif ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+
+from backend.main import app, socketio, notion_sync_worker  # noqa: E402
+
+
+def _exit_on_sigterm():
+    """Exit normally on SIGTERM so atexit handlers (pair session flush) run."""
+    if ASYNC_MODE == 'gevent':
+        # A plain signal handler raises SystemExit in whichever greenlet is
+        # running, where a request handler can swallow it. gevent runs this
+        # in its own greenlet and re-raises SystemExit in the main one.
+        import gevent
+        gevent.signal_handler(signal.SIGTERM, sys.exit, 0)
+    else:
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+
+def main():
+    host = os.getenv('HOST', '0.0.0.0')
+    port = int(os.getenv('PORT', '5001'))
+    notion_sync_worker.start_schedule()
+    _exit_on_sigterm()
+    print(f"Serving on {host}:{port} with async mode {socketio.async_mode}")
+    socketio.run(app, host=host, port=port, allow_unsafe_werkzeug=ASYNC_MODE == 'threading')
+
+
+if __name__ == "__main__":
+    main()
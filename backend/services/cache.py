@@ -0,0 +1,98 @@
+"""
+Bounded in-memory cache with per-entry expiry and LRU eviction.
+"""
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Thread-safe mapping that keeps at most ``maxsize`` entries.
+    
+    Each entry expires ``ttl`` seconds after it was set (the cache default
+    unless given per entry). When full, the least recently used entry is
+    evicted, and passed to ``on_evict(key, value, expires)`` if given.
+    Expired entries are dropped when they are read, reach the LRU end or
+    ``purge_expired`` runs.
+    """
+    
+    def __init__(self, maxsize: int = 512, ttl: float = 3600, clock: Callable[[], float] = time.monotonic,
+                 on_evict: Optional[Callable[[Hashable, Any, float], None]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.on_evict = on_evict
+        self._lock = Lock()
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()  # key -> (expires, value)
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value for ``key`` and mark it recently used."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.stats['misses'] += 1
+                return default
+            if item[0] <= self.clock():
+                del self._data[key]
+                self.stats['expirations'] += 1
+                self.stats['misses'] += 1
+                return default
+            self._data.move_to_end(key)
+            self.stats['hits'] += 1
+            return item[1]
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store ``value``, evicting the least recently used entries if full."""
+        if self.maxsize <= 0:
+            return
+        evicted = []
+        with self._lock:
+            now = self.clock()
+            self._data[key] = (now + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                old_key, (expires, old_value) = self._data.popitem(last=False)
+                if expires <= now:
+                    self.stats['expirations'] += 1
+                else:
+                    self.stats['evictions'] += 1
+                    evicted.append((old_key, old_value, expires))
+        if self.on_evict is not None:
+            for old_key, old_value, expires in evicted:
+                self.on_evict(old_key, old_value, expires)
+    
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove ``key`` and return its value, even if it has expired."""
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[1]
+    
+    def purge_expired(self) -> int:
+        """Drop every expired entry and return how many there were."""
+        with self._lock:
+            now = self.clock()
+            expired = [key for key, (expires, _) in self._data.items() if expires <= now]
+            for key in expired:
+                del self._data[key]
+            self.stats['expirations'] += len(expired)
+            return len(expired)
+    
+    def values(self) -> list:
+        """Snapshot of the values that have not expired."""
+        with self._lock:
+            now = self.clock()
+            return [value for expires, value in self._data.values() if expires > now]
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            item = self._data.get(key)
+            return item is not None and item[0] > self.clock()
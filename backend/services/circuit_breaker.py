@@ -0,0 +1,123 @@
+"""
+Circuit breaker for calls to flaky external services.
+
+While a service keeps failing or answering slowly, callers are better served
+by an immediate fallback than by waiting out every timeout. The breaker
+watches a rolling window of recent calls and opens when too many of them
+went wrong. After a cooldown, it lets a single probe call through
+(half-open) and closes again if that call succeeds.
+"""
+import time
+from collections import deque
+from datetime import datetime
+from threading import Lock
+from typing import Any, Callable, Dict
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+TRANSITION_HISTORY = 20
+
+
+class CircuitBreaker:
+    """Tracks call outcomes and decides whether the next call may go ahead.
+    
+    A call counts as failed if the caller reports an error or it took longer
+    than ``slow_call`` seconds. The breaker opens once at least ``min_calls``
+    calls in the last ``window`` seconds were recorded and ``failure_rate``
+    of them failed.
+    """
+    
+    def __init__(self, name: str, window: float = 60, min_calls: int = 5, failure_rate: float = 0.5,
+                 slow_call: float = 5, cooldown: float = 30, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = CLOSED
+        self._lock = Lock()
+        self._calls = deque()  # (finished_at, failed)
+        self._opened_at = 0.0
+        self._probing = False
+        self.transitions = deque(maxlen=TRANSITION_HISTORY)
+        self.stats = {'allowed': 0, 'rejected': 0, 'successes': 0, 'failures': 0, 'slow_calls': 0, 'opened': 0}
+    
+    def _trim(self, now: float):
+        while self._calls and self._calls[0][0] <= now - self.window:
+            self._calls.popleft()
+    
+    def _transition(self, state: str, reason: str):
+        self.transitions.append({
+            'from': self.state,
+            'to': state,
+            'reason': reason,
+            'at': datetime.now().isoformat()
+        })
+        print(f"Circuit breaker {self.name}: {self.state} -> {state} ({reason})")
+        self.state = state
+    
+    def _open(self, now: float, reason: str):
+        self._opened_at = now
+        self._probing = False
+        self.stats['opened'] += 1
+        self._transition(OPEN, reason)
+    
+    def allow(self) -> bool:
+        """Return whether a call may go ahead; the caller must then ``record`` it."""
+        with self._lock:
+            if self.state == OPEN:
+                if self.clock() - self._opened_at < self.cooldown:
+                    self.stats['rejected'] += 1
+                    return False
+                self._transition(HALF_OPEN, 'cooldown elapsed')
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    self.stats['rejected'] += 1
+                    return False
+                self._probing = True
+            self.stats['allowed'] += 1
+            return True
+    
+    def record(self, failed: bool, duration: float = 0.0):
+        """Record the outcome of a call that ``allow`` let through."""
+        with self._lock:
+            now = self.clock()
+            slow = duration >= self.slow_call
+            failed = failed or slow
+            self.stats['failures' if failed else 'successes'] += 1
+            if slow:
+                self.stats['slow_calls'] += 1
+            
+            if self.state == HALF_OPEN:
+                if failed:
+                    self._open(now, 'probe call slow' if slow else 'probe call failed')
+                else:
+                    self._probing = False
+                    self._calls.clear()
+                    self._transition(CLOSED, 'probe call succeeded')
+                return
+            if self.state == OPEN:
+                return  # A call started before the breaker opened
+            
+            self._calls.append((now, failed))
+            self._trim(now)
+            failures = sum(1 for _, call_failed in self._calls if call_failed)
+            if len(self._calls) >= self.min_calls and failures >= self.failure_rate * len(self._calls):
+                self._open(now, f'{failures} of {len(self._calls)} calls failed')
+                self._calls.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """State, counters and recent transitions."""
+        with self._lock:
+            self._trim(self.clock())
+            return dict(
+                self.stats,
+                state=self.state,
+                window_calls=len(self._calls),
+                window_failures=sum(1 for _, failed in self._calls if failed),
+                transitions=list(self.transitions)
+            )
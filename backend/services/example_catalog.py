@@ -0,0 +1,151 @@
+"""
+Catalog of code examples shown in tutor answers.
+
+Examples live as plain source files under ``tutor_examples/<language>/<topic>.<ext>``,
+and ``tutor_examples/catalog.json`` lists the topics with the question
+keywords that select them. Everything is read once at startup. A question is
+matched against every topic with one compiled pattern, scanning each distinct
+word once; the topic whose keywords occur most often wins, earlier topics
+winning ties.
+
+Extra directories with the same layout can be listed in
+``TUTOR_EXAMPLES_DIR``: their examples are added to (or replace) the built-in
+ones, and topics in their ``catalog.json`` are added after the built-in ones
+(or replace the keywords of a topic with the same name).
+"""
+import json
+import os
+import re
+from collections import Counter
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+BUILTIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tutor_examples')
+EXTRA_DIRS = [path for path in os.getenv('TUTOR_EXAMPLES_DIR', '').split(os.pathsep) if path]
+CATALOG_FILE = 'catalog.json'
+NO_EXAMPLE = "# Code example here"
+WORD_CACHE_SIZE = 10000  # Distinct question words whose topics are remembered
+
+
+def _keyword_pattern(keyword: str) -> str:
+    """``word`` matches the whole word only, ``word*`` any word starting with it."""
+    if keyword.endswith('*'):
+        return re.escape(keyword[:-1]) + r'\w*'
+    return re.escape(keyword) + r'\b'
+
+
+class ExampleCatalog:
+    """Code examples by (language, topic), with the keywords that pick a topic."""
+    
+    def __init__(self, directories: Iterable[str]):
+        self.directories: List[str] = []
+        self.fallback_language = "python"
+        self.default_topic = "basics"
+        self.aliases: Dict[str, str] = {}
+        self.topics: Dict[str, List[str]] = {}  # topic -> keywords, in order of preference for ties
+        self.examples: Dict[Tuple[str, str], str] = {}
+        for directory in directories:
+            self._load(directory)
+        self._topic_names = list(self.topics)
+        self._matcher = self._compile()
+        self._word_topics: Dict[str, Tuple[int, ...]] = {}  # word -> indexes of the topics its keywords belong to
+        self._lock = Lock()
+        self.matches = Counter(dict.fromkeys(self._topic_names + [self.default_topic], 0))  # topic -> times picked
+    
+    def _load(self, directory: str):
+        if not os.path.isdir(directory):
+            print(f"Tutor examples directory not found: {directory}")
+            return
+        self.directories.append(directory)
+        catalog_path = os.path.join(directory, CATALOG_FILE)
+        if os.path.exists(catalog_path):
+            try:
+                with open(catalog_path, encoding='utf-8') as f:
+                    catalog = json.load(f)
+                self.fallback_language = catalog.get("fallback_language", self.fallback_language)
+                self.default_topic = catalog.get("default_topic", self.default_topic)
+                self.aliases.update({alias.lower(): name.lower() for alias, name in catalog.get("aliases", {}).items()})
+                for topic in catalog.get("topics", []):
+                    self.topics[topic["name"]] = [keyword.lower() for keyword in topic["keywords"]]
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                print(f"Error loading tutor example catalog {catalog_path}: {e}")
+        for language in sorted(os.listdir(directory)):
+            language_dir = os.path.join(directory, language)
+            if language.startswith(('.', '_')) or not os.path.isdir(language_dir):  # Skip .git, __pycache__
+                continue
+            for name in sorted(os.listdir(language_dir)):
+                path = os.path.join(language_dir, name)
+                if name.startswith('.') or not os.path.isfile(path):
+                    continue
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        self.examples[(language.lower(), name.split('.')[0])] = f.read().rstrip('\n')
+                except (OSError, UnicodeDecodeError) as e:
+                    print(f"Error loading tutor example {path}: {e}")
+    
+    def _compile(self) -> Optional["re.Pattern"]:
+        """One alternation with a group per topic, so a single scan scores every topic."""
+        self._group_topics = [index for index, topic in enumerate(self._topic_names) if self.topics[topic]]
+        groups = ['(' + '|'.join(_keyword_pattern(keyword) for keyword in self.topics[self._topic_names[index]]) + ')'
+                  for index in self._group_topics]
+        # A lookbehind rather than \b: it is only tried where a keyword could start, which scans faster
+        return re.compile(r'(?<!\w)(?:' + '|'.join(groups) + ')') if groups else None
+    
+    def match_topic(self, question: str) -> Optional[str]:
+        """Return the topic whose keywords occur most often in ``question``, or None."""
+        if self._matcher is None or not question:
+            return None
+        counts = [0] * len(self._topic_names)
+        word_topics = self._word_topics
+        for word in question.lower().split():
+            topics = word_topics.get(word)
+            if topics is None:
+                # Questions reuse a small vocabulary, so each word is scanned once and then looked up
+                topics = tuple(self._group_topics[match.lastindex - 1] for match in self._matcher.finditer(word))
+                if len(word_topics) < WORD_CACHE_SIZE:
+                    word_topics[word] = topics
+            for index in topics:
+                counts[index] += 1
+        best = max(counts)
+        return self._topic_names[counts.index(best)] if best else None
+    
+    def resolve_language(self, language: str) -> str:
+        language = language.lower()
+        return self.aliases.get(language, language)
+    
+    def example(self, language: str, question: str = "") -> str:
+        """Example code for the question's topic in ``language``.
+        
+        Falls back to the fallback language's example for the topic, then to
+        the default topic when no keyword matched.
+        """
+        language = self.resolve_language(language)
+        topic = self.match_topic(question)
+        if topic is not None:
+            code = self.examples.get((language, topic)) or self.examples.get((self.fallback_language, topic))
+            if code is not None:
+                self._count(topic)
+                return code
+        self._count(self.default_topic)
+        return (self.examples.get((language, self.default_topic))
+                or self.examples.get((self.fallback_language, self.default_topic), NO_EXAMPLE))
+    
+    def _count(self, topic: str):
+        with self._lock:
+            self.matches[topic] += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """What was loaded, and how often each topic was picked."""
+        with self._lock:
+            matches = dict(self.matches)
+        return {
+            "directories": list(self.directories),
+            "languages": sorted({language for language, _ in self.examples}),
+            "topics": list(self._topic_names),
+            "examples": len(self.examples),
+            "matches": matches
+        }
+
+
+example_catalog = ExampleCatalog([BUILTIN_DIR] + EXTRA_DIRS)
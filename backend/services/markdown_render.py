@@ -0,0 +1,103 @@
+"""
+Server-side rendering of material markdown to sanitized HTML.
+
+Materials store their rendered HTML next to the markdown source, together
+with the renderer version that produced it. Bumping ``RENDER_VERSION`` marks
+every stored render as stale; stale renders are rebuilt lazily when read,
+without touching the material's ``updated_at``.
+"""
+import asyncio
+import copy
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import markdown
+import nh3
+from sqlalchemy import event, update
+from sqlalchemy.orm.attributes import get_history, set_committed_value
+
+from backend.models import Material
+
+
+# Bump whenever the markdown extensions or sanitizer settings change
+RENDER_VERSION = 1
+RENDER_WORKERS = int(os.getenv('MARKDOWN_RENDER_WORKERS', '2'))
+
+MARKDOWN_EXTENSIONS = ['fenced_code', 'tables', 'sane_lists']
+
+_ALLOWED_ATTRIBUTES = copy.deepcopy(nh3.ALLOWED_ATTRIBUTES)
+# fenced_code marks the language as class="language-python"
+_ALLOWED_ATTRIBUTES.setdefault('code', set()).add('class')
+
+_render_pool: Optional[ThreadPoolExecutor] = None
+
+
+def render_markdown(text: Optional[str]) -> str:
+    """Render markdown to HTML and strip anything unsafe."""
+    if not text:
+        return ''
+    html = markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS)
+    return nh3.clean(html, attributes=_ALLOWED_ATTRIBUTES, link_rel='noopener noreferrer')
+
+
+async def render_markdown_async(text: Optional[str]) -> str:
+    """Render markdown on the worker pool so the event loop keeps running."""
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix='markdown-render')
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_render_pool, render_markdown, text)
+
+
+def is_render_stale(material) -> bool:
+    """Return True if the material's stored HTML is missing or outdated."""
+    return material.html_render_version != RENDER_VERSION
+
+
+def apply_render(material, html: Optional[str] = None):
+    """Store rendered HTML on a material, rendering it now if not given."""
+    material.content_html = render_markdown(material.content) if html is None else html
+    material.html_render_version = RENDER_VERSION
+
+
+def ensure_rendered(material) -> bool:
+    """Rebuild a stale render in place. Returns True if the material changed."""
+    if not is_render_stale(material):
+        return False
+    apply_render(material)
+    return True
+
+
+def save_stale_renders(db, materials) -> bool:
+    """Rebuild stale renders and write them without marking the materials edited.
+    
+    Only the HTML and render version columns are updated, so ``updated_at``
+    still records the last real edit. Returns True if anything was rebuilt;
+    the caller commits.
+    """
+    rebuilt = False
+    for material in materials:
+        if not is_render_stale(material):
+            continue
+        html = render_markdown(material.content)
+        # Setting updated_at to itself stops its onupdate from firing
+        db.execute(update(Material).where(Material.id == material.id).values(
+            content_html=html, html_render_version=RENDER_VERSION, updated_at=Material.updated_at
+        ))
+        set_committed_value(material, "content_html", html)
+        set_committed_value(material, "html_render_version", RENDER_VERSION)
+        rebuilt = True
+    return rebuilt
+
+
+# Registered here rather than in the model so the models package doesn't depend on services;
+# anything that writes materials imports this module (main.py and init_db.py do)
+@event.listens_for(Material, "before_insert")
+@event.listens_for(Material, "before_update")
+def render_content_html(mapper, connection, target):
+    """Render HTML whenever content is written without a fresh render alongside it."""
+    if get_history(target, "content_html").has_changes():
+        return
+    if target.content_html is None or get_history(target, "content").has_changes():
+        apply_render(target)
@@ -0,0 +1,203 @@
+"""
+Table-driven conversion of Notion blocks to markdown.
+
+Blocks are written straight into a single output buffer as they arrive, so a
+page never has to hold all of its blocks or per-block fragments in memory.
+"""
+import io
+from typing import Any, Callable, Dict, Iterable, List
+
+
+NESTED_INDENT = '    '
+
+
+def render_rich_text(rich_text: List[Dict[str, Any]]) -> str:
+    """Render Notion rich text, applying annotations and links."""
+    parts = []
+    for item in rich_text:
+        text = item.get('plain_text', '')
+        if not text:
+            continue
+        
+        annotations = item.get('annotations') or {}
+        if annotations.get('code'):
+            text = f'`{text}`'
+        if annotations.get('bold'):
+            text = f'**{text}**'
+        if annotations.get('italic'):
+            text = f'*{text}*'
+        if annotations.get('strikethrough'):
+            text = f'~~{text}~~'
+        
+        link = item.get('href') or ((item.get('text') or {}).get('link') or {}).get('url')
+        if link:
+            text = f'[{text}]({link})'
+        
+        parts.append(text)
+    return ''.join(parts)
+
+
+def _plain_text(rich_text: List[Dict[str, Any]]) -> str:
+    """Join rich text without any markdown formatting (used for code)."""
+    return ''.join(item.get('plain_text', '') for item in rich_text)
+
+
+def _file_url(data: Dict[str, Any]) -> str:
+    """Return the URL of a Notion file object (external or hosted)."""
+    file_type = data.get('type', '')
+    return (data.get(file_type) or {}).get('url', '')
+
+
+class MarkdownWriter:
+    """Streams Notion blocks into one markdown buffer."""
+    
+    def __init__(self):
+        self._out = io.StringIO()
+    
+    def write_blocks(self, blocks: Iterable[Dict[str, Any]], indent: str = ''):
+        """Write a sequence of sibling blocks (and their children)."""
+        for block in blocks:
+            self.write_block(block, indent)
+    
+    def write_block(self, block: Dict[str, Any], indent: str = ''):
+        """Write one block using the handler registered for its type."""
+        block_type = block.get('type', '')
+        handler = _HANDLERS.get(block_type)
+        if handler is None:
+            # Layout containers (columns, synced blocks) and unsupported types
+            # still contribute their children, at the parent's indentation
+            self.write_blocks(block.get('children') or (), indent)
+            return
+        handler(self, block, block.get(block_type) or {}, indent)
+    
+    def getvalue(self) -> str:
+        """Return the markdown written so far."""
+        return self._out.getvalue()
+    
+    def _emit(self, text: str, indent: str):
+        """Write text, indenting every non-blank line."""
+        if not indent:
+            self._out.write(text)
+            return
+        for line in text.splitlines(keepends=True):
+            self._out.write(indent + line if line.strip() else line)
+    
+    def _write_children(self, block: Dict[str, Any], indent: str):
+        children = block.get('children')
+        if children:
+            self.write_blocks(children, indent + NESTED_INDENT)
+    
+    # Block handlers
+    
+    def _paragraph(self, block, data, indent):
+        self._emit(f"{render_rich_text(data.get('rich_text', []))}\n\n", indent)
+        self._write_children(block, indent)
+    
+    def _heading(self, block, data, indent):
+        level = int(block['type'][-1])
+        self._emit(f"{'#' * level} {render_rich_text(data.get('rich_text', []))}\n\n", indent)
+        self._write_children(block, indent)
+    
+    def _bulleted_list_item(self, block, data, indent):
+        self._emit(f"- {render_rich_text(data.get('rich_text', []))}\n", indent)
+        self._write_children(block, indent)
+    
+    def _numbered_list_item(self, block, data, indent):
+        self._emit(f"1. {render_rich_text(data.get('rich_text', []))}\n", indent)
+        self._write_children(block, indent)
+    
+    def _to_do(self, block, data, indent):
+        checked = 'x' if data.get('checked') else ' '
+        self._emit(f"- [{checked}] {render_rich_text(data.get('rich_text', []))}\n", indent)
+        self._write_children(block, indent)
+    
+    def _quote(self, block, data, indent):
+        text = render_rich_text(data.get('rich_text', []))
+        self._emit(''.join(f'> {line}\n' for line in text.split('\n')) + '\n', indent)
+        self._write_children(block, indent)
+    
+    def _callout(self, block, data, indent):
+        icon = (data.get('icon') or {}).get('emoji', '')
+        text = render_rich_text(data.get('rich_text', []))
+        if icon:
+            text = f'{icon} {text}'
+        self._emit(''.join(f'> {line}\n' for line in text.split('\n')) + '\n', indent)
+        self._write_children(block, indent)
+    
+    def _toggle(self, block, data, indent):
+        summary = render_rich_text(data.get('rich_text', []))
+        self._emit(f'<details>\n<summary>{summary}</summary>\n\n', indent)
+        self.write_blocks(block.get('children') or (), indent)
+        self._emit('</details>\n\n', indent)
+    
+    def _code(self, block, data, indent):
+        # Code is literal, so annotations and links are not applied here
+        code = _plain_text(data.get('rich_text', []))
+        self._emit(f"```{data.get('language', '')}\n{code}\n```\n\n", indent)
+    
+    def _divider(self, block, data, indent):
+        self._emit('---\n\n', indent)
+    
+    def _image(self, block, data, indent):
+        caption = render_rich_text(data.get('caption', []))
+        self._emit(f'![{caption}]({_file_url(data)})\n\n', indent)
+    
+    def _bookmark(self, block, data, indent):
+        url = data.get('url', '')
+        caption = render_rich_text(data.get('caption', [])) or url
+        self._emit(f'[{caption}]({url})\n\n', indent)
+    
+    def _equation(self, block, data, indent):
+        self._emit(f"$$\n{data.get('expression', '')}\n$$\n\n", indent)
+    
+    def _table(self, block, data, indent):
+        rows = [
+            row.get('table_row', {}).get('cells', [])
+            for row in block.get('children') or ()
+            if row.get('type') == 'table_row'
+        ]
+        if not rows:
+            return
+        
+        width = data.get('table_width') or max(len(cells) for cells in rows)
+        
+        def format_row(cells):
+            rendered = [render_rich_text(cell).replace('|', '\\|') for cell in cells]
+            rendered += [''] * (width - len(rendered))
+            return '| ' + ' | '.join(rendered) + ' |\n'
+        
+        # Markdown tables always need a header row, so the first row is used
+        self._emit(format_row(rows[0]), indent)
+        self._emit('| ' + ' | '.join(['---'] * width) + ' |\n', indent)
+        for cells in rows[1:]:
+            self._emit(format_row(cells), indent)
+        self._emit('\n', indent)
+
+
+_HANDLERS: Dict[str, Callable] = {
+    'paragraph': MarkdownWriter._paragraph,
+    'heading_1': MarkdownWriter._heading,
+    'heading_2': MarkdownWriter._heading,
+    'heading_3': MarkdownWriter._heading,
+    'bulleted_list_item': MarkdownWriter._bulleted_list_item,
+    'numbered_list_item': MarkdownWriter._numbered_list_item,
+    'to_do': MarkdownWriter._to_do,
+    'quote': MarkdownWriter._quote,
+    'callout': MarkdownWriter._callout,
+    'toggle': MarkdownWriter._toggle,
+    'code': MarkdownWriter._code,
+    'divider': MarkdownWriter._divider,
+    'image': MarkdownWriter._image,
+    'bookmark': MarkdownWriter._bookmark,
+    'embed': MarkdownWriter._bookmark,
+    'link_preview': MarkdownWriter._bookmark,
+    'equation': MarkdownWriter._equation,
+    'table': MarkdownWriter._table,
+}
+
+
+def blocks_to_markdown(blocks: Iterable[Dict[str, Any]]) -> str:
+    """Convert a block tree to markdown in one call."""
+    writer = MarkdownWriter()
+    writer.write_blocks(blocks)
+    return writer.getvalue()
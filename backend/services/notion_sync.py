@@ -2,27 +2,88 @@
 Notion sync service for syncing materials from Notion database.
 """
 import os
-from typing import List, Dict, Any, Optional
+import asyncio
+import hashlib
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, Callable
 import httpx
+from sqlalchemy.orm import defer
 from backend.models import Material
+from backend.services.notion_markdown import MarkdownWriter
+from backend.services.markdown_render import apply_render, render_markdown_async
 
 
 NOTION_API_KEY = os.getenv('NOTION_API_KEY', '')
 DATABASE_ID = os.getenv('NOTION_DATABASE_ID', '')
+SYNC_BATCH_SIZE = int(os.getenv('NOTION_SYNC_BATCH_SIZE', '50'))
+MAX_BLOCK_DEPTH = int(os.getenv('NOTION_MAX_BLOCK_DEPTH', '5'))
+PAGE_REQUEST_BUDGET = int(os.getenv('NOTION_PAGE_REQUEST_BUDGET', '200'))
+FETCH_CONCURRENCY = int(os.getenv('NOTION_FETCH_CONCURRENCY', '3'))
+MAX_RETRIES = int(os.getenv('NOTION_MAX_RETRIES', '3'))
+RETRY_BACKOFF = float(os.getenv('NOTION_RETRY_BACKOFF', '0.5'))  # Seconds, doubled per attempt
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Their children are separate pages/databases, not part of this page
+SEPARATE_PAGE_BLOCK_TYPES = {'child_page', 'child_database'}
+
+
+def compute_content_hash(title: str, category: Optional[str], content: str) -> str:
+    """Return a BLAKE2 digest identifying the synced state of a page."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (title, category or '', content):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class _RequestBudget:
+    """Counts the HTTP requests a single page sync may still make."""
+    
+    def __init__(self, limit: int):
+        self.remaining = limit
+        self.exhausted = False
+    
+    def take(self) -> bool:
+        """Reserve one request, returning False once the budget is spent."""
+        if self.remaining <= 0:
+            self.exhausted = True
+            return False
+        self.remaining -= 1
+        return True
 
 
 class NotionSyncService:
     """Service for syncing materials from Notion."""
     
-    def __init__(self):
-        self.api_key = NOTION_API_KEY
-        self.database_id = DATABASE_ID
+    def __init__(self, client: Optional[httpx.AsyncClient] = None,
+                 api_key: Optional[str] = None, database_id: Optional[str] = None):
+        self.api_key = NOTION_API_KEY if api_key is None else api_key
+        self.database_id = DATABASE_ID if database_id is None else database_id
         self.headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json',
             'Notion-Version': '2022-06-28'
         }
-        self.client = httpx.AsyncClient()
+        self.client = client or httpx.AsyncClient()
+    
+    async def _send(self, method: Callable, url: str, **kwargs) -> httpx.Response:
+        """Send a request, retrying rate-limited and 5xx responses with backoff.
+        
+        Notion's ``Retry-After`` header is honoured when present; otherwise
+        the delay doubles with every attempt.
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            response = await method(url, headers=self.headers, **kwargs)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == MAX_RETRIES:
+                break
+            
+            try:
+                delay = float(response.headers.get('Retry-After', ''))
+            except ValueError:
+                delay = RETRY_BACKOFF * 2 ** attempt
+            await asyncio.sleep(delay)
+        
+        response.raise_for_status()
+        return response
     
     async def fetch_pages(self) -> List[Dict[str, Any]]:
         """Fetch all pages from the Notion database."""
@@ -40,8 +101,7 @@ class NotionSyncService:
                 if start_cursor:
                     payload['start_cursor'] = start_cursor
                 
-                response = await self.client.post(url, headers=self.headers, json=payload)
-                response.raise_for_status()
+                response = await self._send(self.client.post, url, json=payload)
                 data = response.json()
                 
                 all_pages.extend(data.get('results', []))
@@ -98,115 +158,111 @@ class NotionSyncService:
         
         return None
     
-    async def _fetch_page_blocks(self, page_id: str) -> List[Dict[str, Any]]:
-        """Fetch all blocks for a Notion page."""
-        try:
-            url = f'https://api.notion.com/v1/blocks/{page_id}/children'
-            all_blocks = []
-            has_more = True
-            start_cursor = None
+    async def _iter_block_results(self, block_id: str,
+                                  budget: _RequestBudget) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield each page of a block's children as it arrives from pagination.
+        
+        Stops early once the request budget is used up.
+        """
+        url = f'https://api.notion.com/v1/blocks/{block_id}/children'
+        has_more = True
+        start_cursor = None
+        
+        while has_more:
+            if not budget.take():
+                break
             
-            while has_more:
-                params = {}
-                if start_cursor:
-                    params['start_cursor'] = start_cursor
-                
-                response = await self.client.get(url, headers=self.headers, params=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                all_blocks.extend(data.get('results', []))
-                has_more = data.get('has_more', False)
-                start_cursor = data.get('next_cursor')
+            params = {}
+            if start_cursor:
+                params['start_cursor'] = start_cursor
             
-            return all_blocks
-        except Exception as e:
-            print(f"Error fetching blocks for page {page_id}: {e}")
-            return []
-    
-    def _block_to_markdown(self, block: Dict[str, Any]) -> str:
-        """Convert a Notion block to markdown."""
-        block_type = block.get('type', '')
-        block_data = block.get(block_type, {})
-        
-        if block_type == 'paragraph':
-            text_parts = []
-            for text_item in block_data.get('rich_text', []):
-                text = text_item.get('plain_text', '')
-                annotations = text_item.get('annotations', {})
-                
-                # Apply formatting
-                if annotations.get('bold'):
-                    text = f'**{text}**'
-                if annotations.get('italic'):
-                    text = f'*{text}*'
-                if annotations.get('code'):
-                    text = f'`{text}`'
-                if annotations.get('strikethrough'):
-                    text = f'~~{text}~~'
-                
-                text_parts.append(text)
+            response = await self._send(self.client.get, url, params=params)
+            data = response.json()
             
-            return ''.join(text_parts) + '\n\n'
-        
-        elif block_type == 'heading_1':
-            text_parts = [item.get('plain_text', '') for item in block_data.get('rich_text', [])]
-            text = ''.join(text_parts)
-            return f'# {text}\n\n'
-        
-        elif block_type == 'heading_2':
-            text_parts = [item.get('plain_text', '') for item in block_data.get('rich_text', [])]
-            text = ''.join(text_parts)
-            return f'## {text}\n\n'
-        
-        elif block_type == 'heading_3':
-            text_parts = [item.get('plain_text', '') for item in block_data.get('rich_text', [])]
-            text = ''.join(text_parts)
-            return f'### {text}\n\n'
-        
-        elif block_type == 'bulleted_list_item':
-            text_parts = [item.get('plain_text', '') for item in block_data.get('rich_text', [])]
-            text = ''.join(text_parts)
-            return f'- {text}\n'
+            yield data.get('results', [])
+            has_more = data.get('has_more', False)
+            start_cursor = data.get('next_cursor')
+    
+    async def _fetch_block_children(self, block_id: str, budget: _RequestBudget) -> List[Dict[str, Any]]:
+        """Fetch all direct children of a block, following pagination."""
+        children = []
+        async for results in self._iter_block_results(block_id, budget):
+            children.extend(results)
+        return children
+    
+    async def _expand_children(self, blocks: List[Dict[str, Any]], budget: _RequestBudget,
+                               max_depth: int):
+        """Attach nested children to blocks, expanding one level at a time.
         
-        elif block_type == 'numbered_list_item':
-            text_parts = [item.get('plain_text', '') for item in block_data.get('rich_text', [])]
-            text = ''.join(text_parts)
-            return f'1. {text}\n'
+        Each level's requests run concurrently. Children are attached to their
+        parent under a ``children`` key.
+        """
+        semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
         
-        elif block_type == 'code':
-            text_parts = [item.get('plain_text', '') for item in block_data.get('rich_text', [])]
-            code = ''.join(text_parts)
-            language = block_data.get('language', '')
-            return f'```{language}\n{code}\n```\n\n'
+        async def fetch_children(block: Dict[str, Any]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return await self._fetch_block_children(block['id'], budget)
         
-        elif block_type == 'quote':
-            text_parts = [item.get('plain_text', '') for item in block_data.get('rich_text', [])]
-            text = ''.join(text_parts)
-            return f'> {text}\n\n'
+        level = self._expandable_blocks(blocks)
+        depth = 0
+        while level and depth < max_depth and not budget.exhausted:
+            results = await asyncio.gather(
+                *(fetch_children(block) for block in level), return_exceptions=True
+            )
+            next_level = []
+            for block, children in zip(level, results):
+                if isinstance(children, Exception):
+                    print(f"Error fetching children of block {block.get('id')}: {children}")
+                    continue
+                block['children'] = children
+                next_level.extend(self._expandable_blocks(children))
+            level = next_level
+            depth += 1
+    
+    async def _iter_page_blocks(self, page_id: str, max_depth: Optional[int] = None,
+                                request_budget: Optional[int] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield a page's top-level blocks one pagination chunk at a time.
         
-        elif block_type == 'divider':
-            return '---\n\n'
+        Each chunk has its nested children expanded before it is yielded, so
+        callers can convert it and let it go before the next chunk arrives.
+        Expansion stops at ``max_depth`` nested levels or once
+        ``request_budget`` HTTP requests have been made for the page.
+        """
+        max_depth = MAX_BLOCK_DEPTH if max_depth is None else max_depth
+        budget = _RequestBudget(PAGE_REQUEST_BUDGET if request_budget is None else request_budget)
         
-        elif block_type == 'to_do':
-            text_parts = [item.get('plain_text', '') for item in block_data.get('rich_text', [])]
-            text = ''.join(text_parts)
-            checked = 'x' if block_data.get('checked') else ' '
-            return f'- [{checked}] {text}\n'
+        try:
+            async for blocks in self._iter_block_results(page_id, budget):
+                await self._expand_children(blocks, budget, max_depth)
+                yield blocks
+        except Exception as e:
+            print(f"Error fetching blocks for page {page_id}: {e}")
         
-        return ''
+        if budget.exhausted:
+            print(f"Request budget exhausted for page {page_id}; content may be truncated")
+    
+    async def _fetch_page_blocks(self, page_id: str, max_depth: Optional[int] = None,
+                                 request_budget: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Fetch all blocks for a Notion page as a tree."""
+        blocks = []
+        async for chunk in self._iter_page_blocks(page_id, max_depth, request_budget):
+            blocks.extend(chunk)
+        return blocks
+    
+    def _expandable_blocks(self, blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return the blocks whose children belong to the current page."""
+        return [
+            block for block in blocks
+            if block.get('has_children') and block.get('id')
+            and block.get('type') not in SEPARATE_PAGE_BLOCK_TYPES
+        ]
     
     async def _get_page_content(self, page_id: str) -> str:
-        """Fetch and convert page blocks to markdown content."""
-        blocks = await self._fetch_page_blocks(page_id)
-        markdown_parts = []
-        
-        for block in blocks:
-            markdown = self._block_to_markdown(block)
-            if markdown:
-                markdown_parts.append(markdown)
-        
-        return ''.join(markdown_parts).strip()
+        """Fetch page blocks and stream them into markdown content."""
+        writer = MarkdownWriter()
+        async for blocks in self._iter_page_blocks(page_id):
+            writer.write_blocks(blocks)
+        return writer.getvalue().strip()
     
     async def sync_materials(self) -> List[str]:
         """Sync Notion pages and return list of page IDs."""
@@ -214,66 +270,167 @@ class NotionSyncService:
         page_ids = [page.get('id', '') for page in pages if page.get('id')]
         return page_ids
     
-    async def sync_to_database(self, db_session) -> Dict[str, Any]:
-        """Sync Notion pages to local database."""
+    def _prefetch_materials(self, db_session) -> Dict[str, Material]:
+        """Load all Notion-backed materials in one query, keyed by page ID.
+        
+        Content is deferred: pages are compared by hash, so the large text
+        column is only loaded for rows that predate content hashing.
+        """
+        materials = db_session.query(Material).options(
+            defer(Material.content)
+        ).filter(
+            Material.notion_page_id.isnot(None)
+        ).all()
+        return {material.notion_page_id: material for material in materials}
+    
+    async def _get_page_fields(self, page: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract the material fields for a Notion page, including its content."""
+        properties = page.get('properties', {})
+        title = self._extract_title(properties)
+        category = self._extract_category(properties)
+        content = await self._get_page_content(page['id'])
+        return {
+            'title': title,
+            'category': category,
+            'content': content,
+            'notion_url': page.get('url', ''),
+            'content_hash': compute_content_hash(title, category, content)
+        }
+    
+    def _apply_page(self, db_session, existing: Dict[str, Material],
+                    page_id: str, fields: Dict[str, Any]) -> Tuple[str, Material]:
+        """Insert or update the material for a page and return the outcome.
+        
+        Pages whose content hash matches the stored one are ``skipped``
+        without touching the row, so ``updated_at`` and the large content
+        column are left alone.
+        """
+        material = existing.get(page_id)
+        if material is None:
+            material = Material(
+                title=fields['title'],
+                content=fields['content'],
+                notion_page_id=page_id,
+                notion_url=fields['notion_url'],
+                category=fields['category'],
+                content_hash=fields['content_hash'],
+                order_index=0
+            )
+            if 'content_html' in fields:
+                apply_render(material, fields['content_html'])
+            db_session.add(material)
+            return 'synced', material
+        
+        if material.content_hash == fields['content_hash'] and material.notion_url == fields['notion_url']:
+            return 'skipped', material
+        
+        changes = {
+            'title': fields['title'],
+            'content': fields['content'],
+            'notion_url': fields['notion_url']
+        }
+        # Only overwrite the category when the page actually has one
+        if fields['category']:
+            changes['category'] = fields['category']
+        
+        unchanged = all(getattr(material, name) == value for name, value in changes.items())
+        
+        for name, value in changes.items():
+            if getattr(material, name) != value:
+                setattr(material, name, value)
+        material.content_hash = fields['content_hash']
+        if 'content_html' in fields:
+            apply_render(material, fields['content_html'])
+        # Rows synced before content hashing only get their hash backfilled
+        return ('unchanged' if unchanged else 'updated'), material
+    
+    async def sync_to_database(self, db_session, batch_size: Optional[int] = None,
+                               progress: Optional[Callable[[int, int, int], None]] = None) -> Dict[str, Any]:
+        """Sync Notion pages to local database.
+        
+        Existing materials are prefetched in a single query. Page content is
+        fetched before each batch is written, so the database is only locked
+        while a batch is applied. Every page is written inside its own
+        savepoint, so one bad page doesn't roll back the rest of its batch.
+        
+        If given, ``progress`` is called with ``(pages_done, pages_total,
+        errors)`` once the page list is known and after every batch.
+        """
         pages = await self.fetch_pages()
+        batch_size = max(1, batch_size or SYNC_BATCH_SIZE)
         
-        synced_count = 0
-        error_count = 0
+        existing = self._prefetch_materials(db_session)
+        counts = {'synced': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'errors': 0}
+        valid_pages = [page for page in pages if page.get('id')]
+        if progress:
+            progress(0, len(valid_pages), 0)
         
-        for page in pages:
-            try:
-                page_id = page.get('id', '')
-                if not page_id:
+        for start in range(0, len(valid_pages), batch_size):
+            batch = valid_pages[start:start + batch_size]
+            
+            # Fetch content for the whole batch before touching the database.
+            # Changed pages are rendered to HTML on the worker pool while the
+            # next pages are still being fetched.
+            fetched = []
+            renders = []
+            for page in batch:
+                try:
+                    fields = await self._get_page_fields(page)
+                except Exception as e:
+                    print(f"Error syncing page {page.get('id')}: {e}")
+                    counts['errors'] += 1
                     continue
                 
-                page_url = page.get('url', '')
-                properties = page.get('properties', {})
-                
-                # Extract title and category
-                title = self._extract_title(properties)
-                category = self._extract_category(properties)
-                
-                # Fetch page content
-                content = await self._get_page_content(page_id)
-                
-                # Check if material already exists
-                existing_material = db_session.query(Material).filter(
-                    Material.notion_page_id == page_id
-                ).first()
-                
-                if existing_material:
-                    # Update existing material
-                    existing_material.title = title
-                    existing_material.content = content
-                    existing_material.notion_url = page_url
-                    if category:
-                        existing_material.category = category
-                    db_session.commit()
-                    # Don't count updates as "synced" (only new materials)
-                else:
-                    # Create new material
-                    new_material = Material(
-                        title=title,
-                        content=content,
-                        notion_page_id=page_id,
-                        notion_url=page_url,
-                        category=category,
-                        order_index=0
-                    )
-                    db_session.add(new_material)
-                    db_session.commit()
-                    synced_count += 1
+                material = existing.get(page['id'])
+                if material is None or material.content_hash != fields['content_hash']:
+                    renders.append((fields, asyncio.ensure_future(
+                        render_markdown_async(fields['content'])
+                    )))
+                fetched.append((page['id'], fields))
+            
+            for fields, render in renders:
+                try:
+                    fields['content_html'] = await render
+                except Exception as e:
+                    # Leave it to the model to render synchronously on write
+                    print(f"Error rendering content: {e}")
+            
+            outcomes = []
+            for page_id, fields in fetched:
+                try:
+                    with db_session.begin_nested():
+                        outcome, material = self._apply_page(db_session, existing, page_id, fields)
+                        db_session.flush()
+                except Exception as e:
+                    print(f"Error syncing page {page_id}: {e}")
+                    counts['errors'] += 1
+                    continue
                 
+                # Later pages with the same ID update this row instead of inserting
+                existing[page_id] = material
+                outcomes.append(outcome)
+            
+            try:
+                db_session.commit()
             except Exception as e:
-                print(f"Error syncing page {page.get('id')}: {e}")
-                error_count += 1
+                print(f"Error committing Notion sync batch: {e}")
                 db_session.rollback()
+                counts['errors'] += len(outcomes)
+                existing = self._prefetch_materials(db_session)
+            else:
+                for outcome in outcomes:
+                    counts[outcome] += 1
+            
+            if progress:
+                progress(start + len(batch), len(valid_pages), counts['errors'])
         
         return {
             'success': True,
-            'synced': synced_count,
-            'errors': error_count,
+            'synced': counts['synced'],
+            'updated': counts['updated'],
+            'unchanged': counts['unchanged'],
+            'skipped': counts['skipped'],
+            'errors': counts['errors'],
             'total': len(pages)
         }
     
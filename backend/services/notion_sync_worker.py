@@ -0,0 +1,155 @@
+"""
+Background worker that runs Notion syncs on a dedicated event loop thread.
+
+The shared ``notion_service`` owns an ``httpx.AsyncClient``, which is bound to
+the event loop that first uses it. Running every sync on one long-lived loop
+keeps that client valid and frees Flask workers from waiting on the sync.
+"""
+import os
+import asyncio
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from backend.database import SessionLocal
+from backend.services.notion_sync import NotionSyncService, notion_service
+
+
+SYNC_INTERVAL = int(os.getenv('NOTION_SYNC_INTERVAL', '0'))  # Seconds, 0 disables
+MAX_FINISHED_JOBS = 20
+
+
+class NotionSyncWorker:
+    """Runs Notion syncs in the background and tracks their progress."""
+    
+    def __init__(self, service: NotionSyncService, session_factory: Callable = SessionLocal):
+        self.service = service
+        self.session_factory = session_factory
+        self._lock = Lock()
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._done: Dict[str, Event] = {}
+        self._active_job_id: Optional[str] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[Thread] = None
+        self._schedule = None
+    
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Start the background event loop thread on first use."""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = Thread(
+                    target=self._loop.run_forever, name='notion-sync-worker', daemon=True
+                )
+                self._thread.start()
+            return self._loop
+    
+    def submit(self, trigger: str = 'manual') -> Tuple[Dict[str, Any], bool]:
+        """Start a sync job and return ``(job, created)``.
+        
+        If a sync is already queued or running, that job is returned instead
+        and ``created`` is False.
+        """
+        with self._lock:
+            if self._active_job_id is not None:
+                return dict(self._jobs[self._active_job_id]), False
+            
+            job_id = uuid.uuid4().hex
+            job = {
+                'job_id': job_id,
+                'status': 'queued',
+                'trigger': trigger,
+                'pages_done': 0,
+                'pages_total': None,
+                'errors': 0,
+                'result': None,
+                'error': None,
+                'created_at': datetime.now().isoformat(),
+                'started_at': None,
+                'finished_at': None
+            }
+            self._jobs[job_id] = job
+            self._done[job_id] = Event()
+            self._active_job_id = job_id
+            self._prune_jobs()
+            snapshot = dict(job)
+        
+        asyncio.run_coroutine_threadsafe(self._run(job_id), self._ensure_loop())
+        return snapshot, True
+    
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a snapshot of a job, or None if it is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+    
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Block until a job finishes (or the timeout passes) and return it."""
+        with self._lock:
+            done = self._done.get(job_id)
+        if done is None:
+            return None
+        done.wait(timeout)
+        return self.get_job(job_id)
+    
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+    
+    def _prune_jobs(self):
+        """Drop the oldest finished jobs beyond the retention limit."""
+        finished = [
+            job_id for job_id, job in self._jobs.items()
+            if job['status'] in ('completed', 'failed')
+        ]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+            self._done.pop(job_id, None)
+    
+    async def _run(self, job_id: str):
+        """Run one sync job on the worker loop."""
+        self._update(job_id, status='running', started_at=datetime.now().isoformat())
+        
+        def report(done: int, total: int, errors: int):
+            self._update(job_id, pages_done=done, pages_total=total, errors=errors)
+        
+        db = None
+        try:
+            db = self.session_factory()
+            result = await self.service.sync_to_database(db, progress=report)
+            self._update(job_id, status='completed', result=result, errors=result.get('errors', 0))
+        except Exception as e:
+            print(f"Notion sync job {job_id} failed: {e}")
+            self._update(job_id, status='failed', error=str(e))
+        finally:
+            if db is not None:
+                db.close()
+            with self._lock:
+                self._jobs[job_id]['finished_at'] = datetime.now().isoformat()
+                self._active_job_id = None
+                self._done[job_id].set()
+    
+    def start_schedule(self, interval: int = SYNC_INTERVAL) -> bool:
+        """Submit a sync every ``interval`` seconds. Returns False if disabled."""
+        if interval <= 0 or self._schedule is not None:
+            return False
+        
+        async def run_periodically():
+            while True:
+                await asyncio.sleep(interval)
+                self.submit(trigger='scheduled')
+        
+        self._schedule = asyncio.run_coroutine_threadsafe(run_periodically(), self._ensure_loop())
+        return True
+    
+    def stop_schedule(self):
+        """Cancel the periodic sync, if one is running."""
+        if self._schedule is not None:
+            self._schedule.cancel()
+            self._schedule = None
+
+
+# Global instance
+notion_sync_worker = NotionSyncWorker(notion_service)
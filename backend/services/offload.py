@@ -0,0 +1,59 @@
+"""
+Running blocking calls off the event loop.
+
+Under gevent or eventlet, every client shares one OS thread. A call that
+blocks outside Python's sockets, such as a SQLite query or waiting on a
+child process, would stall all of them, so ``run_blocking`` hands it to the
+event loop's pool of native threads. In threading mode, or when already on
+one of those threads (an offloaded view calling a service that offloads its
+own queries), it just calls the function.
+"""
+import os
+import threading
+from functools import wraps
+from typing import Callable
+
+from flask import copy_current_request_context
+
+
+# Concurrency model for the Socket.IO server: threading, gevent or eventlet.
+# The event-loop modes need the standard library monkey-patched first, which
+# backend.serve does before importing the app.
+ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
+
+_worker = threading.local()
+
+
+def _in_worker(fn: Callable, args, kwargs):
+    _worker.active = True
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _worker.active = False
+
+
+def run_blocking(fn: Callable, *args, **kwargs):
+    """Call ``fn`` in a native worker thread and wait for the result."""
+    if getattr(_worker, 'active', False):
+        return fn(*args, **kwargs)
+    if ASYNC_MODE == 'gevent':
+        import gevent
+        return gevent.get_hub().threadpool.apply(_in_worker, (fn, args, kwargs))
+    if ASYNC_MODE == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(_in_worker, fn, args, kwargs)
+    return fn(*args, **kwargs)
+
+
+def offload(view: Callable) -> Callable:
+    """Decorator that runs a Flask view with ``run_blocking``.
+    
+    The request context is copied into the worker thread, so the view can
+    use ``request`` as usual.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if ASYNC_MODE == 'threading':
+            return view(*args, **kwargs)
+        return run_blocking(copy_current_request_context(view), *args, **kwargs)
+    return wrapper
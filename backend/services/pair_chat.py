@@ -0,0 +1,155 @@
+"""
+Archive for pair-programming chat messages.
+
+Each session keeps its most recent messages in a fixed-size buffer (see
+``pair_programming.CHAT_BUFFER_SIZE``). Messages pushed out of the buffer
+are queued here, which is a list append, and written to the database in one
+batch every ``CHAT_FLUSH_INTERVAL`` seconds and at exit.
+
+Messages are numbered per session, so older pages are read by keyset on the
+(session_id, seq) primary key: ``seq < before ORDER BY seq DESC LIMIT n``
+costs the same however long the chat is.
+"""
+import atexit
+import os
+import time
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Set
+
+from backend.database import SessionLocal
+from backend.models import PairChatMessage
+from backend.services.offload import run_blocking
+
+
+CHAT_FLUSH_INTERVAL = float(os.getenv('PAIR_CHAT_FLUSH_INTERVAL', '5'))  # Seconds, 0 disables the archive
+
+
+class ChatArchive:
+    """Writes overflowing chat messages to the database in batches."""
+    
+    def __init__(self, session_factory: Callable = SessionLocal, interval: float = CHAT_FLUSH_INTERVAL):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._lock = Lock()
+        self._pending: List[tuple] = []  # (session_id, message) pairs
+        self._deleted: Set[str] = set()
+        self._started = False
+        self.stats = {'archived': 0, 'written': 0, 'flushes': 0, 'pages': 0}
+    
+    def append(self, session_id: str, message: Dict):
+        """Queue a message that left the session's buffer."""
+        with self._lock:
+            self.stats['archived'] += 1
+            self._pending.append((session_id, message))
+    
+    def mark_deleted(self, session_id: str):
+        """Drop a session's archived messages at the next flush."""
+        with self._lock:
+            self._pending = [item for item in self._pending if item[0] != session_id]
+            self._deleted.add(session_id)
+    
+    def flush(self, session_id: Optional[str] = None) -> int:
+        """Write queued messages and apply pending deletes, for one session if given.
+        
+        Returns the number of messages written. If the write fails, they
+        stay queued for the next flush.
+        """
+        with self._lock:
+            if session_id is None:
+                pending, self._pending = self._pending, []
+                deleted, self._deleted = self._deleted, set()
+            else:
+                pending = [item for item in self._pending if item[0] == session_id]
+                if pending:
+                    self._pending = [item for item in self._pending if item[0] != session_id]
+                deleted = self._deleted & {session_id}
+                self._deleted -= deleted
+        if not pending and not deleted:
+            return 0
+        
+        rows = [
+            PairChatMessage(
+                session_id=session_id,
+                seq=message["id"],
+                username=message["username"],
+                message=message["message"],
+                timestamp=message["timestamp"]
+            )
+            for session_id, message in pending
+        ]
+        try:
+            # The database write blocks, so keep it off the event loop
+            run_blocking(self._write, rows, deleted)
+        except Exception:
+            with self._lock:
+                self._pending = pending + self._pending
+                self._deleted |= deleted
+            raise
+        
+        with self._lock:
+            self.stats['flushes'] += 1
+            self.stats['written'] += len(rows)
+        return len(rows)
+    
+    def _write(self, rows: List[PairChatMessage], deleted: Set[str]):
+        db = self.session_factory()
+        try:
+            if deleted:
+                db.query(PairChatMessage).filter(
+                    PairChatMessage.session_id.in_(deleted)
+                ).delete(synchronize_session=False)
+            # A session restored from an older snapshot can push out a
+            # message that was already archived, so write by primary key
+            for row in rows:
+                db.merge(row)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    def _load_page(self, session_id: str, before: int, limit: int) -> List[Dict]:
+        db = self.session_factory()
+        try:
+            rows = db.query(PairChatMessage).filter(
+                PairChatMessage.session_id == session_id,
+                PairChatMessage.seq < before
+            ).order_by(PairChatMessage.seq.desc()).limit(limit).all()
+            return [
+                {"id": row.seq, "username": row.username, "message": row.message, "timestamp": row.timestamp}
+                for row in reversed(rows)
+            ]
+        finally:
+            db.close()
+    
+    def get_page(self, session_id: str, before: int, limit: int) -> List[Dict]:
+        """Return up to ``limit`` archived messages with ids below ``before``, oldest first."""
+        # Only this session's queued messages are written now; the rest wait for the next batch
+        self.flush(session_id)
+        with self._lock:
+            self.stats['pages'] += 1
+        return run_blocking(self._load_page, session_id, before, limit)
+    
+    def start(self, start_task: Callable, sleep: Optional[Callable[[float], None]] = None):
+        """Start the periodic flush loop once, and flush again at exit."""
+        with self._lock:
+            if self._started or self.interval <= 0:
+                return
+            self._started = True
+        atexit.register(self._flush_at_exit)
+        start_task(self._run, sleep or time.sleep)
+    
+    def _run(self, sleep: Callable[[float], None]):
+        while True:
+            sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Pair chat archive error: {e}")
+    
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Pair chat archive error at exit: {e}")
@@ -0,0 +1,191 @@
+"""
+Write-behind persistence of pair-programming sessions.
+
+Edits only mark a session dirty, which is a set insert. A background loop
+writes dirty sessions to the database every ``PERSIST_INTERVAL`` seconds, so
+any number of edits between two flushes costs one write. The loop also
+flushes at interpreter exit. After a restart, a session missing from the
+store is restored from its snapshot the first time it is accessed.
+
+Participants, cursors and selections belong to live sockets and are not
+saved, so a restored session starts with nobody connected.
+"""
+import atexit
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Set
+
+from backend.database import SessionLocal
+from backend.models import PairSessionSnapshot
+from backend.services import pair_programming
+from backend.services.offload import run_blocking
+from backend.services.session_store import decode_value, encode_value
+
+
+PERSIST_INTERVAL = float(os.getenv('PAIR_PERSIST_INTERVAL', '5'))  # Seconds, 0 disables
+PERSISTED_FIELDS = (
+    "host_user_id", "host_username", "code", "revision", "operations", "snapshot",
+    "snapshot_revision", "output", "messages", "message_seq", "created_at", "expires_at"
+)
+# Session ids known to have no snapshot, so repeated lookups skip the database
+MISSING_CACHE_SIZE = 1024
+
+
+class PairSessionPersister:
+    """Snapshots dirty pair sessions to the database in batches."""
+    
+    def __init__(self, session_factory: Callable = SessionLocal, interval: float = PERSIST_INTERVAL):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._lock = Lock()
+        self._restore_lock = Lock()
+        self._dirty: Set[str] = set()
+        self._deleted: Set[str] = set()
+        self._missing: "OrderedDict[str, None]" = OrderedDict()
+        self._started = False
+        self.stats = {'marked': 0, 'written': 0, 'deleted': 0, 'flushes': 0, 'restored': 0}
+    
+    def mark_dirty(self, session_id: str):
+        """Queue a session to be written at the next flush."""
+        with self._lock:
+            self.stats['marked'] += 1
+            self._dirty.add(session_id)
+            self._deleted.discard(session_id)
+    
+    def mark_deleted(self, session_id: str):
+        """Queue a session's snapshot to be removed at the next flush."""
+        with self._lock:
+            self._dirty.discard(session_id)
+            self._deleted.add(session_id)
+    
+    def flush(self) -> int:
+        """Write every dirty session and apply pending deletes.
+        
+        Returns the number of sessions written. If the write fails, the
+        sessions stay queued for the next flush.
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            # Deletes stay pending until written, so restore() can't bring
+            # back a session whose snapshot is about to be removed
+            deleted = set(self._deleted)
+        if not dirty and not deleted:
+            return 0
+        
+        rows = []
+        for session_id in dirty:
+            with pair_programming.store.snapshot(session_id) as session:
+                if session is None:
+                    continue
+                # Operations and messages are never changed once appended,
+                # so copying the lists is enough to encode outside the lock
+                state = {
+                    field: list(session[field]) if isinstance(session[field], (list, deque)) else session[field]
+                    for field in PERSISTED_FIELDS
+                }
+            rows.append(PairSessionSnapshot(
+                session_id=session_id,
+                revision=state["revision"],
+                state=encode_value(state),
+                expires_at=state["expires_at"]
+            ))
+        
+        try:
+            # The database write blocks, so keep it off the event loop
+            run_blocking(self._write, rows, deleted)
+        except Exception:
+            with self._lock:
+                self._dirty |= dirty - self._deleted
+            raise
+        
+        with self._lock:
+            self._deleted -= deleted
+            self.stats['flushes'] += 1
+            self.stats['written'] += len(rows)
+            self.stats['deleted'] += len(deleted)
+        return len(rows)
+    
+    def _write(self, rows: List[PairSessionSnapshot], deleted: Set[str]):
+        db = self.session_factory()
+        try:
+            for row in rows:
+                db.merge(row)
+            if deleted:
+                db.query(PairSessionSnapshot).filter(
+                    PairSessionSnapshot.session_id.in_(deleted)
+                ).delete(synchronize_session=False)
+            # Sessions that expired while no server was running
+            db.query(PairSessionSnapshot).filter(
+                PairSessionSnapshot.expires_at < datetime.now()
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    def _load(self, session_id: str) -> Optional[Dict]:
+        db = self.session_factory()
+        try:
+            row = db.get(PairSessionSnapshot, session_id)
+            return decode_value(row.state) if row else None
+        finally:
+            db.close()
+    
+    def restore(self, session_id: str) -> bool:
+        """Put a session back in the store from its snapshot, if it has one.
+        
+        Returns True if the session is in the store afterwards.
+        """
+        with self._lock:
+            if session_id in self._deleted or session_id in self._missing:
+                return False
+        
+        with self._restore_lock:
+            # Another thread may have restored it while we waited
+            with pair_programming.store.snapshot(session_id) as session:
+                if session is not None:
+                    return True
+            
+            state = run_blocking(self._load, session_id)
+            if state is None or state["expires_at"] <= datetime.now():
+                with self._lock:
+                    self._missing[session_id] = None
+                    while len(self._missing) > MISSING_CACHE_SIZE:
+                        self._missing.popitem(last=False)
+                return False
+            
+            session = {**state, "participants": {}, "cursors": {}, "selections": {}}
+            pair_programming.store.add(session_id, session)
+            pair_programming.store.schedule_expiry(session_id, session["expires_at"])
+        
+        with self._lock:
+            self.stats['restored'] += 1
+        return True
+    
+    def start(self, start_task: Callable, sleep: Optional[Callable[[float], None]] = None):
+        """Start the periodic flush loop once, and flush again at exit."""
+        with self._lock:
+            if self._started or self.interval <= 0:
+                return
+            self._started = True
+        atexit.register(self._flush_at_exit)
+        start_task(self._run, sleep or time.sleep)
+    
+    def _run(self, sleep: Callable[[float], None]):
+        while True:
+            sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Pair session persistence error: {e}")
+    
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Pair session persistence error at exit: {e}")
@@ -1,182 +1,586 @@
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Set, Callable
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
+import os
 import secrets
+import sys
 from datetime import datetime, timedelta
 from threading import Lock
 
-# In-memory store for pair programming sessions
-# In production, use Redis or database-backed sessions
-_sessions: Dict[str, Dict] = {}
-_session_lock = Lock()
+from backend.services import text_ot
+from backend.services.session_store import create_pair_session_store
+
+# Sessions, their locks, the socket index and the expiry queues live in the
+# store picked by SESSION_STORE_URL: in memory by default, or in Redis so
+# several server processes can share them. Each session has its own lock,
+# so activity in one room never waits on another. Queued expiry checks are
+# invalidated lazily: when one comes due, the deadline is re-checked against
+# the session's current expiry or the participant's last activity.
+store = create_pair_session_store()
+# Optional write-behind persistence (see pair_persistence). When set, changed
+# sessions are marked dirty and missing sessions are restored on access.
+persistence = None
+# Optional edit recorder for replay (see pair_recording). When set, every
+# accepted code operation is appended to the session's recording.
+recorder = None
+# Optional archive for chat messages that overflow the buffer (see pair_chat)
+chat_archive = None
+_reaper_lock = Lock()
+_reaper_started = False
+
+REAPER_INTERVAL = float(os.getenv('PAIR_REAPER_INTERVAL', '30'))
+PARTICIPANT_IDLE_TIMEOUT = timedelta(seconds=int(os.getenv('PAIR_PARTICIPANT_IDLE_TIMEOUT', '1800')))
+
+# Code edits are exchanged as text operations (see text_ot). Each accepted
+# operation bumps the session revision. Operations are kept so that edits
+# made against an older revision can be transformed, and every
+# OP_COMPACT_INTERVAL operations the current code becomes the new snapshot
+# that joining clients start from.
+OP_HISTORY_LIMIT = int(os.getenv('PAIR_OP_HISTORY_LIMIT', '500'))
+OP_COMPACT_INTERVAL = int(os.getenv('PAIR_OP_COMPACT_INTERVAL', '100'))
+
+# Chat keeps the latest CHAT_BUFFER_SIZE messages in a ring buffer; older
+# ones are handed to the chat archive. Messages are numbered per session so
+# clients can page back with a cursor. Joining clients get the latest
+# CHAT_JOIN_LIMIT messages.
+CHAT_BUFFER_SIZE = int(os.getenv('PAIR_CHAT_BUFFER_SIZE', '100'))
+CHAT_JOIN_LIMIT = int(os.getenv('PAIR_CHAT_JOIN_LIMIT', '20'))
+
+
+class StaleRevisionError(ValueError):
+    """An operation was based on a revision the server no longer keeps."""
+
+@contextmanager
+def _locked_session(session_id: str, write: bool = True, persist: bool = True):
+    """Yield a live session, or None if it doesn't exist.
+    
+    With ``write`` the session is locked and changes are saved on exit;
+    otherwise it is a read-only snapshot. Writes are queued for persistence
+    unless ``persist`` is False (for changes to live-socket state only).
+    Expired sessions are removed on access, and sessions missing from the
+    store are restored from persistence.
+    """
+    expired = False
+    for attempt in range(2):
+        with (store.locked if write else store.snapshot)(session_id) as session:
+            live = session is not None and datetime.now() <= session["expires_at"]
+            if live:
+                yield session
+            expired = session is not None and not live
+        if live:
+            if write and persist and persistence is not None:
+                persistence.mark_dirty(session_id)
+            return
+        if expired or attempt or persistence is None or not persistence.restore(session_id):
+            break
+    if expired:
+        delete_session(session_id)
+    yield None
+
+def _participant_list(session: Dict) -> List[Dict]:
+    return [participant.copy() for participant in session["participants"].values()]
+
+def _touch_participant(session: Dict, socket_id: Optional[str], now: datetime):
+    participant = session["participants"].get(socket_id)
+    if participant:
+        participant["last_seen"] = now
+
+def _drop_participant(session: Dict, socket_id: str) -> bool:
+    """Remove a participant and their cursor and selection. Caller holds the session lock."""
+    session["cursors"].pop(socket_id, None)
+    session["selections"].pop(socket_id, None)
+    return session["participants"].pop(socket_id, None) is not None
 
 def create_session(host_user_id: Optional[int] = None, host_username: Optional[str] = None) -> str:
     """Create a new pair programming session and return session ID."""
     session_id = secrets.token_urlsafe(16)
+    code = 'print("Hello, StudyHall!")'
+    session = {
+        "host_user_id": host_user_id,
+        "host_username": host_username or "Host",
+        "participants": {},  # Participants by socket_id
+        "code": code,
+        "revision": 0,
+        "operations": [],  # Recent operations, oldest first
+        "snapshot": code,
+        "snapshot_revision": 0,
+        "output": "",
+        "messages": deque(maxlen=CHAT_BUFFER_SIZE),  # Latest chat messages
+        "message_seq": 0,  # Id of the last chat message
+        "cursors": {},  # Cursor positions by socket_id
+        "selections": {},  # Code selections by socket_id
+        "created_at": datetime.now(),
+        "expires_at": datetime.now() + timedelta(hours=24)
+    }
     
-    with _session_lock:
-        _sessions[session_id] = {
-            "host_user_id": host_user_id,
-            "host_username": host_username or "Host",
-            "participants": [],
-            "code": 'print("Hello, StudyHall!")',
-            "output": "",
-            "messages": [],  # Chat messages
-            "cursors": {},  # Cursor positions by socket_id
-            "selections": {},  # Code selections by socket_id
-            "created_at": datetime.now(),
-            "expires_at": datetime.now() + timedelta(hours=24)
-        }
+    store.add(session_id, session)
+    store.schedule_expiry(session_id, session["expires_at"])
+    if persistence is not None:
+        persistence.mark_dirty(session_id)
     
     return session_id
 
 def get_session(session_id: str) -> Optional[Dict]:
-    """Get session data."""
-    with _session_lock:
-        if session_id not in _sessions:
+    """Get a copy of the session data, with participants as a list.
+    
+    This copies the whole session; prefer the narrower accessors below.
+    """
+    with _locked_session(session_id, write=False) as session:
+        if session is None:
             return None
-        
-        session = _sessions[session_id]
-        if datetime.now() > session["expires_at"]:
-            del _sessions[session_id]
+        return {
+            **session,
+            "participants": _participant_list(session),
+            "operations": list(session["operations"]),
+            "messages": list(session["messages"]),
+            "cursors": dict(session["cursors"]),
+            "selections": dict(session["selections"])
+        }
+
+def session_exists(session_id: str) -> bool:
+    """Return True if the session exists and hasn't expired."""
+    with _locked_session(session_id, write=False) as session:
+        return session is not None
+
+def get_code(session_id: str) -> Optional[str]:
+    """Get the current code of a session."""
+    with _locked_session(session_id, write=False) as session:
+        return session["code"] if session else None
+
+def get_username(session_id: str, socket_id: str) -> Optional[str]:
+    """Get the username of the participant connected on ``socket_id``."""
+    with _locked_session(session_id, write=False) as session:
+        if session is None:
             return None
+        participant = session["participants"].get(socket_id)
+        return participant["username"] if participant else None
+
+def get_summary(session_id: str) -> Optional[Dict]:
+    """Get the fields the REST API exposes for a session."""
+    with _locked_session(session_id, write=False) as session:
+        if session is None:
+            return None
+        return {
+            "code": session["code"],
+            "output": session["output"],
+            "host_username": session["host_username"],
+            "participants": _participant_list(session),
+            "created_at": session["created_at"],
+            "expires_at": session["expires_at"]
+        }
+
+def _message_buffer(session: Dict) -> deque:
+    """Return the session's chat buffer as a deque.
+    
+    Sessions read back from Redis or a snapshot hold a plain list.
+    """
+    messages = session["messages"]
+    if not isinstance(messages, deque) or messages.maxlen != CHAT_BUFFER_SIZE:
+        messages = session["messages"] = deque(messages, maxlen=CHAT_BUFFER_SIZE)
+    return messages
+
+def _chat_entry(message: Dict) -> Dict:
+    return {
+        "id": message["id"],
+        "username": message["username"],
+        "message": message["message"],
+        "timestamp": message["timestamp"]
+    }
+
+def _latest_messages(messages, limit: int) -> List[Dict]:
+    return [_chat_entry(message) for message in islice(messages, max(0, len(messages) - limit), None)]
+
+def get_join_state(session_id: str, message_limit: Optional[int] = None) -> Optional[Dict]:
+    """Get everything a joining client needs, in one lock acquisition.
+    
+    ``code`` is the last snapshot; applying ``operations`` in order brings
+    it up to the current revision. ``messages`` holds the latest chat
+    messages; ``chat_cursor`` is the id to pass to ``get_messages`` for the
+    page before them, or None if there is none.
+    """
+    with _locked_session(session_id, write=False) as session:
+        if session is None:
+            return None
+        messages = _latest_messages(session["messages"], message_limit or CHAT_JOIN_LIMIT)
+        return {
+            **_code_state(session),
+            "output": session["output"],
+            "participants": _participant_list(session),
+            "messages": messages,
+            "chat_cursor": messages[0]["id"] if messages and messages[0]["id"] > 1 else None,
+            "cursors": dict(session["cursors"]),
+            "selections": dict(session["selections"])
+        }
+
+def _record_operation(session_id: str, session: Dict, ops: text_ot.Operation,
+                      socket_id: Optional[str]) -> Dict:
+    """Apply an operation at the head revision and append it to the history."""
+    before = session["code"]
+    session["code"] = text_ot.apply(before, ops)
+    session["revision"] += 1
+    entry = {"revision": session["revision"], "ops": ops, "socket_id": socket_id}
+    if recorder is not None:
+        participant = session["participants"].get(socket_id)
+        recorder.record(session_id, session["revision"], ops, before,
+                        participant["username"] if participant else None)
+    operations = session["operations"]
+    operations.append(entry)
+    
+    # Never let the snapshot fall behind the oldest operation still kept
+    if session["revision"] - session["snapshot_revision"] >= min(OP_COMPACT_INTERVAL, OP_HISTORY_LIMIT):
+        session["snapshot"] = session["code"]
+        session["snapshot_revision"] = session["revision"]
+    if len(operations) > OP_HISTORY_LIMIT:
+        del operations[:len(operations) - OP_HISTORY_LIMIT]
+    return entry
+
+def apply_code_operation(session_id: str, base_revision: int, ops: List,
+                         socket_id: Optional[str] = None) -> Optional[Dict]:
+    """Apply a client's operation made against ``base_revision``.
+    
+    The operation is transformed past every operation accepted since that
+    revision. Returns the stored entry (``revision``, transformed ``ops``,
+    ``socket_id``) or None if the session does not exist. Raises
+    StaleRevisionError if the base revision is too old to transform from and
+    ValueError if the operation does not fit the document.
+    """
+    ops = text_ot.normalize(ops)
+    with _locked_session(session_id) as session:
+        if session is None:
+            return None
+        
+        revision = session["revision"]
+        if not isinstance(base_revision, int) or base_revision < 0 or base_revision > revision:
+            raise ValueError(f"Invalid revision: {base_revision!r}")
+        
+        missed = revision - base_revision
+        operations = session["operations"]
+        if missed > len(operations):
+            raise StaleRevisionError(f"Revision {base_revision} is no longer available")
         
-        return session.copy()
+        for entry in operations[len(operations) - missed:] if missed else ():
+            ops, _ = text_ot.transform(ops, entry["ops"])
+        entry = _record_operation(session_id, session, ops, socket_id)
+        _touch_participant(session, socket_id, datetime.now())
+        return entry
 
-def update_session_code(session_id: str, code: str):
-    """Update the code in a session."""
-    with _session_lock:
-        if session_id in _sessions:
-            _sessions[session_id]["code"] = code
+def update_session_code(session_id: str, code: str) -> Optional[Dict]:
+    """Replace the code in a session, recording the change as an operation."""
+    with _locked_session(session_id) as session:
+        if session is None or session["code"] == code:
+            return None
+        return _record_operation(session_id, session, text_ot.diff(session["code"], code), None)
+
+def _code_state(session: Dict) -> Dict:
+    snapshot_revision = session["snapshot_revision"]
+    return {
+        "code": session["snapshot"],
+        "snapshot_revision": snapshot_revision,
+        "revision": session["revision"],
+        "operations": [
+            {"revision": entry["revision"], "ops": entry["ops"]}
+            for entry in session["operations"]
+            if entry["revision"] > snapshot_revision
+        ]
+    }
+
+def get_code_state(session_id: str) -> Optional[Dict]:
+    """Return the latest snapshot plus the operations applied since it.
+    
+    Applying ``operations`` to ``code`` in order gives the current code at
+    ``revision``.
+    """
+    with _locked_session(session_id, write=False) as session:
+        return _code_state(session) if session else None
 
 def update_session_output(session_id: str, output: str):
     """Update the output in a session."""
-    with _session_lock:
-        if session_id in _sessions:
-            _sessions[session_id]["output"] = output
+    with _locked_session(session_id) as session:
+        if session:
+            session["output"] = output
 
 def add_participant(session_id: str, user_id: Optional[int], username: str, socket_id: str):
     """Add a participant to a session."""
-    with _session_lock:
-        if session_id not in _sessions:
+    with _locked_session(session_id, persist=False) as session:
+        if session is None:
             return False
         
+        participants = session["participants"]
+        now = datetime.now()
         # Check if user is already in session
-        for participant in _sessions[session_id]["participants"]:
-            if participant.get("socket_id") == socket_id:
-                # Update last_seen
-                participant["last_seen"] = datetime.now()
-                return True
+        if socket_id in participants:
+            # Update last_seen
+            participants[socket_id]["last_seen"] = now
+            return True
         
-        _sessions[session_id]["participants"].append({
+        participants[socket_id] = {
             "user_id": user_id,
-            "username": username or f"User{len(_sessions[session_id]['participants'])}",
+            "username": username or f"User{len(participants)}",
             "socket_id": socket_id,
-            "joined_at": datetime.now(),
-            "last_seen": datetime.now(),
+            "joined_at": now,
+            "last_seen": now,
             "is_typing": False
-        })
+        }
+        store.index_socket(socket_id, session_id)
+        store.schedule_idle(session_id, socket_id, now + PARTICIPANT_IDLE_TIMEOUT)
         return True
 
 def remove_participant(session_id: str, socket_id: str):
     """Remove a participant from a session."""
-    with _session_lock:
-        if session_id in _sessions:
-            _sessions[session_id]["participants"] = [
-                p for p in _sessions[session_id]["participants"]
-                if p.get("socket_id") != socket_id
-            ]
-            
-            # Clean up empty sessions
-            if len(_sessions[session_id]["participants"]) == 0:
-                # Keep session for a bit in case host reconnects
-                pass
+    with _locked_session(session_id, persist=False) as session:
+        if session:
+            # Empty sessions are kept in case the host reconnects
+            _drop_participant(session, socket_id)
+            store.unindex_socket(socket_id, session_id)
+
+def disconnect_socket(socket_id: str) -> List[str]:
+    """Remove a disconnected socket from every session it joined.
+    
+    Returns the ids of the sessions it was removed from.
+    """
+    session_ids = store.pop_socket(socket_id)
+    
+    left = []
+    for session_id in session_ids:
+        with _locked_session(session_id, persist=False) as session:
+            if session and _drop_participant(session, socket_id):
+                left.append(session_id)
+    return left
 
 def get_participants(session_id: str) -> List[Dict]:
     """Get list of participants in a session."""
-    session = get_session(session_id)
-    if not session:
-        return []
-    return session.get("participants", [])
+    with _locked_session(session_id, write=False) as session:
+        return _participant_list(session) if session else []
 
 def delete_session(session_id: str):
     """Delete a session."""
-    with _session_lock:
-        if session_id in _sessions:
-            del _sessions[session_id]
+    session = store.remove(session_id)
+    if persistence is not None:
+        persistence.mark_deleted(session_id)
+    if recorder is not None:
+        recorder.close(session_id)
+    if chat_archive is not None:
+        chat_archive.mark_deleted(session_id)
+    if session:
+        for socket_id in list(session["participants"]):
+            store.unindex_socket(socket_id, session_id)
 
 def get_all_sessions() -> Dict[str, Dict]:
-    """Get all active sessions (for admin/debugging purposes)."""
-    with _session_lock:
-        # Filter out expired sessions
-        active_sessions = {}
-        now = datetime.now()
-        for session_id, session in _sessions.items():
-            if session["expires_at"] > now:
-                active_sessions[session_id] = session.copy()
-        return active_sessions
+    """Get a short summary of all active sessions (for admin/debugging purposes)."""
+    now = datetime.now()
+    sessions = {}
+    for session_id in store.session_ids():
+        with store.snapshot(session_id) as session:
+            if session is None or session["expires_at"] <= now:
+                continue
+            sessions[session_id] = {
+                "host_username": session["host_username"],
+                "participant_count": len(session["participants"]),
+                "created_at": session["created_at"],
+                "expires_at": session["expires_at"]
+            }
+    return sessions
 
 def extend_session(session_id: str, hours: int = 24):
     """Extend session expiration time."""
-    with _session_lock:
-        if session_id in _sessions:
-            _sessions[session_id]["expires_at"] = datetime.now() + timedelta(hours=hours)
-            return True
-        return False
-
-def add_message(session_id: str, username: str, message: str, socket_id: str):
-    """Add a chat message to a session."""
-    with _session_lock:
-        if session_id not in _sessions:
+    with _locked_session(session_id) as session:
+        if session is None:
             return False
+        session["expires_at"] = datetime.now() + timedelta(hours=hours)
+        store.schedule_expiry(session_id, session["expires_at"])
+        return True
+
+def add_message(session_id: str, username: str, message: str, socket_id: str) -> Optional[Dict]:
+    """Add a chat message to a session and return it, with its ``id``."""
+    with _locked_session(session_id) as session:
+        if session is None:
+            return None
+        
+        now = datetime.now()
+        _touch_participant(session, socket_id, now)
+        messages = _message_buffer(session)
+        # A full buffer drops its oldest message on append, so archive it first
+        if len(messages) == messages.maxlen and chat_archive is not None:
+            chat_archive.append(session_id, messages[0])
         
-        _sessions[session_id]["messages"].append({
+        session["message_seq"] += 1
+        entry = {
+            "id": session["message_seq"],
             "username": username,
             "message": message,
             "socket_id": socket_id,
-            "timestamp": datetime.now()
-        })
-        
-        # Keep only last 100 messages
-        if len(_sessions[session_id]["messages"]) > 100:
-            _sessions[session_id]["messages"] = _sessions[session_id]["messages"][-100:]
-        
-        return True
+            "timestamp": now
+        }
+        messages.append(entry)
+        return _chat_entry(entry)
+
+def get_messages(session_id: str, before: Optional[int] = None, limit: int = 50) -> Optional[Dict]:
+    """Page back through a session's chat, newest page first.
+    
+    Returns up to ``limit`` messages with ids below ``before`` (or the latest
+    ones), oldest first, and the ``cursor`` for the page before them, or None
+    if the session does not exist. Messages still in the buffer are served
+    from memory; older ones come from the chat archive.
+    """
+    with _locked_session(session_id, write=False) as session:
+        if session is None:
+            return None
+        buffered = [message for message in session["messages"] if before is None or message["id"] < before]
+        page = _latest_messages(buffered, limit)
+        # Everything below the buffer's oldest message is in the archive
+        oldest = session["messages"][0]["id"] if session["messages"] else session["message_seq"] + 1
+    
+    if len(page) < limit and chat_archive is not None:
+        start = oldest if before is None else min(before, oldest)
+        page = chat_archive.get_page(session_id, start, limit - len(page)) + page
+    return {
+        "messages": page,
+        "cursor": page[0]["id"] if page and page[0]["id"] > 1 else None
+    }
 
 def update_cursor(session_id: str, socket_id: str, position: Dict):
     """Update cursor position for a participant."""
-    with _session_lock:
-        if session_id in _sessions:
-            _sessions[session_id]["cursors"][socket_id] = {
-                **position,
-                "updated_at": datetime.now()
-            }
+    apply_presence(session_id, {socket_id: {"position": position}})
 
 def update_selection(session_id: str, socket_id: str, selection: Dict):
-    """Update code selection for a participant."""
-    with _session_lock:
-        if session_id in _sessions:
-            if selection:
-                _sessions[session_id]["selections"][socket_id] = {
-                    **selection,
-                    "updated_at": datetime.now()
-                }
-            else:
-                # Remove selection if empty
-                _sessions[session_id]["selections"].pop(socket_id, None)
+    """Update code selection for a participant (an empty selection clears it)."""
+    apply_presence(session_id, {socket_id: {"selection": selection}})
 
 def set_typing(session_id: str, socket_id: str, is_typing: bool):
     """Set typing status for a participant."""
-    with _session_lock:
-        if session_id in _sessions:
-            for participant in _sessions[session_id]["participants"]:
-                if participant.get("socket_id") == socket_id:
-                    participant["is_typing"] = is_typing
-                    participant["last_seen"] = datetime.now()
-                    break
-
-
-
+    apply_presence(session_id, {socket_id: {"is_typing": is_typing}})
 
+def apply_presence(session_id: str, updates: Dict[str, Dict]) -> Optional[Dict[str, str]]:
+    """Store a batch of presence updates keyed by socket id.
+    
+    Each update may carry ``position``, ``selection`` (None clears it) and
+    ``is_typing``. Updates from sockets that aren't participants (never
+    joined, or left before a batched update was applied) are ignored, so they
+    can't leave cursors behind that nothing would remove. Returns the
+    usernames of the updated sockets, or None if the session does not exist.
+    """
+    with _locked_session(session_id, persist=False) as session:
+        if session is None:
+            return None
+        
+        now = datetime.now()
+        usernames = {}
+        for socket_id, update in updates.items():
+            participant = session["participants"].get(socket_id)
+            if not participant:
+                continue
+            usernames[socket_id] = participant["username"]
+            participant["last_seen"] = now
+            if "is_typing" in update:
+                participant["is_typing"] = update["is_typing"]
+            
+            if "position" in update:
+                session["cursors"][socket_id] = {**update["position"], "updated_at": now}
+            if "selection" in update:
+                if update["selection"]:
+                    session["selections"][socket_id] = {**update["selection"], "updated_at": now}
+                else:
+                    session["selections"].pop(socket_id, None)
+        return usernames
 
+def reap_expired(now: Optional[datetime] = None) -> Dict:
+    """Delete expired sessions and drop idle participants.
+    
+    Only queued checks that are due are examined, so each call costs
+    O(k log n) for k due entries. Returns ``{"sessions": [session_id, ...],
+    "participants": {session_id: [socket_id, ...]}}``.
+    """
+    now = now or datetime.now()
+    expired = []
+    for session_id in store.pop_due_expiries(now):
+        with store.snapshot(session_id) as session:
+            # Extended sessions have a later check queued; skip the stale one
+            if session is None or session["expires_at"] > now:
+                continue
+        expired.append(session_id)
+        delete_session(session_id)
+    
+    idle: Dict[str, List[str]] = {}
+    for session_id, socket_id in store.pop_due_idle(now):
+        with _locked_session(session_id, persist=False) as session:
+            if session is None:
+                continue
+            participant = session["participants"].get(socket_id)
+            if participant is None:
+                continue
+            deadline = participant["last_seen"] + PARTICIPANT_IDLE_TIMEOUT
+            if deadline > now:
+                # Active since the entry was queued; check again later
+                store.schedule_idle(session_id, socket_id, deadline)
+                continue
+            _drop_participant(session, socket_id)
+            store.unindex_socket(socket_id, session_id)
+            idle.setdefault(session_id, []).append(socket_id)
+    
+    return {"sessions": expired, "participants": idle}
 
+def start_reaper(start_task: Callable, sleep: Callable[[float], None],
+                 on_reaped: Optional[Callable[[Dict], None]] = None):
+    """Start the periodic reaper once, using the server's task runner."""
+    global _reaper_started
+    with _reaper_lock:
+        if _reaper_started:
+            return
+        _reaper_started = True
+    
+    def run():
+        while True:
+            sleep(REAPER_INTERVAL)
+            try:
+                reaped = reap_expired()
+                if on_reaped and (reaped["sessions"] or reaped["participants"]):
+                    on_reaped(reaped)
+            except Exception as e:
+                print(f"Pair session reaper error: {e}")
+    
+    start_task(run)
 
+def _deep_sizeof(obj, seen: Set[int]) -> int:
+    """Approximate memory used by an object and everything it contains."""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, deque)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    return size
 
+def get_memory_stats(top: int = 10) -> Dict:
+    """Report approximate memory use of the session store.
+    
+    Sizes are measured per session, so this walks every session; it is
+    meant for the metrics endpoint, not for hot paths.
+    """
+    stats = store.stats()
+    
+    per_session = []
+    for session_id in store.session_ids():
+        with _locked_session(session_id, write=False) as session:
+            if session is None:
+                continue
+            per_session.append({
+                "session_id": session_id,
+                "bytes": _deep_sizeof(session, set()),
+                "participants": len(session["participants"]),
+                "operations": len(session["operations"]),
+                "messages": len(session["messages"]),
+                "code_length": len(session["code"])
+            })
+    
+    total = sum(item["bytes"] for item in per_session)
+    per_session.sort(key=lambda item: item["bytes"], reverse=True)
+    stats.update({
+        "participants": sum(item["participants"] for item in per_session),
+        "total_bytes": total,
+        "avg_bytes_per_session": total // len(per_session) if per_session else 0,
+        "largest_sessions": per_session[:top]
+    })
+    return stats
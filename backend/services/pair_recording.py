@@ -0,0 +1,288 @@
+"""
+Recording of pair-programming edits for replay.
+
+Every accepted code operation is appended to the session's open segment in
+memory, which is a list append. A segment starts with a checkpoint, a full
+copy of the code before its first edit, and holds up to
+``RECORDING_CHECKPOINT_INTERVAL`` edits as text operations with their time
+offsets. A background loop writes new and grown segments to the database
+every ``RECORDING_FLUSH_INTERVAL`` seconds, compressed with zlib.
+
+To find the code at a given time, the segment index on (session_id,
+start_time) finds the last segment that started by then in O(log n). Its
+checkpoint is then replayed up to that time, which costs at most one
+segment's worth of edits.
+
+If several server processes edit the same session, each records the edits it
+accepted. A segment is closed when its revisions would skip one, so every
+segment stays a contiguous run from its checkpoint.
+"""
+import atexit
+import json
+import os
+import time
+import zlib
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Set
+
+from backend.database import SessionLocal
+from backend.models import PairRecordingSegment
+from backend.services import text_ot
+from backend.services.offload import run_blocking
+
+
+RECORDING_FLUSH_INTERVAL = float(os.getenv('PAIR_RECORDING_FLUSH_INTERVAL', '5'))  # Seconds, 0 disables
+RECORDING_CHECKPOINT_INTERVAL = int(os.getenv('PAIR_RECORDING_CHECKPOINT_INTERVAL', '200'))  # Edits per segment
+RECORDING_RETENTION = timedelta(days=int(os.getenv('PAIR_RECORDING_RETENTION_DAYS', '30')))
+
+
+def _decode_edits(data: bytes) -> List[List]:
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+class _Segment:
+    """Edits recorded since a checkpoint. Each edit is [offset_ms, ops, username]."""
+    
+    __slots__ = ('base_revision', 'checkpoint', 'start_time', 'edits')
+    
+    def __init__(self, base_revision: int, checkpoint: str, start_time: datetime):
+        self.base_revision = base_revision
+        self.checkpoint = checkpoint
+        self.start_time = start_time
+        self.edits: List[List] = []
+    
+    @property
+    def end_revision(self) -> int:
+        return self.base_revision + len(self.edits)
+
+
+class SessionRecorder:
+    """Records code operations per session and writes them in batches."""
+    
+    def __init__(self, session_factory: Callable = SessionLocal,
+                 interval: float = RECORDING_FLUSH_INTERVAL,
+                 checkpoint_interval: int = RECORDING_CHECKPOINT_INTERVAL):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.checkpoint_interval = checkpoint_interval
+        self._lock = Lock()
+        self._open: Dict[str, _Segment] = {}
+        self._dirty: Set[str] = set()  # Sessions whose open segment grew since the last flush
+        self._sealed: List[tuple] = []  # (session_id, segment) pairs waiting to be written
+        self._started = False
+        self.stats = {'recorded': 0, 'segments_written': 0, 'flushes': 0, 'raw_bytes': 0, 'compressed_bytes': 0}
+    
+    def record(self, session_id: str, revision: int, ops: text_ot.Operation, before: str,
+               username: Optional[str] = None):
+        """Append an accepted operation that took ``before`` to ``revision``.
+        
+        Called with the session lock held, so it only touches memory.
+        """
+        now = datetime.now()
+        with self._lock:
+            self.stats['recorded'] += 1
+            segment = self._open.get(session_id)
+            if segment is not None and (
+                revision != segment.end_revision + 1 or len(segment.edits) >= self.checkpoint_interval
+            ):
+                self._sealed.append((session_id, segment))
+                segment = None
+            if segment is None:
+                segment = self._open[session_id] = _Segment(revision - 1, before, now)
+            offset = int((now - segment.start_time).total_seconds() * 1000)
+            segment.edits.append([offset, ops, username])
+            self._dirty.add(session_id)
+    
+    def close(self, session_id: str):
+        """Seal a session's open segment, e.g. when the session is deleted."""
+        with self._lock:
+            segment = self._open.pop(session_id, None)
+            self._dirty.discard(session_id)
+            if segment is not None:
+                self._sealed.append((session_id, segment))
+    
+    def flush(self, session_id: Optional[str] = None) -> int:
+        """Write sealed segments and the grown part of open ones, for one session if given.
+        
+        Returns the number of segments written. If the write fails, they
+        stay queued for the next flush.
+        """
+        with self._lock:
+            if session_id is None:
+                sealed, self._sealed = self._sealed, []
+                dirty, self._dirty = self._dirty, set()
+            else:
+                sealed = [item for item in self._sealed if item[0] == session_id]
+                if sealed:
+                    self._sealed = [item for item in self._sealed if item[0] != session_id]
+                dirty = self._dirty & {session_id}
+                self._dirty -= dirty
+            # Open segments keep growing, so copy their edits under the lock
+            pending = [(session_id, segment, segment.edits) for session_id, segment in sealed] + [
+                (session_id, self._open[session_id], list(self._open[session_id].edits))
+                for session_id in dirty if session_id in self._open
+            ]
+        if not pending:
+            return 0
+        # Expired segments are pruned by the periodic flush, not on every read
+        prune = session_id is None
+        
+        rows = []
+        raw_bytes = compressed_bytes = 0
+        for session_id, segment, edits in pending:
+            raw = json.dumps(edits, separators=(',', ':')).encode('utf-8')
+            data = zlib.compress(raw)
+            raw_bytes += len(raw)
+            compressed_bytes += len(data)
+            rows.append(PairRecordingSegment(
+                session_id=session_id,
+                base_revision=segment.base_revision,
+                end_revision=segment.base_revision + len(edits),
+                start_time=segment.start_time,
+                end_time=segment.start_time + timedelta(milliseconds=edits[-1][0]),
+                checkpoint=segment.checkpoint,
+                data=data
+            ))
+        
+        try:
+            # The database write blocks, so keep it off the event loop
+            run_blocking(self._write, rows, prune)
+        except Exception:
+            with self._lock:
+                self._sealed = sealed + self._sealed
+                self._dirty |= dirty
+            raise
+        
+        with self._lock:
+            self.stats['flushes'] += 1
+            self.stats['segments_written'] += len(rows)
+            self.stats['raw_bytes'] += raw_bytes
+            self.stats['compressed_bytes'] += compressed_bytes
+        return len(rows)
+    
+    def _write(self, rows: List[PairRecordingSegment], prune: bool = True):
+        db = self.session_factory()
+        try:
+            for row in rows:
+                db.merge(row)
+            if prune:
+                db.query(PairRecordingSegment).filter(
+                    PairRecordingSegment.end_time < datetime.now() - RECORDING_RETENTION
+                ).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    def _query(self, fn: Callable, *args):
+        db = self.session_factory()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+    
+    def get_timeline(self, session_id: str) -> List[Dict]:
+        """List a session's recorded segments, oldest first."""
+        self.flush(session_id)
+        
+        def query(db):
+            return db.query(
+                PairRecordingSegment.base_revision, PairRecordingSegment.end_revision,
+                PairRecordingSegment.start_time, PairRecordingSegment.end_time
+            ).filter(
+                PairRecordingSegment.session_id == session_id
+            ).order_by(PairRecordingSegment.base_revision).all()
+        
+        return [
+            {"base_revision": base, "end_revision": end, "start_time": start, "end_time": end_time}
+            for base, end, start, end_time in run_blocking(self._query, query)
+        ]
+    
+    def seek(self, session_id: str, at: datetime) -> Optional[Dict]:
+        """Return the code as it was at time ``at``.
+        
+        Returns ``code``, ``revision`` and the ``timestamp`` of the last edit
+        applied, or None if nothing was recorded by then. Recordings are kept
+        in naive local time, so a timezone-aware ``at`` is converted to it.
+        """
+        if at.tzinfo is not None:
+            at = at.astimezone().replace(tzinfo=None)
+        self.flush(session_id)
+        
+        def query(db):
+            return db.query(PairRecordingSegment).filter(
+                PairRecordingSegment.session_id == session_id,
+                PairRecordingSegment.start_time <= at
+            ).order_by(PairRecordingSegment.start_time.desc()).first()
+        
+        row = run_blocking(self._query, query)
+        if row is None:
+            return None
+        
+        edits = _decode_edits(row.data)
+        offset = (at - row.start_time).total_seconds() * 1000
+        count = bisect_right([edit[0] for edit in edits], offset)
+        code = row.checkpoint
+        for edit in edits[:count]:
+            code = text_ot.apply(code, edit[1])
+        return {
+            "code": code,
+            "revision": row.base_revision + count,
+            "timestamp": row.start_time + timedelta(milliseconds=edits[count - 1][0])
+        }
+    
+    def get_edits(self, session_id: str, after_revision: int = 0, limit: int = 500) -> List[Dict]:
+        """Return up to ``limit`` recorded edits after ``after_revision``, in order.
+        
+        Applying them to the code from ``seek`` plays the session forward.
+        """
+        self.flush(session_id)
+        
+        def query(db):
+            return db.query(PairRecordingSegment).filter(
+                PairRecordingSegment.session_id == session_id,
+                PairRecordingSegment.end_revision > after_revision
+            ).order_by(PairRecordingSegment.base_revision).all()
+        
+        edits = []
+        for row in run_blocking(self._query, query):
+            for index, (offset, ops, username) in enumerate(_decode_edits(row.data)):
+                revision = row.base_revision + index + 1
+                if revision <= after_revision:
+                    continue
+                if len(edits) >= limit:
+                    return edits
+                edits.append({
+                    "revision": revision,
+                    "ops": ops,
+                    "username": username,
+                    "timestamp": row.start_time + timedelta(milliseconds=offset)
+                })
+        return edits
+    
+    def start(self, start_task: Callable, sleep: Optional[Callable[[float], None]] = None):
+        """Start the periodic flush loop once, and flush again at exit."""
+        with self._lock:
+            if self._started or self.interval <= 0:
+                return
+            self._started = True
+        atexit.register(self._flush_at_exit)
+        start_task(self._run, sleep or time.sleep)
+    
+    def _run(self, sleep: Callable[[float], None]):
+        while True:
+            sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Pair session recording error: {e}")
+    
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Pair session recording error at exit: {e}")
@@ -0,0 +1,94 @@
+"""
+Coalescing of pair-programming presence events (cursors, selections, typing).
+
+Clients send presence events far more often than anyone can see them. The
+aggregator keeps only the latest state per socket and flushes one batched
+``presence_updated`` message per room at ``PRESENCE_FLUSH_HZ``. Each flush
+also writes the batch to the session store under a single lock acquisition.
+"""
+import os
+import time
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+from backend.services import pair_programming
+
+
+PRESENCE_FLUSH_HZ = float(os.getenv('PAIR_PRESENCE_FLUSH_HZ', '20'))
+
+
+class PresenceAggregator:
+    """Buffers the latest presence state per socket and flushes it in batches."""
+    
+    def __init__(self, emit: Callable[[str, Dict[str, Any]], None],
+                 flush_hz: float = PRESENCE_FLUSH_HZ):
+        self.emit = emit
+        self.interval = 1.0 / flush_hz
+        self._lock = Lock()
+        self._pending: Dict[str, Dict[str, Dict[str, Any]]] = {}  # room -> sid -> fields
+        self._coalesced: Dict[str, int] = {}  # room -> events dropped since last flush
+        self._started = False
+        self.stats = {'events': 0, 'coalesced': 0, 'flushes': 0, 'messages': 0}
+    
+    def update(self, room: str, sid: str, **fields):
+        """Record the latest presence fields for a socket in a room."""
+        with self._lock:
+            self.stats['events'] += 1
+            state = self._pending.setdefault(room, {}).setdefault(sid, {})
+            if any(name in state for name in fields):
+                # An unsent value is being replaced, so one event is dropped
+                self.stats['coalesced'] += 1
+                self._coalesced[room] = self._coalesced.get(room, 0) + 1
+            state.update(fields)
+    
+    def discard(self, room: str, sid: str):
+        """Forget unsent presence for a socket that left the room."""
+        with self._lock:
+            room_pending = self._pending.get(room)
+            if room_pending:
+                room_pending.pop(sid, None)
+    
+    def flush(self) -> int:
+        """Store and broadcast everything pending. Returns the messages sent."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            coalesced, self._coalesced = self._coalesced, {}
+        
+        sent = 0
+        for room, states in pending.items():
+            if not states:
+                continue
+            usernames = pair_programming.apply_presence(room, states)
+            if usernames is None:
+                continue  # The session is gone
+            
+            # Only sockets still in the session were applied; the rest left or never joined
+            updates = [
+                {'socket_id': sid, 'username': usernames[sid], **fields}
+                for sid, fields in states.items() if sid in usernames
+            ]
+            if not updates:
+                continue
+            self.emit(room, {'updates': updates, 'coalesced': coalesced.get(room, 0)})
+            sent += 1
+        
+        with self._lock:
+            self.stats['flushes'] += 1
+            self.stats['messages'] += sent
+        return sent
+    
+    def start(self, start_task: Callable, sleep: Optional[Callable[[float], None]] = None):
+        """Start the periodic flush loop once, using the server's task runner."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        start_task(self._run, sleep or time.sleep)
+    
+    def _run(self, sleep: Callable[[float], None]):
+        while True:
+            sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Presence flush error: {e}")
@@ -0,0 +1,482 @@
+"""
+Storage backends for pair-programming sessions and login sessions.
+
+The default in-memory backends keep everything in this process. The Redis
+backends keep it in a Redis server (or anything speaking the protocol), so
+several server processes can share sessions. The backend is picked from
+``SESSION_STORE_URL``: ``memory://`` (the default) or a ``redis://`` URL.
+
+Pair sessions are plain dicts. ``locked()`` gives exclusive read-modify-write
+access to one session, and ``snapshot()`` gives a consistent read-only view.
+Redis values are JSON; datetimes are tagged so they round-trip, and deques
+are stored as lists.
+"""
+import heapq
+import json
+from collections import deque
+import os
+import secrets
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+
+SESSION_STORE_URL = os.getenv('SESSION_STORE_URL', 'memory://')
+REDIS_KEY_PREFIX = os.getenv('SESSION_STORE_PREFIX', 'studyhall:')
+# Seconds to wait for another process to release a pair session
+REDIS_LOCK_TIMEOUT = float(os.getenv('SESSION_STORE_LOCK_TIMEOUT', '5'))
+# Redis keys outlive the session's own expiry by this much, as a backstop
+# for when no reaper is running
+REDIS_EXPIRY_GRACE = timedelta(hours=1)
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, deque):
+        return list(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _json_object_hook(obj: Dict[str, Any]):
+    if len(obj) == 1 and '$datetime' in obj:
+        return datetime.fromisoformat(obj['$datetime'])
+    return obj
+
+
+def encode_value(value: Any) -> str:
+    """Encode a value for storage, keeping datetimes intact."""
+    return json.dumps(value, default=_json_default, separators=(',', ':'))
+
+
+def decode_value(raw: str) -> Any:
+    """Decode a value written by ``encode_value``."""
+    return json.loads(raw, object_hook=_json_object_hook)
+
+
+class PairSessionStore(ABC):
+    """Interface for pair-programming session storage."""
+    
+    @abstractmethod
+    def add(self, session_id: str, session: Dict):
+        """Store a new session."""
+    
+    @abstractmethod
+    def remove(self, session_id: str) -> Optional[Dict]:
+        """Delete a session and return its last state, if it existed."""
+    
+    @abstractmethod
+    def locked(self, session_id: str) -> Iterator[Optional[Dict]]:
+        """Context manager yielding the session (or None) with exclusive access.
+        
+        Changes made to the yielded dict are saved when the block exits
+        without an exception. What happens to changes made before an
+        exception depends on the store: the Redis store discards them, while
+        the in-memory store yields the stored dict itself, so they are kept.
+        Callers should not rely on either; validate before mutating.
+        """
+    
+    @abstractmethod
+    def snapshot(self, session_id: str) -> Iterator[Optional[Dict]]:
+        """Context manager yielding a consistent, read-only view of a session."""
+    
+    @abstractmethod
+    def session_ids(self) -> List[str]:
+        """Return the ids of all stored sessions."""
+    
+    @abstractmethod
+    def index_socket(self, socket_id: str, session_id: str):
+        """Record that a socket has joined a session."""
+    
+    @abstractmethod
+    def unindex_socket(self, socket_id: str, session_id: str):
+        """Forget that a socket is in a session."""
+    
+    @abstractmethod
+    def socket_sessions(self, socket_id: str) -> Set[str]:
+        """Return the sessions a socket has joined."""
+    
+    @abstractmethod
+    def pop_socket(self, socket_id: str) -> Set[str]:
+        """Forget a socket entirely and return the sessions it had joined."""
+    
+    @abstractmethod
+    def schedule_expiry(self, session_id: str, when: datetime):
+        """Queue a session to be checked for expiry at ``when``."""
+    
+    @abstractmethod
+    def pop_due_expiries(self, now: datetime) -> List[str]:
+        """Remove and return sessions whose expiry check is due."""
+    
+    @abstractmethod
+    def schedule_idle(self, session_id: str, socket_id: str, when: datetime):
+        """Queue a participant to be checked for inactivity at ``when``."""
+    
+    @abstractmethod
+    def pop_due_idle(self, now: datetime) -> List[Tuple[str, str]]:
+        """Remove and return (session_id, socket_id) pairs whose idle check is due."""
+    
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Return counts describing the store's size."""
+
+
+class InMemoryPairSessionStore(PairSessionStore):
+    """Process-local store with one lock per session.
+    
+    ``_registry_lock`` guards the registry, the socket index and the expiry
+    heaps. A session lock may be held while taking ``_registry_lock``, never
+    the other way round. Heap entries are invalidated lazily: callers
+    re-check deadlines against the session when entries are popped.
+    
+    ``locked()`` yields the stored dict rather than a copy, so changes made
+    before an exception in the block are not rolled back.
+    """
+    
+    def __init__(self):
+        self._sessions: Dict[str, Dict] = {}
+        self._session_locks: Dict[str, Lock] = {}
+        self._registry_lock = Lock()
+        self._socket_sessions: Dict[str, Set[str]] = {}
+        self._expiry_heap: List[Tuple[datetime, str]] = []
+        self._idle_heap: List[Tuple[datetime, str, str]] = []
+    
+    def add(self, session_id: str, session: Dict):
+        with self._registry_lock:
+            self._sessions[session_id] = session
+            self._session_locks[session_id] = Lock()
+    
+    def remove(self, session_id: str) -> Optional[Dict]:
+        with self._registry_lock:
+            self._session_locks.pop(session_id, None)
+            return self._sessions.pop(session_id, None)
+    
+    @contextmanager
+    def locked(self, session_id: str):
+        with self._registry_lock:
+            session = self._sessions.get(session_id)
+            lock = self._session_locks.get(session_id)
+        if session is None:
+            yield None
+            return
+        with lock:
+            yield session
+    
+    # Sessions are shared dicts, so a read-only view is the locked session
+    snapshot = locked
+    
+    def session_ids(self) -> List[str]:
+        with self._registry_lock:
+            return list(self._sessions)
+    
+    def index_socket(self, socket_id: str, session_id: str):
+        with self._registry_lock:
+            self._socket_sessions.setdefault(socket_id, set()).add(session_id)
+    
+    def unindex_socket(self, socket_id: str, session_id: str):
+        with self._registry_lock:
+            session_ids = self._socket_sessions.get(socket_id)
+            if session_ids is not None:
+                session_ids.discard(session_id)
+                if not session_ids:
+                    del self._socket_sessions[socket_id]
+    
+    def socket_sessions(self, socket_id: str) -> Set[str]:
+        with self._registry_lock:
+            return set(self._socket_sessions.get(socket_id, ()))
+    
+    def pop_socket(self, socket_id: str) -> Set[str]:
+        with self._registry_lock:
+            return self._socket_sessions.pop(socket_id, set())
+    
+    def schedule_expiry(self, session_id: str, when: datetime):
+        with self._registry_lock:
+            heapq.heappush(self._expiry_heap, (when, session_id))
+    
+    def pop_due_expiries(self, now: datetime) -> List[str]:
+        due = []
+        with self._registry_lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                due.append(heapq.heappop(self._expiry_heap)[1])
+        return due
+    
+    def schedule_idle(self, session_id: str, socket_id: str, when: datetime):
+        with self._registry_lock:
+            heapq.heappush(self._idle_heap, (when, session_id, socket_id))
+    
+    def pop_due_idle(self, now: datetime) -> List[Tuple[str, str]]:
+        due = []
+        with self._registry_lock:
+            while self._idle_heap and self._idle_heap[0][0] <= now:
+                _, session_id, socket_id = heapq.heappop(self._idle_heap)
+                due.append((session_id, socket_id))
+        return due
+    
+    def stats(self) -> Dict[str, int]:
+        with self._registry_lock:
+            return {
+                "sessions": len(self._sessions),
+                "indexed_sockets": len(self._socket_sessions),
+                "expiry_queue_size": len(self._expiry_heap),
+                "idle_queue_size": len(self._idle_heap)
+            }
+
+
+class RedisPairSessionStore(PairSessionStore):
+    """Pair sessions shared between processes through Redis.
+    
+    Each session is a hash with one JSON-encoded field per top-level key, so
+    saving only rewrites the fields that changed. Exclusive access uses a
+    lock key set with NX and a TTL, so a crashed process can't hold a
+    session forever. Expiry and idle checks are sorted sets scored by
+    deadline. Removing a member claims it, so with several processes
+    reaping, each entry is handled only once.
+    
+    The client must be created with ``decode_responses=True``.
+    """
+    
+    def __init__(self, client, prefix: str = REDIS_KEY_PREFIX + 'pair:',
+                 lock_timeout: float = REDIS_LOCK_TIMEOUT, lock_ttl: float = 10.0):
+        self.client = client
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+        self.lock_ttl_ms = int(lock_ttl * 1000)
+        self._ids_key = f'{prefix}sessions'
+        self._sockets_key = f'{prefix}sockets'
+        self._expiry_key = f'{prefix}expiry'
+        self._idle_key = f'{prefix}idle'
+    
+    def _session_key(self, session_id: str) -> str:
+        return f'{self.prefix}session:{session_id}'
+    
+    def _socket_key(self, socket_id: str) -> str:
+        return f'{self.prefix}socket:{socket_id}'
+    
+    def add(self, session_id: str, session: Dict):
+        pipe = self.client.pipeline()
+        pipe.hset(self._session_key(session_id), mapping={k: encode_value(v) for k, v in session.items()})
+        pipe.expireat(self._session_key(session_id), session["expires_at"] + REDIS_EXPIRY_GRACE)
+        pipe.sadd(self._ids_key, session_id)
+        pipe.execute()
+    
+    def remove(self, session_id: str) -> Optional[Dict]:
+        pipe = self.client.pipeline()
+        pipe.hgetall(self._session_key(session_id))
+        pipe.delete(self._session_key(session_id))
+        pipe.srem(self._ids_key, session_id)
+        raw, _, _ = pipe.execute()
+        return self._decode(raw)
+    
+    @staticmethod
+    def _decode(raw: Dict[str, str]) -> Optional[Dict]:
+        if not raw:
+            return None
+        return {field: decode_value(value) for field, value in raw.items()}
+    
+    def _acquire(self, lock_key: str) -> str:
+        token = secrets.token_hex(8)
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.001
+        while not self.client.set(lock_key, token, nx=True, px=self.lock_ttl_ms):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'Timed out waiting for {lock_key}')
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        return token
+    
+    def _release(self, lock_key: str, token: str):
+        # Only delete the lock if it is still ours (it may have timed out)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(lock_key)
+                if pipe.get(lock_key) == token:
+                    pipe.multi()
+                    pipe.delete(lock_key)
+                    pipe.execute()
+                else:
+                    pipe.unwatch()
+            except Exception as e:
+                print(f"Failed to release {lock_key}: {e}")
+    
+    @contextmanager
+    def locked(self, session_id: str):
+        key = self._session_key(session_id)
+        lock_key = f'{self.prefix}lock:{session_id}'
+        token = self._acquire(lock_key)
+        try:
+            raw = self.client.hgetall(key)
+            session = self._decode(raw)
+            yield session
+            if session is None:
+                return
+            
+            changed = {}
+            for field, value in session.items():
+                encoded = encode_value(value)
+                if raw.get(field) != encoded:
+                    changed[field] = encoded
+            removed = [field for field in raw if field not in session]
+            if changed or removed:
+                pipe = self.client.pipeline()
+                if changed:
+                    pipe.hset(key, mapping=changed)
+                if removed:
+                    pipe.hdel(key, *removed)
+                if 'expires_at' in changed:
+                    pipe.expireat(key, session["expires_at"] + REDIS_EXPIRY_GRACE)
+                pipe.execute()
+        finally:
+            self._release(lock_key, token)
+    
+    @contextmanager
+    def snapshot(self, session_id: str):
+        # HGETALL is atomic, so no lock is needed for a consistent read
+        yield self._decode(self.client.hgetall(self._session_key(session_id)))
+    
+    def session_ids(self) -> List[str]:
+        return list(self.client.smembers(self._ids_key))
+    
+    def index_socket(self, socket_id: str, session_id: str):
+        pipe = self.client.pipeline()
+        pipe.sadd(self._socket_key(socket_id), session_id)
+        pipe.sadd(self._sockets_key, socket_id)
+        pipe.execute()
+    
+    def unindex_socket(self, socket_id: str, session_id: str):
+        key = self._socket_key(socket_id)
+        pipe = self.client.pipeline()
+        pipe.srem(key, session_id)
+        pipe.scard(key)
+        _, remaining = pipe.execute()
+        if not remaining:
+            self.client.srem(self._sockets_key, socket_id)
+    
+    def socket_sessions(self, socket_id: str) -> Set[str]:
+        return set(self.client.smembers(self._socket_key(socket_id)))
+    
+    def pop_socket(self, socket_id: str) -> Set[str]:
+        key = self._socket_key(socket_id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.smembers(key)
+        pipe.delete(key)
+        pipe.srem(self._sockets_key, socket_id)
+        session_ids, _, _ = pipe.execute()
+        return set(session_ids)
+    
+    def _claim_due(self, key: str, now: datetime) -> List[str]:
+        members = self.client.zrangebyscore(key, '-inf', now.timestamp())
+        if not members:
+            return []
+        pipe = self.client.pipeline()
+        for member in members:
+            pipe.zrem(key, member)
+        return [member for member, removed in zip(members, pipe.execute()) if removed]
+    
+    def schedule_expiry(self, session_id: str, when: datetime):
+        self.client.zadd(self._expiry_key, {session_id: when.timestamp()})
+    
+    def pop_due_expiries(self, now: datetime) -> List[str]:
+        return self._claim_due(self._expiry_key, now)
+    
+    def schedule_idle(self, session_id: str, socket_id: str, when: datetime):
+        self.client.zadd(self._idle_key, {f'{session_id}|{socket_id}': when.timestamp()})
+    
+    def pop_due_idle(self, now: datetime) -> List[Tuple[str, str]]:
+        return [tuple(member.split('|', 1)) for member in self._claim_due(self._idle_key, now)]
+    
+    def stats(self) -> Dict[str, int]:
+        pipe = self.client.pipeline()
+        pipe.scard(self._ids_key)
+        pipe.scard(self._sockets_key)
+        pipe.zcard(self._expiry_key)
+        pipe.zcard(self._idle_key)
+        sessions, sockets, expiry, idle = pipe.execute()
+        return {
+            "sessions": sessions,
+            "indexed_sockets": sockets,
+            "expiry_queue_size": expiry,
+            "idle_queue_size": idle
+        }
+
+
+class TokenStore:
+    """Interface for login session storage, keyed by session token."""
+    
+    def get(self, token: str) -> Optional[Dict]:
+        raise NotImplementedError
+    
+    def set(self, token: str, data: Dict):
+        """Store session data; ``data["expires_at"]`` bounds its lifetime."""
+        raise NotImplementedError
+    
+    def delete(self, token: str):
+        raise NotImplementedError
+
+
+class InMemoryTokenStore(TokenStore):
+    """Process-local login sessions backed by a plain dict."""
+    
+    def __init__(self, data: Optional[Dict[str, Dict]] = None):
+        self.data = data if data is not None else {}
+    
+    def get(self, token: str) -> Optional[Dict]:
+        return self.data.get(token)
+    
+    def set(self, token: str, data: Dict):
+        self.data[token] = data
+    
+    def delete(self, token: str):
+        self.data.pop(token, None)
+
+
+class RedisTokenStore(TokenStore):
+    """Login sessions stored as JSON strings that Redis expires on its own."""
+    
+    def __init__(self, client, prefix: str = REDIS_KEY_PREFIX + 'auth:'):
+        self.client = client
+        self.prefix = prefix
+    
+    def get(self, token: str) -> Optional[Dict]:
+        raw = self.client.get(self.prefix + token)
+        return decode_value(raw) if raw else None
+    
+    def set(self, token: str, data: Dict):
+        key = self.prefix + token
+        pipe = self.client.pipeline()
+        pipe.set(key, encode_value(data))
+        pipe.expireat(key, data["expires_at"])
+        pipe.execute()
+    
+    def delete(self, token: str):
+        self.client.delete(self.prefix + token)
+
+
+def _redis_client(url: str):
+    # Imported lazily so the in-memory backends don't need the package
+    import redis
+    return redis.Redis.from_url(url, decode_responses=True)
+
+
+def _is_redis_url(url: str) -> bool:
+    return url.startswith(('redis://', 'rediss://', 'unix://'))
+
+
+def create_pair_session_store(url: str = SESSION_STORE_URL) -> PairSessionStore:
+    """Create the pair session store for a ``memory://`` or ``redis://`` URL."""
+    if url.startswith('memory://'):
+        return InMemoryPairSessionStore()
+    if _is_redis_url(url):
+        return RedisPairSessionStore(_redis_client(url))
+    raise ValueError(f"Unsupported session store URL: {url}")
+
+
+def create_token_store(url: str = SESSION_STORE_URL, data: Optional[Dict[str, Dict]] = None) -> TokenStore:
+    """Create the login session store; ``data`` backs the in-memory store."""
+    if url.startswith('memory://'):
+        return InMemoryTokenStore(data)
+    if _is_redis_url(url):
+        return RedisTokenStore(_redis_client(url))
+    raise ValueError(f"Unsupported session store URL: {url}")
@@ -0,0 +1,217 @@
+"""
+Operational transformation for plain-text documents.
+
+An operation is a JSON-friendly list of components, applied left to right:
+- a positive int retains that many characters
+- a string inserts that text
+- a negative int deletes that many characters
+
+This matches the ot.js ``TextOperation`` wire format. Lengths and positions
+are counted in UTF-16 code units so they line up with JavaScript string
+indices in the browser editor.
+"""
+from typing import List, Tuple, Union
+
+Component = Union[int, str]
+Operation = List[Component]
+
+
+def _u16len(text: str) -> int:
+    """Length of a string in UTF-16 code units."""
+    if text.isascii():
+        return len(text)
+    return len(text.encode('utf-16-le', errors='surrogatepass')) // 2
+
+
+def _retain(ops: Operation, n: int):
+    if n <= 0:
+        return
+    if ops and isinstance(ops[-1], int) and ops[-1] > 0:
+        ops[-1] += n
+    else:
+        ops.append(n)
+
+
+def _insert(ops: Operation, text: str):
+    if not text:
+        return
+    if ops and isinstance(ops[-1], str):
+        ops[-1] += text
+    elif ops and isinstance(ops[-1], int) and ops[-1] < 0:
+        # Keep inserts before deletes so equivalent operations compare equal
+        if len(ops) > 1 and isinstance(ops[-2], str):
+            ops[-2] += text
+        else:
+            ops.insert(len(ops) - 1, text)
+    else:
+        ops.append(text)
+
+
+def _delete(ops: Operation, n: int):
+    if n <= 0:
+        return
+    if ops and isinstance(ops[-1], int) and ops[-1] < 0:
+        ops[-1] -= n
+    else:
+        ops.append(-n)
+
+
+def normalize(ops: Operation) -> Operation:
+    """Validate an operation and merge adjacent components of the same kind."""
+    if not isinstance(ops, list):
+        raise ValueError('Operation must be a list')
+    result: Operation = []
+    for component in ops:
+        if isinstance(component, bool):
+            raise ValueError(f'Invalid operation component: {component!r}')
+        if isinstance(component, str):
+            _insert(result, component)
+        elif isinstance(component, int):
+            if component > 0:
+                _retain(result, component)
+            else:
+                _delete(result, -component)
+        else:
+            raise ValueError(f'Invalid operation component: {component!r}')
+    return result
+
+
+def base_length(ops: Operation) -> int:
+    """Length of the document an operation applies to."""
+    return sum(abs(c) for c in ops if isinstance(c, int))
+
+
+def target_length(ops: Operation) -> int:
+    """Length of the document an operation produces."""
+    return sum(c if isinstance(c, int) and c > 0 else 0 for c in ops) + \
+        sum(_u16len(c) for c in ops if isinstance(c, str))
+
+
+def is_noop(ops: Operation) -> bool:
+    """True if the operation leaves every document unchanged."""
+    return all(isinstance(c, int) and c > 0 for c in ops)
+
+
+def apply(text: str, ops: Operation) -> str:
+    """Apply an operation to a document."""
+    if base_length(ops) != _u16len(text):
+        raise ValueError("Operation's base length does not match the document length")
+    
+    if text.isascii() and all(c.isascii() for c in ops if isinstance(c, str)):
+        parts = []
+        index = 0
+        for c in ops:
+            if isinstance(c, str):
+                parts.append(c)
+            elif c > 0:
+                parts.append(text[index:index + c])
+                index += c
+            else:
+                index -= c
+        return ''.join(parts)
+    
+    # Work on UTF-16 code units so offsets match the browser's
+    data = text.encode('utf-16-le', errors='surrogatepass')
+    parts = []
+    index = 0
+    for c in ops:
+        if isinstance(c, str):
+            parts.append(c.encode('utf-16-le', errors='surrogatepass'))
+        elif c > 0:
+            parts.append(data[index:index + 2 * c])
+            index += 2 * c
+        else:
+            index -= 2 * c
+    return b''.join(parts).decode('utf-16-le', errors='surrogatepass')
+
+
+def transform(a: Operation, b: Operation) -> Tuple[Operation, Operation]:
+    """Transform two concurrent operations against each other.
+    
+    Returns ``(a', b')`` such that applying ``a`` then ``b'`` gives the same
+    document as applying ``b`` then ``a'``. When both insert at the same
+    position, ``a``'s text comes first.
+    """
+    if base_length(a) != base_length(b):
+        raise ValueError('Both operations must have the same base length')
+    
+    a_prime: Operation = []
+    b_prime: Operation = []
+    ops1, ops2 = list(a), list(b)
+    i1 = i2 = 0
+    op1 = ops1[0] if ops1 else None
+    op2 = ops2[0] if ops2 else None
+    
+    def next1():
+        nonlocal i1
+        i1 += 1
+        return ops1[i1] if i1 < len(ops1) else None
+    
+    def next2():
+        nonlocal i2
+        i2 += 1
+        return ops2[i2] if i2 < len(ops2) else None
+    
+    while op1 is not None or op2 is not None:
+        if isinstance(op1, str):
+            _insert(a_prime, op1)
+            _retain(b_prime, _u16len(op1))
+            op1 = next1()
+            continue
+        if isinstance(op2, str):
+            _retain(a_prime, _u16len(op2))
+            _insert(b_prime, op2)
+            op2 = next2()
+            continue
+        if op1 is None or op2 is None:
+            raise ValueError('Operations are not compatible')
+        
+        if op1 > 0 and op2 > 0:
+            length = min(op1, op2)
+            _retain(a_prime, length)
+            _retain(b_prime, length)
+        elif op1 < 0 and op2 < 0:
+            length = min(-op1, -op2)
+        elif op1 < 0 < op2:
+            length = min(-op1, op2)
+            _delete(a_prime, length)
+        else:
+            length = min(op1, -op2)
+            _delete(b_prime, length)
+        
+        # Consume ``length`` characters from both components
+        op1 = op1 - length if op1 > 0 else op1 + length
+        op2 = op2 - length if op2 > 0 else op2 + length
+        if op1 == 0:
+            op1 = next1()
+        if op2 == 0:
+            op2 = next2()
+    
+    return a_prime, b_prime
+
+
+def diff(old: str, new: str) -> Operation:
+    """Build an operation turning ``old`` into ``new``.
+    
+    Only the common prefix and suffix are detected, which is exact for the
+    single contiguous edit an editor produces per change event.
+    """
+    if old == new:
+        ops: Operation = []
+        _retain(ops, _u16len(old))
+        return ops
+    
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    
+    ops = []
+    _retain(ops, _u16len(old[:prefix]))
+    _insert(ops, new[prefix:len(new) - suffix])
+    _delete(ops, _u16len(old[prefix:len(old) - suffix]))
+    _retain(ops, _u16len(old[len(old) - suffix:]))
+    return ops
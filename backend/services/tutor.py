@@ -3,108 +3,284 @@ Tutor service for AI-powered programming language tutoring.
 Uses web search to gather online data and generates educational responses.
 """
 import os
-import tempfile
+import asyncio
+from collections import deque
+import time
 import uuid
-from typing import Dict, Any
+from threading import Event, Lock, Thread
+from typing import Dict, Any, Callable, Hashable, Iterator, List, Optional, Tuple
 import httpx
 import re
 from datetime import datetime
 
+from backend.services.cache import TTLCache
+from backend.services.circuit_breaker import CircuitBreaker
+from backend.services.example_catalog import example_catalog
+from backend.services.tutor_index import LOCAL_INDEX_ENABLED, PASSAGE_CHARS, LocalIndex
+from backend.services.tutor_store import ResponseStore
+
+SEARCH_BUDGET = float(os.getenv('TUTOR_SEARCH_BUDGET', '8'))  # Seconds a search may take before falling back
+# Stop searching while most recent searches fail or are slow, and retry after the cooldown
+BREAKER_WINDOW = float(os.getenv('TUTOR_BREAKER_WINDOW', '60'))  # Seconds of searches considered
+BREAKER_MIN_CALLS = int(os.getenv('TUTOR_BREAKER_MIN_CALLS', '5'))
+BREAKER_FAILURE_RATE = float(os.getenv('TUTOR_BREAKER_FAILURE_RATE', '0.5'))
+BREAKER_SLOW_CALL = float(os.getenv('TUTOR_BREAKER_SLOW_CALL', '5'))  # Seconds before a search counts as failed
+BREAKER_COOLDOWN = float(os.getenv('TUTOR_BREAKER_COOLDOWN', '30'))  # Seconds
+SEARCH_CACHE_SIZE = int(os.getenv('TUTOR_CACHE_SIZE', '512'))  # Entries, 0 disables
+SEARCH_CACHE_TTL = float(os.getenv('TUTOR_CACHE_TTL', '21600'))  # Seconds
+SEARCH_CACHE_EMPTY_TTL = float(os.getenv('TUTOR_CACHE_EMPTY_TTL', '60'))  # Seconds to remember a search that found nothing
+SEARCH_CACHE_STEMMING = os.getenv('TUTOR_CACHE_STEMMING', '1') == '1'
+
+STREAM_TIMING_WINDOW = 200  # Recent streamed answers kept for timing stats
+
+# Search details returned with an answer
+SEARCH_INFO_FIELDS = ("source", "elapsed_ms", "cached", "coalesced", "timed_out", "skipped", "passages")
+
+# Sections of an answer, in the order they appear
+SECTION_ORDER = ("header", "introduction", "explanation", "example", "best_practices", "resources", "closing")
+
+_NON_WORD = re.compile(r'[^\w+#]+')  # Keep + and # so "C++" and "C#" stay distinct from "C"
+_SUFFIXES = ('ing', 'ies', 'es', 'ed', 's')
+
+
+def _stem(word: str) -> str:
+    """Strip a common English suffix, so "lists" and "list" share a cache entry."""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            if suffix == 's' and word.endswith(('ss', 'us', 'is')):
+                return word
+            if suffix == 'ies':
+                return word[:-3] + 'y'
+            if suffix == 'es' and not word.endswith(('ses', 'xes', 'zes', 'ches', 'shes')):
+                return word[:-1]
+            return word[:-len(suffix)]
+    return word
+
+
+def normalize_question(text: str, stemming: bool = None) -> str:
+    """Case-fold ``text`` and reduce it to space-separated words without punctuation."""
+    if stemming is None:
+        stemming = SEARCH_CACHE_STEMMING
+    words = _NON_WORD.sub(' ', text.casefold()).split()
+    if stemming:
+        words = [_stem(word) for word in words]
+    return ' '.join(words)
+
+
+def index_terms(text: str) -> List[str]:
+    """Words of ``text`` as the local index stores them, always stemmed."""
+    return normalize_question(text, stemming=True).split()
+
+
+def question_key(question: str, language: str) -> Tuple[str, str]:
+    """Key under which equivalent questions share searches and answers."""
+    return normalize_question(question), normalize_question(language, stemming=False)
+
+
+class _Flight:
+    """An answer being computed, which callers asking the same question wait for."""
+    
+    __slots__ = ('done', 'result', 'error', 'waiters')
+    
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
 
 class TutorService:
     """Service for AI tutoring with web search integration."""
     
     def __init__(self):
-        self.client = httpx.Client(timeout=30.0)
-        self.temp_files: Dict[str, str] = {}  # Store temp file paths by session_id
+        self.client: Optional[httpx.AsyncClient] = None  # Bound to the search loop, created there on first use
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[Thread] = None
+        self._loop_lock = Lock()
+        # Raced against each other on every search, in order of preference for ties
+        self.search_sources = {"instant_answer": self._instant_answer, "html": self._html_search}
+        self.breaker = CircuitBreaker('tutor-search', window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                                      failure_rate=BREAKER_FAILURE_RATE, slow_call=BREAKER_SLOW_CALL,
+                                      cooldown=BREAKER_COOLDOWN)
+        self.search_stats = {"searches": 0, "instant_answer": 0, "html": 0, "no_answer": 0, "timeouts": 0, "errors": 0}
+        # Course materials and problems, searched before the web; main.py points it at the database
+        self.local_index = LocalIndex(tokenize=index_terms)
+        self.examples = example_catalog  # Code examples by language and question topic, loaded at startup
+        self.responses = ResponseStore()  # Answers by session_id until feedback arrives or they expire
+        # Search results keyed by normalized (question, language); markdown is rendered per request
+        self.search_cache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+        # Answers and searches being computed, keyed like the cache, so concurrent askers share one computation
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._flights_lock = Lock()
+        self.flight_stats = {"computed": 0, "coalesced": 0}
+        self.stream_stats = {"streams": 0}
+        self.stream_timings = deque(maxlen=STREAM_TIMING_WINDOW)  # (first_byte_ms, total_ms) of recent streams
     
-    def search_web(self, query: str, language: str = "") -> str:
-        """Search the web for information about the query and language."""
+    def local_search(self, query: str, language: str = "") -> Optional[Dict[str, Any]]:
+        """Answer from our own materials and problems, or None if none of them cover the question."""
+        if not LOCAL_INDEX_ENABLED:
+            return None
+        started = time.perf_counter()
         try:
-            # Use DuckDuckGo Instant Answer API (free, no API key needed)
-            search_query = f"{language} {query}" if language else query
-            url = "https://api.duckduckgo.com/"
-            params = {
-                "q": search_query,
-                "format": "json",
-                "no_html": "1",
-                "skip_disambig": "1"
-            }
-            
-            response = self.client.get(url, params=params, timeout=10.0)
-            if response.status_code == 200:
-                data = response.json()
-                abstract = data.get("AbstractText", "")
-                answer = data.get("Answer", "")
-                definition = data.get("Definition", "")
-                related_topics = data.get("RelatedTopics", [])
-                
-                # Combine results
-                results = []
-                if abstract:
-                    results.append(abstract)
-                if answer:
-                    results.append(answer)
-                if definition:
-                    results.append(definition)
-                
-                # Extract related topics
-                if related_topics:
-                    topic_texts = []
-                    for topic in related_topics[:3]:  # Limit to first 3
-                        if isinstance(topic, dict):
-                            topic_text = topic.get("Text", "")
-                            if topic_text:
-                                topic_texts.append(topic_text)
-                    if topic_texts:
-                        results.append("Related: " + " ".join(topic_texts[:200]))
-                
-                if results:
-                    return " ".join(results)
-            
-            # Fallback: Use HTML scraping from DuckDuckGo search results
-            search_url = f"https://html.duckduckgo.com/html/?q={search_query.replace(' ', '+')}"
-            html_response = self.client.get(search_url, headers={
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }, timeout=10.0)
-            
-            if html_response.status_code == 200:
-                # Extract text from HTML (simple extraction)
-                text = html_response.text
-                # Remove HTML tags
-                text = re.sub(r'<[^>]+>', '', text)
-                # Remove extra whitespace
-                text = re.sub(r'\s+', ' ', text)
-                # Get first 800 characters as summary
-                return text[:800] if text else ""
-            
-            return ""
-        except httpx.TimeoutException:
-            print(f"Web search timeout for query: {query}")
-            return ""
-        except (httpx.HTTPError, httpx.RequestError, Exception) as e:
-            print(f"Web search error: {e}")
-            return ""
+            passages = self.local_index.search(query, language)
+        except Exception as e:
+            print(f"Local search error: {e}")
+            return None
+        if not passages:
+            return None
+        text = "\n\n".join(f"**{passage['title']}**: {passage['text'][:PASSAGE_CHARS]}" for passage in passages)
+        return {
+            "text": text,
+            "source": "local",
+            "timed_out": False,
+            "skipped": False,
+            "errors": 0,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "passages": [{key: passage[key] for key in ("kind", "id", "title", "score")} for passage in passages]
+        }
     
-    def generate_tutor_response(self, question: str, language: str) -> str:
-        """Generate an educational tutor response based on question and language."""
-        # Search for relevant information
-        search_results = self.search_web(question, language)
+    def cached_search(self, query: str, language: str = "") -> Dict[str, Any]:
+        """Return search results for the query: from local materials, else the web, reusing a recent web search."""
+        local = self.local_search(query, language)
+        if local is not None:
+            return dict(local, cached=False)
+        key = question_key(query, language)
+        result = self.search_cache.get(key)
+        if result is not None:
+            return dict(result, cached=True)
+        result = self.search_web(query, language)
+        if not result["skipped"]:
+            self.search_cache.set(key, result, ttl=None if result["text"] else SEARCH_CACHE_EMPTY_TTL)
+        return dict(result, cached=False)
+    
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Start the search event loop thread on first use."""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = Thread(target=self._loop.run_forever, name='tutor-search', daemon=True)
+                self._thread.start()
+            return self._loop
+    
+    async def _instant_answer(self, search_query: str) -> str:
+        """Look the query up with DuckDuckGo's Instant Answer API."""
+        # Free, no API key needed
+        response = await self.client.get("https://api.duckduckgo.com/", params={
+            "q": search_query,
+            "format": "json",
+            "no_html": "1",
+            "skip_disambig": "1"
+        })
+        if response.status_code != 200:
+            return ""
+        data = response.json()
         
-        # Generate structured markdown response
-        response_parts = []
+        # Combine results
+        results = [text for text in (data.get("AbstractText", ""), data.get("Answer", ""),
+                                     data.get("Definition", "")) if text]
         
-        # Header
-        response_parts.append(f"# {language} Tutoring: {question}\n")
-        response_parts.append(f"*Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*\n")
+        # Extract related topics
+        topic_texts = []
+        for topic in data.get("RelatedTopics", [])[:3]:  # Limit to first 3
+            if isinstance(topic, dict) and topic.get("Text"):
+                topic_texts.append(topic["Text"])
+        if topic_texts:
+            results.append("Related: " + " ".join(topic_texts[:200]))
+        return " ".join(results)
+    
+    async def _html_search(self, search_query: str) -> str:
+        """Scrape the top of DuckDuckGo's HTML search results."""
+        response = await self.client.get(f"https://html.duckduckgo.com/html/?q={search_query.replace(' ', '+')}", headers={
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+        })
+        if response.status_code != 200:
+            return ""
+        # Remove HTML tags and extra whitespace, keeping the first 800 characters as summary
+        text = re.sub(r'<[^>]+>', '', response.text)
+        text = re.sub(r'\s+', ' ', text).strip()
+        return text[:800]
+    
+    async def _search_async(self, search_query: str, budget: float) -> Dict[str, Any]:
+        """Run every search source at once and return the first useful answer.
         
-        # Introduction
-        response_parts.append(f"\n## Understanding Your Question\n")
-        response_parts.append(f"You asked about **{question}** in the context of **{language}**. ")
-        response_parts.append("Let me help you understand this concept!\n")
+        The remaining lookups are cancelled as soon as one source answers.
+        Sources that fail or come back empty are skipped; if none answers
+        within ``budget`` seconds the text is empty.
+        """
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=SEARCH_BUDGET)
+        started = time.perf_counter()
+        pending = {asyncio.ensure_future(self.search_sources[name](search_query)): name
+                   for name in self.search_sources}
+        result = {"text": "", "source": None, "timed_out": False, "skipped": False, "errors": 0}
+        try:
+            while pending:
+                remaining = budget - (time.perf_counter() - started)
+                done, _ = await asyncio.wait(pending, timeout=max(remaining, 0), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    result["timed_out"] = True
+                    self.search_stats["timeouts"] += 1
+                    break
+                for task in [task for task in pending if task in done]:  # Preferred source first
+                    name = pending.pop(task)
+                    try:
+                        text = task.result()
+                    except Exception as e:
+                        print(f"Web search error from {name}: {e}")
+                        self.search_stats["errors"] += 1
+                        result["errors"] += 1
+                        continue
+                    if text and not result["text"]:
+                        result.update(text=text, source=name)
+                if result["text"]:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        outcome = result["source"] or "no_answer"
+        self.search_stats["searches"] += 1
+        self.search_stats[outcome] = self.search_stats.get(outcome, 0) + 1
+        return result
+    
+    def search_web(self, query: str, language: str = "", budget: float = None) -> Dict[str, Any]:
+        """Search the web for information about the query and language.
         
-        # Main explanation
-        response_parts.append("\n## Explanation\n")
+        Returns the answer text with the source that supplied it and how long
+        the search took. While the circuit breaker is open the search is
+        skipped and the text is empty.
+        """
+        if not self.breaker.allow():
+            return {"text": "", "source": None, "timed_out": False, "skipped": True, "errors": 0, "elapsed_ms": 0.0}
+        budget = SEARCH_BUDGET if budget is None else budget
+        search_query = f"{language} {query}" if language else query
+        future = asyncio.run_coroutine_threadsafe(self._search_async(search_query, budget), self._ensure_loop())
+        try:
+            result = future.result(budget + 1)
+        except Exception as e:
+            future.cancel()
+            print(f"Web search error: {e}")
+            result = {"text": "", "source": None, "timed_out": True, "skipped": False, "errors": 1,
+                      "elapsed_ms": budget * 1000}
+        failed = result["timed_out"] or (not result["text"] and result["errors"] > 0)
+        self.breaker.record(failed, result["elapsed_ms"] / 1000)
+        return result
+    
+    def _header_section(self, question: str, language: str) -> str:
+        return "".join([
+            f"# {language} Tutoring: {question}\n",
+            f"*Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*\n"
+        ])
+    
+    def _introduction_section(self, question: str, language: str) -> str:
+        return "".join([
+            f"\n## Understanding Your Question\n",
+            f"You asked about **{question}** in the context of **{language}**. ",
+            "Let me help you understand this concept!\n"
+        ])
+    
+    def _explanation_section(self, question: str, language: str, search_results: str) -> str:
+        response_parts = ["\n## Explanation\n"]
         
         if search_results:
             # Clean and format search results
@@ -149,8 +325,11 @@ class TutorService:
                 response_parts.append("1. Reviewing the official documentation\n")
                 response_parts.append("2. Practicing with simple examples\n")
                 response_parts.append("3. Building a small project to apply the concept\n\n")
-        
+        return "".join(response_parts)
+    
+    def _example_section(self, question: str, language: str) -> str:
         # Code examples section
+        response_parts = []
         response_parts.append(f"\n## Example in {language}\n")
         response_parts.append("Here's a simple example to illustrate the concept:\n\n")
         response_parts.append("```" + language.lower() + "\n")
@@ -165,350 +344,131 @@ class TutorService:
         response_parts.append("- Demonstrates the core concept\n")
         response_parts.append("- Shows practical usage\n")
         response_parts.append("- Provides a starting point for your own code\n")
-        
+        return "".join(response_parts)
+    
+    def _best_practices_section(self, question: str, language: str) -> str:
         # Best practices
+        response_parts = []
         response_parts.append("\n## Best Practices\n")
         response_parts.append(f"When working with this concept in {language}:\n")
         response_parts.append("- Always refer to the official documentation\n")
         response_parts.append("- Test your code with different inputs\n")
         response_parts.append("- Consider edge cases and error handling\n")
         response_parts.append("- Write clean, readable code\n")
-        
+        return "".join(response_parts)
+    
+    def _resources_section(self, question: str, language: str) -> str:
         # Additional resources
+        response_parts = []
         response_parts.append("\n## Additional Resources\n")
         response_parts.append(f"- Official {language} Documentation\n")
         response_parts.append(f"- {language} Community Forums\n")
         response_parts.append("- Online tutorials and courses\n")
         response_parts.append("- Practice problems on coding platforms\n")
-        
+        return "".join(response_parts)
+    
+    def _closing_section(self, question: str, language: str) -> str:
         # Encouragement
+        response_parts = []
         response_parts.append("\n## Keep Learning!\n")
         response_parts.append("Remember, learning programming takes practice. ")
         response_parts.append("Don't hesitate to experiment and build projects to reinforce your understanding!\n")
-        
         return "".join(response_parts)
     
+    def _static_sections(self, question: str, language: str) -> Dict[str, str]:
+        """Every section except the explanation, which needs the web search."""
+        return {
+            "header": self._header_section(question, language),
+            "introduction": self._introduction_section(question, language),
+            "example": self._example_section(question, language),
+            "best_practices": self._best_practices_section(question, language),
+            "resources": self._resources_section(question, language),
+            "closing": self._closing_section(question, language)
+        }
+    
+    def generate_tutor_response(self, question: str, language: str, search_results: Optional[str] = None) -> str:
+        """Generate an educational tutor response based on question and language."""
+        # Search for relevant information
+        if search_results is None:
+            search_results = self.cached_search(question, language)["text"]
+        
+        # Generate structured markdown response
+        sections = self._static_sections(question, language)
+        sections["explanation"] = self._explanation_section(question, language, search_results)
+        return "".join(sections[name] for name in SECTION_ORDER)
+    
     def _generate_example_code(self, language: str, question: str = "") -> str:
         """Generate example code based on language and question context."""
-        lang_lower = language.lower()
-        question_lower = question.lower() if question else ""
+        return self.examples.example(language, question)
+    
+    def _shared(self, key: Hashable, compute: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run ``compute`` once for concurrent callers with the same key.
         
-        # Try to generate context-aware examples based on question keywords
-        if "function" in question_lower or "def" in question_lower:
-            return self._get_function_example(lang_lower)
-        elif "class" in question_lower or "object" in question_lower or "oop" in question_lower:
-            return self._get_class_example(lang_lower)
-        elif "loop" in question_lower or "iterate" in question_lower or "for" in question_lower:
-            return self._get_loop_example(lang_lower)
-        elif "list" in question_lower or "array" in question_lower:
-            return self._get_list_example(lang_lower)
-        elif "dictionary" in question_lower or "dict" in question_lower or "map" in question_lower:
-            return self._get_dict_example(lang_lower)
-        elif "async" in question_lower or "await" in question_lower or "asynchronous" in question_lower:
-            return self._get_async_example(lang_lower)
-        elif "error" in question_lower or "exception" in question_lower or "try" in question_lower:
-            return self._get_error_handling_example(lang_lower)
+        The first caller computes the result; callers with the same key that
+        arrive before it finishes wait and get the same result, or the same
+        exception. Returns the result and whether this caller waited for it.
+        """
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.flight_stats["computed"] += 1
+            else:
+                flight.waiters += 1
+                self.flight_stats["coalesced"] += 1
         
-        # Common examples for different languages
-        examples = {
-            "python": """# Example: Basic Python concept
-def example_function():
-    \"\"\"Demonstrates the concept.\"\"\"
-    result = "Hello, World!"
-    return result
-
-# Usage
-output = example_function()
-print(output)""",
-            "javascript": """// Example: Basic JavaScript concept
-function exampleFunction() {
-    // Demonstrates the concept
-    const result = "Hello, World!";
-    return result;
-}
-
-// Usage
-const output = exampleFunction();
-console.log(output);""",
-            "java": """// Example: Basic Java concept
-public class Example {
-    public static void main(String[] args) {
-        // Demonstrates the concept
-        String result = "Hello, World!";
-        System.out.println(result);
-    }
-}""",
-            "cpp": """// Example: Basic C++ concept
-#include <iostream>
-using namespace std;
-
-int main() {
-    // Demonstrates the concept
-    string result = "Hello, World!";
-    cout << result << endl;
-    return 0;
-}""",
-            "c": """// Example: Basic C concept
-#include <stdio.h>
-
-int main() {
-    // Demonstrates the concept
-    char* result = "Hello, World!";
-    printf("%s\\n", result);
-    return 0;
-}""",
-            "go": """// Example: Basic Go concept
-package main
-
-import "fmt"
-
-func main() {
-    // Demonstrates the concept
-    result := "Hello, World!"
-    fmt.Println(result)
-}""",
-            "rust": """// Example: Basic Rust concept
-fn main() {
-    // Demonstrates the concept
-    let result = "Hello, World!";
-    println!("{}", result);
-}""",
-            "typescript": """// Example: Basic TypeScript concept
-function exampleFunction(): string {
-    // Demonstrates the concept
-    const result: string = "Hello, World!";
-    return result;
-}
-
-// Usage
-const output: string = exampleFunction();
-console.log(output);""",
-        }
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
         
-        return examples.get(lang_lower, examples.get("python", "# Code example here"))
-    
-    def _get_function_example(self, lang: str) -> str:
-        """Get function example for language."""
-        examples = {
-            "python": """def calculate_sum(a, b):
-    \"\"\"Add two numbers and return the result.\"\"\"
-    return a + b
-
-result = calculate_sum(5, 3)
-print(f"Sum: {result}")  # Output: Sum: 8""",
-            "javascript": """function calculateSum(a, b) {
-    return a + b;
-}
-
-const result = calculateSum(5, 3);
-console.log(`Sum: ${result}`);  // Output: Sum: 8""",
-        }
-        return examples.get(lang, examples.get("python", ""))
-    
-    def _get_class_example(self, lang: str) -> str:
-        """Get class example for language."""
-        examples = {
-            "python": """class Person:
-    def __init__(self, name, age):
-        self.name = name
-        self.age = age
-    
-    def introduce(self):
-        return f"I'm {self.name}, {self.age} years old"
-
-person = Person("Alice", 30)
-print(person.introduce())""",
-            "javascript": """class Person {
-    constructor(name, age) {
-        this.name = name;
-        this.age = age;
-    }
-    
-    introduce() {
-        return `I'm ${this.name}, ${this.age} years old`;
-    }
-}
-
-const person = new Person("Alice", 30);
-console.log(person.introduce());""",
-        }
-        return examples.get(lang, examples.get("python", ""))
-    
-    def _get_loop_example(self, lang: str) -> str:
-        """Get loop example for language."""
-        examples = {
-            "python": """# Iterate over a list
-fruits = ['apple', 'banana', 'orange']
-for fruit in fruits:
-    print(fruit)
-
-# With index
-for i, fruit in enumerate(fruits):
-    print(f"{i}: {fruit}")""",
-            "javascript": """// Iterate over an array
-const fruits = ['apple', 'banana', 'orange'];
-for (const fruit of fruits) {
-    console.log(fruit);
-}
-
-// With index
-fruits.forEach((fruit, i) => {
-    console.log(`${i}: ${fruit}`);
-});""",
-        }
-        return examples.get(lang, examples.get("python", ""))
-    
-    def _get_list_example(self, lang: str) -> str:
-        """Get list/array example for language."""
-        examples = {
-            "python": """# Create and manipulate a list
-numbers = [1, 2, 3, 4, 5]
-numbers.append(6)  # Add element
-numbers.remove(2)  # Remove element
-print(numbers)  # [1, 3, 4, 5, 6]
-
-# List comprehension
-squares = [x**2 for x in range(5)]
-print(squares)  # [0, 1, 4, 9, 16]""",
-            "javascript": """// Create and manipulate an array
-const numbers = [1, 2, 3, 4, 5];
-numbers.push(6);  // Add element
-numbers.splice(1, 1);  // Remove element at index 1
-console.log(numbers);  // [1, 3, 4, 5, 6]
-
-// Map to create new array
-const squares = numbers.map(x => x * x);
-console.log(squares);""",
-        }
-        return examples.get(lang, examples.get("python", ""))
-    
-    def _get_dict_example(self, lang: str) -> str:
-        """Get dictionary/map example for language."""
-        examples = {
-            "python": """# Create and use a dictionary
-student = {
-    'name': 'Alice',
-    'age': 20,
-    'grade': 'A'
-}
-
-# Access values
-print(student['name'])  # Alice
-print(student.get('age'))  # 20
-
-# Add/update
-student['email'] = 'alice@example.com'
-student['age'] = 21
-
-# Iterate
-for key, value in student.items():
-    print(f"{key}: {value}")""",
-            "javascript": """// Create and use an object/map
-const student = {
-    name: 'Alice',
-    age: 20,
-    grade: 'A'
-};
-
-// Access values
-console.log(student.name);  // Alice
-console.log(student['age']);  // 20
-
-// Add/update
-student.email = 'alice@example.com';
-student.age = 21;
-
-// Iterate
-Object.entries(student).forEach(([key, value]) => {
-    console.log(`${key}: ${value}`);
-});""",
-        }
-        return examples.get(lang, examples.get("python", ""))
+        try:
+            flight.result = compute()
+            return flight.result, False
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.done.set()
     
-    def _get_async_example(self, lang: str) -> str:
-        """Get async/await example for language."""
-        examples = {
-            "python": """import asyncio
-
-async def fetch_data():
-    await asyncio.sleep(1)  # Simulate API call
-    return "Data fetched"
-
-async def main():
-    result = await fetch_data()
-    print(result)
-
-# Run async function
-asyncio.run(main())""",
-            "javascript": """// Async function
-async function fetchData() {
-    await new Promise(resolve => setTimeout(resolve, 1000));
-    return "Data fetched";
-}
-
-// Use async function
-async function main() {
-    const result = await fetchData();
-    console.log(result);
-}
-
-main();""",
-        }
-        return examples.get(lang, examples.get("python", ""))
+    def _answer(self, question: str, language: str) -> Tuple[Dict[str, Any], str]:
+        """Search and render an answer, sharing the search with concurrent identical questions.
+        
+        The answer is rendered for each caller, so its header repeats the caller's own wording.
+        """
+        search, coalesced = self._shared(("search",) + question_key(question, language),
+                                         lambda: self.cached_search(question, language))
+        return dict(search, coalesced=coalesced), self.generate_tutor_response(question, language, search["text"])
     
-    def _get_error_handling_example(self, lang: str) -> str:
-        """Get error handling example for language."""
-        examples = {
-            "python": """try:
-    result = 10 / 0
-except ZeroDivisionError:
-    print("Cannot divide by zero!")
-except Exception as e:
-    print(f"An error occurred: {e}")
-else:
-    print("No errors occurred")
-finally:
-    print("This always runs")""",
-            "javascript": """try {
-    const result = 10 / 0;
-    if (!isFinite(result)) {
-        throw new Error("Division resulted in infinity");
-    }
-} catch (error) {
-    console.error(`An error occurred: ${error.message}`);
-} finally {
-    console.log("This always runs");
-}""",
-        }
-        return examples.get(lang, examples.get("python", ""))
+    def get_flight_stats(self) -> Dict[str, Any]:
+        """Counts of computed and coalesced answers, and those in progress."""
+        with self._flights_lock:
+            return dict(self.flight_stats, in_flight=len(self._flights),
+                        waiting=sum(flight.waiters for flight in self._flights.values()))
     
     def create_tutor_response(self, question: str, language: str) -> Dict[str, Any]:
-        """Create a tutor response and save to temporary markdown file."""
-        # Generate response
-        markdown_content = self.generate_tutor_response(question, language)
+        """Create a tutor response and keep it in the response store until feedback."""
+        # Generate response, or wait for an identical question already being answered
+        search, markdown_content = self._answer(question, language)
         
-        # Create temporary file
         session_id = str(uuid.uuid4())
-        temp_dir = tempfile.gettempdir()
-        temp_file_path = os.path.join(temp_dir, f"tutor_{session_id}.md")
-        
         try:
-            with open(temp_file_path, 'w', encoding='utf-8') as f:
-                f.write(markdown_content)
-            
-            # Store file path
-            self.temp_files[session_id] = temp_file_path
+            self.responses.put(session_id, {
+                "question": question,
+                "language": language,
+                "markdown": markdown_content,
+                "created_at": datetime.now().isoformat()
+            })
             
             return {
                 "success": True,
                 "session_id": session_id,
                 "markdown": markdown_content,
-                "file_path": temp_file_path
-            }
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e)
+                "search": {key: search.get(key) for key in SEARCH_INFO_FIELDS}
             }
         except Exception as e:
             return {
@@ -516,32 +476,86 @@ finally:
                 "error": f"Failed to create response: {str(e)}"
             }
     
-    def delete_tutor_file(self, session_id: str) -> bool:
-        """Delete the temporary tutor markdown file."""
-        if session_id not in self.temp_files:
-            return False
+    def stream_tutor_response(self, question: str, language: str,
+                              started: Optional[float] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Create a tutor response, yielding it as ``(event, data)`` pairs as it is written.
         
-        file_path = self.temp_files[session_id]
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            del self.temp_files[session_id]
-            return True
-        except (OSError, FileNotFoundError) as e:
-            print(f"Error deleting tutor file: {e}")
-            return False
+        Every section that doesn't need the web search is yielded straight
+        away as a "section" event, then the explanation once the search is
+        done. The final "done" event carries the session ID, the whole
+        markdown (the sections joined in ``SECTION_ORDER``), and the time to
+        the first section and to the end, measured from ``started``.
+        """
+        started = time.perf_counter() if started is None else started
+        sections = self._static_sections(question, language)
+        first_byte_ms = None
+        for name in SECTION_ORDER:
+            if name in sections:
+                if first_byte_ms is None:
+                    first_byte_ms = (time.perf_counter() - started) * 1000
+                yield "section", {"section": name, "markdown": sections[name]}
+        
+        # Share the search (not the rendered answer) with identical questions asked meanwhile
+        search, coalesced = self._shared(("search",) + question_key(question, language),
+                                         lambda: self.cached_search(question, language))
+        sections["explanation"] = self._explanation_section(question, language, search["text"])
+        yield "section", {"section": "explanation", "markdown": sections["explanation"]}
+        
+        markdown_content = "".join(sections[name] for name in SECTION_ORDER)
+        session_id = str(uuid.uuid4())
+        self.responses.put(session_id, {
+            "question": question,
+            "language": language,
+            "markdown": markdown_content,
+            "created_at": datetime.now().isoformat()
+        })
+        total_ms = (time.perf_counter() - started) * 1000
+        self._record_stream(first_byte_ms, total_ms)
+        yield "done", {
+            "session_id": session_id,
+            "markdown": markdown_content,
+            "search": dict({key: search.get(key) for key in SEARCH_INFO_FIELDS}, coalesced=coalesced),
+            "timing": {"first_byte_ms": round(first_byte_ms, 1), "total_ms": round(total_ms, 1)}
+        }
+    
+    def _record_stream(self, first_byte_ms: float, total_ms: float):
+        with self._flights_lock:
+            self.stream_timings.append((first_byte_ms, total_ms))
+            self.stream_stats["streams"] += 1
+    
+    def get_stream_stats(self) -> Dict[str, Any]:
+        """Stream count, and median and worst time to first section and to the end over recent streams."""
+        with self._flights_lock:
+            timings = list(self.stream_timings)
+            stats = dict(self.stream_stats)
+        for index, name in ((0, "first_byte_ms"), (1, "total_ms")):
+            values = sorted(timing[index] for timing in timings)
+            stats[name] = {
+                "p50": round(values[len(values) // 2], 1) if values else None,
+                "max": round(values[-1], 1) if values else None
+            }
+        return stats
+    
+    def get_response(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return a stored answer, or None if it is unknown or has expired."""
+        return self.responses.get(session_id)
+    
+    def discard_response(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Remove a stored answer once feedback is in, returning it if it was still stored."""
+        return self.responses.pop(session_id)
     
     def close(self):
-        """Close the HTTP client and clean up."""
-        # Clean up all temp files
-        for file_path in list(self.temp_files.values()):
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-            except (OSError, FileNotFoundError):
-                pass
-        self.temp_files.clear()
-        self.client.close()
+        """Close the HTTP client.
+        
+        Stored answers are left alone, so answers spilled to disk survive a restart.
+        """
+        if self._loop is not None:
+            if self.client is not None:
+                asyncio.run_coroutine_threadsafe(self.client.aclose(), self._loop).result(5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5)
+            self._loop.close()
+            self._loop = None
 
 
 # Global instance
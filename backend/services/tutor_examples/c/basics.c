@@ -0,0 +1,9 @@
+// Example: Basic C concept
+#include <stdio.h>
+
+int main() {
+    // Demonstrates the concept
+    char* result = "Hello, World!";
+    printf("%s\n", result);
+    return 0;
+}
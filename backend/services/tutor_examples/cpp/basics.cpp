@@ -0,0 +1,10 @@
+// Example: Basic C++ concept
+#include <iostream>
+using namespace std;
+
+int main() {
+    // Demonstrates the concept
+    string result = "Hello, World!";
+    cout << result << endl;
+    return 0;
+}
@@ -0,0 +1,10 @@
+// Example: Basic Go concept
+package main
+
+import "fmt"
+
+func main() {
+    // Demonstrates the concept
+    result := "Hello, World!"
+    fmt.Println(result)
+}
@@ -0,0 +1,8 @@
+// Example: Basic Java concept
+public class Example {
+    public static void main(String[] args) {
+        // Demonstrates the concept
+        String result = "Hello, World!";
+        System.out.println(result);
+    }
+}
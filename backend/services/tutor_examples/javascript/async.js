@@ -0,0 +1,13 @@
+// Async function
+async function fetchData() {
+    await new Promise(resolve => setTimeout(resolve, 1000));
+    return "Data fetched";
+}
+
+// Use async function
+async function main() {
+    const result = await fetchData();
+    console.log(result);
+}
+
+main();
@@ -0,0 +1,10 @@
+// Example: Basic JavaScript concept
+function exampleFunction() {
+    // Demonstrates the concept
+    const result = "Hello, World!";
+    return result;
+}
+
+// Usage
+const output = exampleFunction();
+console.log(output);
@@ -0,0 +1,13 @@
+class Person {
+    constructor(name, age) {
+        this.name = name;
+        this.age = age;
+    }
+    
+    introduce() {
+        return `I'm ${this.name}, ${this.age} years old`;
+    }
+}
+
+const person = new Person("Alice", 30);
+console.log(person.introduce());
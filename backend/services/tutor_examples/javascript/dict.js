@@ -0,0 +1,19 @@
+// Create and use an object/map
+const student = {
+    name: 'Alice',
+    age: 20,
+    grade: 'A'
+};
+
+// Access values
+console.log(student.name);  // Alice
+console.log(student['age']);  // 20
+
+// Add/update
+student.email = 'alice@example.com';
+student.age = 21;
+
+// Iterate
+Object.entries(student).forEach(([key, value]) => {
+    console.log(`${key}: ${value}`);
+});
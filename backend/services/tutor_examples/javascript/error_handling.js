@@ -0,0 +1,10 @@
+try {
+    const result = 10 / 0;
+    if (!isFinite(result)) {
+        throw new Error("Division resulted in infinity");
+    }
+} catch (error) {
+    console.error(`An error occurred: ${error.message}`);
+} finally {
+    console.log("This always runs");
+}
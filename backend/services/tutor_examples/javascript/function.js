@@ -0,0 +1,6 @@
+function calculateSum(a, b) {
+    return a + b;
+}
+
+const result = calculateSum(5, 3);
+console.log(`Sum: ${result}`);  // Output: Sum: 8
@@ -0,0 +1,9 @@
+// Create and manipulate an array
+const numbers = [1, 2, 3, 4, 5];
+numbers.push(6);  // Add element
+numbers.splice(1, 1);  // Remove element at index 1
+console.log(numbers);  // [1, 3, 4, 5, 6]
+
+// Map to create new array
+const squares = numbers.map(x => x * x);
+console.log(squares);
@@ -0,0 +1,10 @@
+// Iterate over an array
+const fruits = ['apple', 'banana', 'orange'];
+for (const fruit of fruits) {
+    console.log(fruit);
+}
+
+// With index
+fruits.forEach((fruit, i) => {
+    console.log(`${i}: ${fruit}`);
+});
@@ -0,0 +1,12 @@
+import asyncio
+
+async def fetch_data():
+    await asyncio.sleep(1)  # Simulate API call
+    return "Data fetched"
+
+async def main():
+    result = await fetch_data()
+    print(result)
+
+# Run async function
+asyncio.run(main())
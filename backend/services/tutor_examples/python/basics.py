@@ -0,0 +1,9 @@
+# Example: Basic Python concept
+def example_function():
+    """Demonstrates the concept."""
+    result = "Hello, World!"
+    return result
+
+# Usage
+output = example_function()
+print(output)
@@ -0,0 +1,10 @@
+class Person:
+    def __init__(self, name, age):
+        self.name = name
+        self.age = age
+    
+    def introduce(self):
+        return f"I'm {self.name}, {self.age} years old"
+
+person = Person("Alice", 30)
+print(person.introduce())
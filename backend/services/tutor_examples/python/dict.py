@@ -0,0 +1,18 @@
+# Create and use a dictionary
+student = {
+    'name': 'Alice',
+    'age': 20,
+    'grade': 'A'
+}
+
+# Access values
+print(student['name'])  # Alice
+print(student.get('age'))  # 20
+
+# Add/update
+student['email'] = 'alice@example.com'
+student['age'] = 21
+
+# Iterate
+for key, value in student.items():
+    print(f"{key}: {value}")
@@ -0,0 +1,10 @@
+try:
+    result = 10 / 0
+except ZeroDivisionError:
+    print("Cannot divide by zero!")
+except Exception as e:
+    print(f"An error occurred: {e}")
+else:
+    print("No errors occurred")
+finally:
+    print("This always runs")
@@ -0,0 +1,6 @@
+def calculate_sum(a, b):
+    """Add two numbers and return the result."""
+    return a + b
+
+result = calculate_sum(5, 3)
+print(f"Sum: {result}")  # Output: Sum: 8
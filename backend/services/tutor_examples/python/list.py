@@ -0,0 +1,9 @@
+# Create and manipulate a list
+numbers = [1, 2, 3, 4, 5]
+numbers.append(6)  # Add element
+numbers.remove(2)  # Remove element
+print(numbers)  # [1, 3, 4, 5, 6]
+
+# List comprehension
+squares = [x**2 for x in range(5)]
+print(squares)  # [0, 1, 4, 9, 16]
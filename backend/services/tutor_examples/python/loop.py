@@ -0,0 +1,8 @@
+# Iterate over a list
+fruits = ['apple', 'banana', 'orange']
+for fruit in fruits:
+    print(fruit)
+
+# With index
+for i, fruit in enumerate(fruits):
+    print(f"{i}: {fruit}")
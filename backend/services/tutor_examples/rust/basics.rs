@@ -0,0 +1,6 @@
+// Example: Basic Rust concept
+fn main() {
+    // Demonstrates the concept
+    let result = "Hello, World!";
+    println!("{}", result);
+}
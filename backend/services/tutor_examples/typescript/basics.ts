@@ -0,0 +1,10 @@
+// Example: Basic TypeScript concept
+function exampleFunction(): string {
+    // Demonstrates the concept
+    const result: string = "Hello, World!";
+    return result;
+}
+
+// Usage
+const output: string = exampleFunction();
+console.log(output);
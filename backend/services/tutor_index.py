@@ -0,0 +1,290 @@
+"""
+Local search over course materials and problems for the tutor.
+
+Material content and problem statements are split into short passages and
+kept in an in-memory inverted index, scored with BM25 (a TF-IDF weighting
+that also normalizes for passage length). The index is built from the
+database on first use and then kept current from committed writes, so
+questions our own content already answers are served without the web.
+"""
+import math
+import os
+import re
+import time
+from collections import deque
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from backend.models import Material, Problem
+from backend.services.offload import run_blocking
+
+
+LOCAL_INDEX_ENABLED = os.getenv('TUTOR_LOCAL_INDEX', '1') == '1'
+LOCAL_MIN_COVERAGE = float(os.getenv('TUTOR_LOCAL_MIN_COVERAGE', '0.6'))  # Share of question words a passage must contain
+LOCAL_PASSAGES = int(os.getenv('TUTOR_LOCAL_PASSAGES', '3'))  # Passages quoted in an answer
+PASSAGE_WORDS = 80  # Paragraphs are grouped into passages of about this many words
+PASSAGE_CHARS = 600  # Longest passage quoted in an answer
+QUERY_TIMING_WINDOW = 200
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do doe does for from how i in is it of on or so that the this to use using
+what when where which who why with you your me my we our explain mean difference between
+""".split())
+
+_HEADING = re.compile(r'^\s{0,3}#{1,6}\s*', re.MULTILINE)
+_PARAGRAPHS = re.compile(r'\n\s*\n')
+
+PassageKey = Tuple[str, int, int]  # (kind, record id, passage number)
+
+
+def _material_fields(material) -> Dict[str, Any]:
+    return {"title": material.title, "category": material.category, "text": material.content or ""}
+
+
+def _problem_fields(problem) -> Dict[str, Any]:
+    tags = " ".join(problem.tags or []) if isinstance(problem.tags, list) else ""
+    text = "\n\n".join(part for part in (problem.description, problem.full_description) if part)
+    return {"title": problem.title, "category": " ".join(filter(None, (problem.category, tags))), "text": text}
+
+
+INDEXED_MODELS = {Material: ("material", _material_fields), Problem: ("problem", _problem_fields)}
+
+
+def split_passages(text: str) -> List[str]:
+    """Group paragraphs into passages of roughly ``PASSAGE_WORDS`` words, without heading markers."""
+    passages, current, words = [], [], 0
+    for paragraph in _PARAGRAPHS.split(_HEADING.sub('', text)):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        current.append(paragraph)
+        words += paragraph.count(" ") + 1
+        if words >= PASSAGE_WORDS:
+            passages.append(" ".join(current))
+            current, words = [], 0
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+class LocalIndex:
+    """Inverted index of material and problem passages with BM25 ranking.
+    
+    ``tokenize`` turns text into normalized words; questions and passages
+    must go through the same one.
+    """
+    
+    def __init__(self, tokenize: Callable[[str], List[str]], min_coverage: float = LOCAL_MIN_COVERAGE):
+        self.tokenize = tokenize
+        self.min_coverage = min_coverage
+        self._lock = Lock()
+        self._postings: Dict[str, Dict[PassageKey, int]] = {}  # term -> {passage: term frequency}
+        self._passages: Dict[PassageKey, Tuple[str, str, int, Tuple[str, ...]]] = {}  # passage -> (title, text, length, terms)
+        self._records: Dict[Tuple[str, int], List[PassageKey]] = {}
+        self._total_length = 0
+        self._state = 'empty'  # empty, building or ready
+        self._pending: List[Tuple[str, int, Optional[Dict[str, Any]]]] = []  # Writes committed during a build
+        self._query_ms = deque(maxlen=QUERY_TIMING_WINDOW)
+        self._session_factory = None
+        self.stats = {'builds': 0, 'build_ms': None, 'built_at': None, 'updates': 0, 'queries': 0, 'hits': 0}
+    
+    def _terms(self, text: str) -> List[str]:
+        return [term for term in self.tokenize(text) if term not in STOPWORDS]
+    
+    def _remove(self, record: Tuple[str, int]):
+        for key in self._records.pop(record, ()):
+            _, _, length, terms = self._passages.pop(key)
+            self._total_length -= length
+            for term in terms:
+                postings = self._postings[term]
+                del postings[key]
+                if not postings:
+                    del self._postings[term]
+    
+    def _add(self, kind: str, record_id: int, fields: Dict[str, Any]):
+        record = (kind, record_id)
+        self._remove(record)
+        heading = " ".join(filter(None, (fields["title"], fields["category"])))
+        keys = []
+        for number, passage in enumerate(split_passages(fields["text"]) or [fields["title"] or ""]):
+            terms = self._terms(f"{heading} {passage}")
+            if not terms:
+                continue
+            key = (kind, record_id, number)
+            for term in terms:
+                postings = self._postings.setdefault(term, {})
+                postings[key] = postings.get(key, 0) + 1
+            self._passages[key] = (fields["title"], passage, len(terms), tuple(set(terms)))
+            self._total_length += len(terms)
+            keys.append(key)
+        self._records[record] = keys
+    
+    def _load(self, session_factory: Callable) -> List[Tuple[str, int, Dict[str, Any]]]:
+        db = session_factory()
+        try:
+            return [(kind, obj.id, fields(obj)) for model, (kind, fields) in INDEXED_MODELS.items()
+                    for obj in db.query(model).all()]
+        finally:
+            db.close()
+    
+    def build(self, session_factory: Callable):
+        """(Re)build the index from every material and problem in the database."""
+        with self._lock:
+            self._state = 'building'
+        self._build(session_factory)
+    
+    def _build(self, session_factory: Callable):
+        started = time.perf_counter()
+        try:
+            rows = run_blocking(self._load, session_factory)
+        except Exception:
+            with self._lock:
+                self._state = 'empty'
+            raise
+        with self._lock:
+            self._postings.clear()
+            self._passages.clear()
+            self._records.clear()
+            self._total_length = 0
+            for kind, record_id, fields in rows:
+                self._add(kind, record_id, fields)
+            self._apply(self._pending)
+            self._pending = []
+            self._state = 'ready'
+            self.stats['builds'] += 1
+            self.stats['build_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            self.stats['built_at'] = time.time()
+    
+    def _apply(self, changes: Iterable[Tuple[str, int, Optional[Dict[str, Any]]]]):
+        for kind, record_id, fields in changes:
+            if fields is None:
+                self._remove((kind, record_id))
+            else:
+                self._add(kind, record_id, fields)
+            self.stats['updates'] += 1
+    
+    def apply(self, changes: List[Tuple[str, int, Optional[Dict[str, Any]]]]):
+        """Apply committed writes: ``(kind, id, fields)``, with ``fields`` None for a delete."""
+        with self._lock:
+            if self._state == 'building':
+                self._pending.extend(changes)
+            elif self._state == 'ready':
+                self._apply(changes)
+            # Before the first build there is nothing to update; the build reads the latest rows
+    
+    def ensure_built(self):
+        """Build the index on first use, if it watches a database."""
+        with self._lock:
+            if self._state != 'empty' or self._session_factory is None:
+                return
+            self._state = 'building'
+        self._build(self._session_factory)
+    
+    def search(self, question: str, language: str = "", limit: int = LOCAL_PASSAGES) -> List[Dict[str, Any]]:
+        """Return the best passages covering enough of the question, best first."""
+        self.ensure_built()
+        started = time.perf_counter()
+        question_terms = set(self._terms(question))
+        language_terms = set(self._terms(language)) - question_terms
+        results = []
+        with self._lock:
+            count = len(self._passages)
+            if question_terms and count:
+                average_length = self._total_length / count
+                
+                def weight(key: PassageKey, frequency: int, idf: float) -> float:
+                    length = self._passages[key][2]
+                    return idf * frequency * (BM25_K1 + 1) / (
+                        frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+                
+                scores: Dict[PassageKey, float] = {}
+                matched: Dict[PassageKey, int] = {}
+                for term in question_terms:
+                    postings = self._postings.get(term, {})
+                    idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for key, frequency in postings.items():
+                        scores[key] = scores.get(key, 0.0) + weight(key, frequency, idf)
+                        matched[key] = matched.get(key, 0) + 1
+                needed = self.min_coverage * len(question_terms)
+                candidates = [key for key in scores if matched[key] >= needed]
+                # The language only breaks ties between passages that already answer the question,
+                # so its (usually very long) postings are looked up per candidate rather than scanned
+                for term in language_terms:
+                    postings = self._postings.get(term, {})
+                    idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for key in candidates:
+                        if key in postings:
+                            scores[key] += weight(key, postings[key], idf)
+                ranked = sorted(candidates, key=lambda key: scores[key], reverse=True)
+                for key in ranked[:limit]:
+                    title, text, _, _ = self._passages[key]
+                    results.append({"kind": key[0], "id": key[1], "title": title, "text": text,
+                                    "score": round(scores[key], 3)})
+            self.stats['queries'] += 1
+            if results:
+                self.stats['hits'] += 1
+            self._query_ms.append((time.perf_counter() - started) * 1000)
+        return results
+    
+    def watch(self, session_factory: Callable):
+        """Build from ``session_factory`` on first search, and follow writes committed through it."""
+        self._session_factory = session_factory
+        event.listen(session_factory, "after_flush", self._collect)
+        event.listen(session_factory, "after_commit", self._commit)
+        event.listen(session_factory, "after_soft_rollback", self._rollback)
+    
+    def unwatch(self):
+        if self._session_factory is not None:
+            event.remove(self._session_factory, "after_flush", self._collect)
+            event.remove(self._session_factory, "after_commit", self._commit)
+            event.remove(self._session_factory, "after_soft_rollback", self._rollback)
+            self._session_factory = None
+    
+    def _collect(self, session, flush_context):
+        """Note indexed rows written in this flush; they're applied once the transaction commits."""
+        changes = session.info.setdefault('tutor_index_changes', [])
+        savepoint = session.get_nested_transaction()
+        # session.dirty builds a new set on each access, so which collection this is must be tracked explicitly
+        for state, objects in (("new", session.new), ("dirty", session.dirty), ("deleted", session.deleted)):
+            for obj in objects:
+                indexed = INDEXED_MODELS.get(type(obj))
+                if indexed is None or obj.id is None or (state == "dirty" and not session.is_modified(obj)):
+                    continue
+                kind, fields = indexed
+                changes.append((savepoint, (kind, obj.id, None if state == "deleted" else fields(obj))))
+    
+    def _commit(self, session):
+        changes = session.info.pop('tutor_index_changes', None)
+        if changes:
+            self.apply([change for _, change in changes])
+    
+    def _rollback(self, session, previous_transaction):
+        """Forget writes that were rolled back: all of them, or those made inside a rolled-back savepoint."""
+        if not previous_transaction.nested:
+            session.info.pop('tutor_index_changes', None)
+            return
+        changes = session.info.get('tutor_index_changes')
+        if changes:
+            changes[:] = [change for change in changes if change[0] is not previous_transaction]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Index size, build time and recent query latency."""
+        with self._lock:
+            timings = sorted(self._query_ms)
+            return dict(
+                self.stats,
+                state=self._state,
+                records=len(self._records),
+                passages=len(self._passages),
+                terms=len(self._postings),
+                postings=sum(len(postings) for postings in self._postings.values()),
+                query_ms={
+                    "p50": round(timings[len(timings) // 2], 3) if timings else None,
+                    "p95": round(timings[int(len(timings) * 0.95)], 3) if timings else None,
+                    "max": round(timings[-1], 3) if timings else None
+                }
+            )
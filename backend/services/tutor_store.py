@@ -0,0 +1,174 @@
+"""
+Bounded store for tutor answers awaiting feedback.
+
+Answers are kept in memory for a limited time, least recently used first
+out when the store is full. If a spill directory is configured, answers
+pushed out of memory are written there gzip-compressed until they expire,
+so a burst of questions doesn't lose answers that users are still reading.
+"""
+import gzip
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from backend.services.cache import TTLCache
+
+
+STORE_SIZE = int(os.getenv('TUTOR_STORE_SIZE', '1000'))  # Answers kept in memory
+STORE_TTL = float(os.getenv('TUTOR_STORE_TTL', '86400'))  # Seconds an answer is kept
+SPILL_DIR = os.getenv('TUTOR_STORE_SPILL_DIR', '')  # Empty keeps answers in memory only
+SPILL_SIZE = int(os.getenv('TUTOR_STORE_SPILL_SIZE', '10000'))  # Answers kept on disk
+
+_SPILL_FILE = re.compile(r'^([0-9a-f-]{36})\.json\.gz$')
+
+
+class ResponseStore:
+    """Answers by session ID, in memory with optional compressed disk spill."""
+    
+    def __init__(self, maxsize: int = STORE_SIZE, ttl: float = STORE_TTL, spill_dir: str = SPILL_DIR,
+                 spill_size: int = SPILL_SIZE, clock: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.clock = clock
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl, clock=clock, on_evict=self._spill)
+        self.spill_dir = spill_dir or None
+        self.spill_size = spill_size
+        self._lock = Lock()
+        # Only session IDs listed here are read from disk, so lookups never build paths from user input
+        self._disk: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()  # session_id -> (expires, bytes), oldest first
+        self.stats = {'stored': 0, 'spilled': 0, 'disk_hits': 0, 'disk_evictions': 0,
+                      'disk_expirations': 0, 'spill_errors': 0}
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._load_index()
+    
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{session_id}.json.gz")
+    
+    def _load_index(self):
+        """Pick up answers spilled before a restart."""
+        entries = []
+        for name in os.listdir(self.spill_dir):
+            match = _SPILL_FILE.match(name)
+            if match:
+                stat = os.stat(os.path.join(self.spill_dir, name))
+                entries.append((stat.st_mtime + self.ttl, match.group(1), stat.st_size))
+        for expires, session_id, size in sorted(entries):
+            self._disk[session_id] = (expires, size)
+        self._prune_disk()
+    
+    def _remove_file(self, session_id: str):
+        try:
+            os.remove(self._path(session_id))
+        except OSError as e:
+            print(f"Error removing spilled tutor answer {session_id}: {e}")
+    
+    def _prune_disk(self):
+        """Delete expired spill files and the oldest ones past the size limit."""
+        now = self.clock()
+        with self._lock:
+            expired = [sid for sid, (expires, _) in self._disk.items() if expires <= now]
+            for sid in expired:
+                del self._disk[sid]
+            overflow = []
+            while len(self._disk) > self.spill_size:
+                overflow.append(self._disk.popitem(last=False)[0])
+            self.stats['disk_expirations'] += len(expired)
+            self.stats['disk_evictions'] += len(overflow)
+        for sid in expired + overflow:
+            self._remove_file(sid)
+    
+    def _spill(self, session_id: str, record: Dict[str, Any], expires: float):
+        """Write an answer pushed out of memory to disk (TTLCache eviction hook)."""
+        if not self.spill_dir or self.spill_size <= 0:
+            return
+        try:
+            data = gzip.compress(json.dumps(record).encode('utf-8'))
+            with open(self._path(session_id), 'wb') as f:
+                f.write(data)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error spilling tutor answer {session_id}: {e}")
+            self.stats['spill_errors'] += 1
+            return
+        with self._lock:
+            self._disk[session_id] = (expires, len(data))
+            self.stats['spilled'] += 1
+        self._prune_disk()
+    
+    def _read_disk(self, session_id: str, remove: bool) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._disk.get(session_id)
+            if entry is None:
+                return None
+            expired = entry[0] <= self.clock()
+            if remove or expired:
+                del self._disk[session_id]
+            if expired:
+                self.stats['disk_expirations'] += 1
+        try:
+            if expired:
+                return None
+            with open(self._path(session_id), 'rb') as f:
+                record = json.loads(gzip.decompress(f.read()))
+            self.stats['disk_hits'] += 1
+            return record
+        except (OSError, ValueError) as e:
+            print(f"Error reading spilled tutor answer {session_id}: {e}")
+            return None
+        finally:
+            if remove or expired:
+                self._remove_file(session_id)
+    
+    def put(self, session_id: str, record: Dict[str, Any]):
+        """Store an answer under a new session ID."""
+        self.memory.set(session_id, record)
+        self.stats['stored'] += 1
+    
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored answer, or None if it is unknown or expired."""
+        record = self.memory.get(session_id)
+        if record is None and self.spill_dir:
+            record = self._read_disk(session_id, remove=False)
+        return record
+    
+    def pop(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Remove and return the stored answer, or None if it is unknown or expired."""
+        if session_id in self.memory:
+            return self.memory.pop(session_id)
+        self.memory.pop(session_id)  # Drop it if it expired in memory
+        if self.spill_dir:
+            return self._read_disk(session_id, remove=True)
+        return None
+    
+    def clear(self):
+        """Forget every answer, deleting spilled files."""
+        self.memory.clear()
+        with self._lock:
+            spilled = list(self._disk)
+            self._disk.clear()
+        for session_id in spilled:
+            self._remove_file(session_id)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Entry counts and sizes in memory and on disk, with eviction counters."""
+        self.memory.purge_expired()
+        if self.spill_dir:
+            self._prune_disk()
+        records = self.memory.values()
+        with self._lock:
+            disk_bytes = sum(size for _, size in self._disk.values())
+            disk_entries = len(self._disk)
+        return dict(
+            self.stats,
+            memory_entries=len(records),
+            memory_bytes=sum(len(record.get('markdown', '')) for record in records),
+            max_memory_entries=self.memory.maxsize,
+            evictions=self.memory.stats['evictions'],
+            expirations=self.memory.stats['expirations'],
+            disk_entries=disk_entries,
+            disk_bytes=disk_bytes,
+            spill_dir=self.spill_dir
+        )
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the Notion block-to-markdown converter.
+
+Converts a synthetic page of 10,000 blocks two ways:
+- materialized: every block is built up front, then converted in one call
+- streamed: blocks arrive in 100-block pagination chunks and each chunk is
+  written to the buffer and dropped before the next one is built
+
+Run from the repository root:
+    python -m benchmarks.bench_notion_markdown [--blocks N] [--repeat N]
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Any, Dict, Iterator, List
+
+from backend.services.notion_markdown import MarkdownWriter, blocks_to_markdown
+
+CHUNK_SIZE = 100  # Notion's maximum page size for block children
+
+
+def _rich_text(content: str, **annotations) -> List[Dict[str, Any]]:
+    return [{"plain_text": content, "href": None, "annotations": annotations}]
+
+
+def make_block(i: int) -> Dict[str, Any]:
+    """Build one synthetic block; the mix roughly matches course material pages."""
+    kind = i % 10
+    if kind == 0:
+        return {"type": "heading_2", "heading_2": {"rich_text": _rich_text(f"Section {i}")}}
+    if kind in (1, 2, 3):
+        return {"type": "paragraph", "paragraph": {"rich_text": (
+            _rich_text(f"Paragraph {i} explains a concept ") + _rich_text("in bold", bold=True)
+        )}}
+    if kind in (4, 5):
+        return {
+            "type": "bulleted_list_item",
+            "bulleted_list_item": {"rich_text": _rich_text(f"Point {i}")},
+            "children": [{"type": "bulleted_list_item",
+                          "bulleted_list_item": {"rich_text": _rich_text(f"Detail {i}")}}],
+        }
+    if kind == 6:
+        return {"type": "code", "code": {"rich_text": _rich_text(f"print({i})\n" * 5), "language": "python"}}
+    if kind == 7:
+        return {"type": "callout", "callout": {"rich_text": _rich_text(f"Tip {i}"),
+                                               "icon": {"type": "emoji", "emoji": "💡"}}}
+    if kind == 8:
+        return {"type": "toggle", "toggle": {"rich_text": _rich_text(f"Answer {i}")},
+                "children": [{"type": "paragraph", "paragraph": {"rich_text": _rich_text("Hidden")}}]}
+    return {"type": "quote", "quote": {"rich_text": _rich_text(f"Quote {i}", italic=True)}}
+
+
+def iter_chunks(total: int) -> Iterator[List[Dict[str, Any]]]:
+    for start in range(0, total, CHUNK_SIZE):
+        yield [make_block(i) for i in range(start, min(start + CHUNK_SIZE, total))]
+
+
+def run_materialized(total: int) -> str:
+    blocks = [make_block(i) for i in range(total)]
+    return blocks_to_markdown(blocks)
+
+
+def run_streamed(total: int) -> str:
+    writer = MarkdownWriter()
+    for chunk in iter_chunks(total):
+        writer.write_blocks(chunk)
+    return writer.getvalue()
+
+
+def measure(fn, total: int, repeat: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(total)
+        timings.append(time.perf_counter() - start)
+    
+    tracemalloc.start()
+    output = fn(total)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return {
+        "best_ms": min(timings) * 1000,
+        "blocks_per_sec": total / min(timings),
+        "peak_mb": peak / 1024 / 1024,
+        "output_kb": len(output) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Notion markdown conversion")
+    parser.add_argument("--blocks", type=int, default=10_000, help="Blocks on the synthetic page")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per mode")
+    args = parser.parse_args()
+    
+    assert run_materialized(args.blocks) == run_streamed(args.blocks)
+    
+    print(f"Synthetic page: {args.blocks} top-level blocks")
+    for name, fn in (("materialized", run_materialized), ("streamed", run_streamed)):
+        result = measure(fn, args.blocks, args.repeat)
+        print(
+            f"{name:>12}: {result['best_ms']:8.1f} ms  "
+            f"{result['blocks_per_sec']:10.0f} blocks/s  "
+            f"peak {result['peak_mb']:6.2f} MB  "
+            f"output {result['output_kb']:.0f} KB"
+        )
+
+
+if __name__ == "__main__":
+    main()
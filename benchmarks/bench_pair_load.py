@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Load test for the pair-programming Socket.IO server.
+
+Creates ``--sessions`` rooms through ``/api/pair-programming/create``, joins
+``--participants`` WebSocket clients to each, and has every participant send
+``code_change``, ``cursor_change`` and ``chat_message`` events at random
+(Poisson) intervals for ``--duration`` seconds. The report shows:
+
+- connect time: from opening the socket until ``session_state`` arrives;
+- fan-out latency: from sending an event until each other participant
+  receives the broadcast, per event type, as percentiles;
+- dropped events: code and chat broadcasts that never arrived. Cursor
+  updates are coalesced by the server, so only their latency is reported;
+- server CPU and RSS, sampled every half second.
+
+By default a server is started on a free local port with
+``python -m backend.serve``. ``--url`` points at one that is already running
+locally, in which case CPU and RSS are only reported if ``--server-pid`` is
+given.
+
+Clients are split by session over ``--client-processes`` processes, each
+with its own asyncio loop, so the load generator doesn't become the
+bottleneck before the server does.
+
+Run from the repository root:
+    python -m benchmarks.bench_pair_load --sessions 20 --participants 4 --duration 30
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+import psutil
+import socketio
+
+from benchmarks.bench_socketio_connections import _free_port, _start_server
+
+
+CODE_LINES = 40
+ORIGIN = "http://localhost:5173"  # The server only accepts the frontend's origins
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if len(values) < 2:
+        value = values[0] * 1000 if values else float("nan")
+        return {"p50": value, "p95": value, "p99": value, "max": value}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": cuts[49] * 1000, "p95": cuts[94] * 1000, "p99": cuts[98] * 1000, "max": max(values) * 1000}
+
+
+class _Room:
+    """Send times of one session's code edits, per sender, oldest first."""
+    
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.code_sent: Dict[str, List[float]] = defaultdict(list)
+
+
+class _Participant:
+    """One WebSocket client in a room, and what it has received."""
+    
+    def __init__(self, room: _Room, username: str, results: Dict):
+        self.room = room
+        self.username = username
+        self.results = results
+        self.client = socketio.AsyncClient(reconnection=False)
+        self.joined = asyncio.Event()
+        self.code_seen: Dict[str, int] = defaultdict(int)  # Edits received per sender
+        self.line = random.randrange(CODE_LINES)
+        self.edits = 0
+        self.client.on("session_state", self._on_state)
+        self.client.on("code_operation", self._on_code)
+        self.client.on("chat_message", self._on_chat)
+        self.client.on("presence_updated", self._on_presence)
+        self.client.on("error", self._on_error)
+    
+    def _on_state(self, data):
+        self.joined.set()
+    
+    def _on_code(self, data):
+        # Edits from one sender reach every receiver in the order they were
+        # sent, so the n-th edit received from a sender is their n-th edit
+        sender = data.get("from")
+        sent = self.room.code_sent[sender]
+        index = self.code_seen[sender]
+        self.code_seen[sender] += 1
+        if index < len(sent):
+            self.results["latency"]["code"].append(time.time() - sent[index])
+            self.results["received"]["code"] += 1
+    
+    def _on_chat(self, data):
+        sender, sent = data["message"].split("|")
+        if sender != self.username:
+            self.results["latency"]["chat"].append(time.time() - float(sent))
+            self.results["received"]["chat"] += 1
+    
+    def _on_presence(self, data):
+        now = time.time()
+        for update in data.get("updates", []):
+            position = update.get("position")
+            if update.get("socket_id") != self.client.get_sid() and position and "sent" in position:
+                self.results["latency"]["cursor"].append(now - position["sent"])
+    
+    def _on_error(self, data):
+        self.results["errors"] += 1
+    
+    async def connect(self, url: str):
+        start = time.perf_counter()
+        await self.client.connect(url, transports=["websocket"], headers={"Origin": ORIGIN})
+        await self.client.emit("join_session", {"session_id": self.room.session_id, "username": self.username})
+        await asyncio.wait_for(self.joined.wait(), timeout=60)
+        self.results["connect"].append(time.perf_counter() - start)
+    
+    def _code(self) -> str:
+        lines = [f"value_{i} = {i}" for i in range(CODE_LINES)]
+        lines[self.line] = f"{self.username} = {self.edits}"
+        return "\n".join(lines)
+    
+    async def _every(self, rate: float, until: float, send):
+        if rate <= 0:
+            return
+        while True:
+            await asyncio.sleep(random.expovariate(rate))
+            if time.monotonic() >= until:
+                return
+            await send()
+    
+    async def _send_code(self):
+        self.edits += 1
+        self.room.code_sent[self.username].append(time.time())
+        self.results["sent"]["code"] += 1
+        await self.client.emit("code_change", {
+            "session_id": self.room.session_id, "code": self._code(), "username": self.username
+        })
+    
+    async def _send_cursor(self):
+        self.results["sent"]["cursor"] += 1
+        position = {"line": random.randrange(CODE_LINES), "ch": random.randrange(20), "sent": time.time()}
+        await self.client.emit("cursor_change", {"session_id": self.room.session_id, "position": position})
+    
+    async def _send_chat(self):
+        self.results["sent"]["chat"] += 1
+        await self.client.emit("chat_message", {
+            "session_id": self.room.session_id, "message": f"{self.username}|{time.time()!r}",
+            "username": self.username
+        })
+    
+    async def run(self, duration: float, edit_rate: float, cursor_rate: float, chat_rate: float):
+        until = time.monotonic() + duration
+        await asyncio.gather(
+            self._every(edit_rate, until, self._send_code),
+            self._every(cursor_rate, until, self._send_cursor),
+            self._every(chat_rate, until, self._send_chat)
+        )
+
+
+async def _run_clients(url: str, session_ids: List[str], options: Dict) -> Dict:
+    results = {
+        "connect": [],
+        "latency": {"code": [], "cursor": [], "chat": []},
+        "sent": {"code": 0, "cursor": 0, "chat": 0},
+        "received": {"code": 0, "chat": 0},
+        "expected": {"code": 0, "chat": 0},
+        "errors": 0
+    }
+    rooms = [_Room(session_id) for session_id in session_ids]
+    participants = [
+        _Participant(room, f"{room.session_id[:6]}-p{p}", results)
+        for room in rooms
+        for p in range(options["participants"])
+    ]
+    
+    try:
+        batch = options["connect_batch"]
+        for start in range(0, len(participants), batch):
+            await asyncio.gather(*(participant.connect(url) for participant in participants[start:start + batch]))
+        
+        await asyncio.gather(*(
+            participant.run(options["duration"], options["edit_rate"], options["cursor_rate"], options["chat_rate"])
+            for participant in participants
+        ))
+        # Let broadcasts still in flight arrive before counting drops
+        await asyncio.sleep(options["drain"])
+    finally:
+        await asyncio.gather(*(participant.client.disconnect() for participant in participants),
+                             return_exceptions=True)
+    
+    others = options["participants"] - 1
+    results["expected"]["code"] = results["sent"]["code"] * others
+    results["expected"]["chat"] = results["sent"]["chat"] * others
+    return results
+
+
+def _client_process(job) -> Dict:
+    url, session_ids, options = job
+    return asyncio.run(_run_clients(url, session_ids, options))
+
+
+class _ServerSampler(threading.Thread):
+    """Samples a process's CPU and RSS until stopped."""
+    
+    def __init__(self, pid: int, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.cpu: List[float] = []
+        self.rss: List[int] = [self.process.memory_info().rss]
+        self._stop_event = threading.Event()
+    
+    def run(self):
+        self.process.cpu_percent(None)
+        while not self._stop_event.wait(self.interval):
+            self.cpu.append(self.process.cpu_percent(None))
+            self.rss.append(self.process.memory_info().rss)
+    
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _merge(shards: List[Dict]) -> Dict:
+    merged = shards[0]
+    for shard in shards[1:]:
+        merged["connect"] += shard["connect"]
+        merged["errors"] += shard["errors"]
+        for key in ("latency", "sent", "received", "expected"):
+            for kind in merged[key]:
+                merged[key][kind] += shard[key][kind]
+    return merged
+
+
+def run(url: str, server_pid: Optional[int], options: Dict) -> Dict:
+    with httpx.Client() as http:
+        session_ids = [
+            http.post(f"{url}/api/pair-programming/create", json={"username": "load-host"}).json()["session_id"]
+            for _ in range(options["sessions"])
+        ]
+    
+    processes = max(1, min(options["client_processes"], len(session_ids)))
+    jobs = [(url, session_ids[i::processes], options) for i in range(processes)]
+    sampler = _ServerSampler(server_pid) if server_pid else None
+    if sampler:
+        sampler.start()
+    start = time.perf_counter()
+    try:
+        if processes == 1:
+            shards = [_client_process(jobs[0])]
+        else:
+            with multiprocessing.get_context("spawn").Pool(processes) as pool:
+                shards = pool.map(_client_process, jobs)
+    finally:
+        if sampler:
+            sampler.stop()
+    results = _merge(shards)
+    results["elapsed"] = time.perf_counter() - start
+    if sampler:
+        results["server"] = {
+            "cpu_avg": statistics.mean(sampler.cpu) if sampler.cpu else float("nan"),
+            "cpu_max": max(sampler.cpu, default=float("nan")),
+            "rss_start_mb": sampler.rss[0] / 2 ** 20,
+            "rss_max_mb": max(sampler.rss) / 2 ** 20,
+            "rss_end_mb": sampler.rss[-1] / 2 ** 20
+        }
+    return results
+
+
+def _report(results: Dict, options: Dict):
+    connect = _percentiles(results["connect"])
+    print(f"{options['sessions']} sessions x {options['participants']} participants, "
+          f"{options['duration']:.0f}s of traffic, {options['client_processes']} client processes, "
+          f"{psutil.cpu_count()} CPUs")
+    print(f"connect + join ms: p50 {connect['p50']:.1f}  p95 {connect['p95']:.1f}  "
+          f"p99 {connect['p99']:.1f}  max {connect['max']:.1f}")
+    print(f"{'event':>7} {'sent':>7} {'sent/s':>7} {'received':>9} {'dropped':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for kind in ("code", "cursor", "chat"):
+        latency = _percentiles(results["latency"][kind])
+        sent = results["sent"][kind]
+        if kind in results["expected"]:
+            received = results["received"][kind]
+            dropped = str(results["expected"][kind] - received)
+        else:
+            received, dropped = len(results["latency"][kind]), "-"
+        print(f"{kind:>7} {sent:>7} {sent / options['duration']:>7.1f} {received:>9} {dropped:>8} "
+              f"{latency['p50']:>8.1f} {latency['p95']:>8.1f} {latency['p99']:>8.1f} {latency['max']:>8.1f}")
+    if results["errors"]:
+        print(f"server errors: {results['errors']}")
+    server = results.get("server")
+    if server:
+        print(f"server CPU %: avg {server['cpu_avg']:.0f}  max {server['cpu_max']:.0f}   "
+              f"RSS MiB: start {server['rss_start_mb']:.1f}  max {server['rss_max_mb']:.1f}  "
+              f"end {server['rss_end_mb']:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the pair-programming Socket.IO server")
+    parser.add_argument("--sessions", type=int, default=10, help="Pair sessions to create")
+    parser.add_argument("--participants", type=int, default=3, help="Clients joined to each session")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of traffic")
+    parser.add_argument("--edit-rate", type=float, default=2, help="code_change events per participant per second")
+    parser.add_argument("--cursor-rate", type=float, default=5, help="cursor_change events per participant per second")
+    parser.add_argument("--chat-rate", type=float, default=0.2, help="chat_message events per participant per second")
+    parser.add_argument("--client-processes", type=int, default=1, help="Processes generating client load")
+    parser.add_argument("--connect-batch", type=int, default=50, help="Clients connecting at once, per process")
+    parser.add_argument("--drain", type=float, default=3, help="Seconds to wait for in-flight broadcasts")
+    parser.add_argument("--mode", default="gevent", help="Async mode of the server to start (threading, gevent, eventlet)")
+    parser.add_argument("--url", help="Use a local server that is already running instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="Process to sample CPU and RSS from when using --url")
+    args = parser.parse_args()
+    options = {key: value for key, value in vars(args).items() if key not in ("mode", "url", "server_pid")}
+    
+    if args.url:
+        results = run(args.url.rstrip("/"), args.server_pid, options)
+    else:
+        port = _free_port()
+        server = _start_server(args.mode, port)
+        try:
+            results = run(f"http://127.0.0.1:{port}", server.pid, options)
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+    _report(results, options)
+
+
+if __name__ == "__main__":
+    main()
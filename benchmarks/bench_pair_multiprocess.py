@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Multi-process benchmark for the shared (Redis) pair session store.
+
+N worker processes replay the pair-programming event mix (code operations,
+presence batches, username lookups) against the same set of rooms through
+``RedisPairSessionStore``, the way several server processes would behind a
+load balancer. Throughput is reported per process count, and every run checks
+that no code operation was lost: each room's revision must equal the number
+of operations the workers say were accepted.
+
+Without ``--redis-url`` an in-process fakeredis TCP server is started, which
+is much slower than redis-server and runs on this machine's cores, so use it
+to check correctness and relative scaling only.
+
+Run from the repository root:
+    python -m benchmarks.bench_pair_multiprocess --processes 1 2 4 --rooms 8
+    python -m benchmarks.bench_pair_multiprocess --redis-url redis://localhost:6379/15
+"""
+import argparse
+import multiprocessing
+import socket
+import threading
+import time
+
+from backend.services import pair_programming, text_ot
+from backend.services.session_store import create_pair_session_store
+
+
+def _worker(url: str, session_ids: list, index: int, duration: float, results):
+    pair_programming.store = create_pair_session_store(url)
+    socket_id = f"sock-{index}"
+    for session_id in session_ids:
+        pair_programming.add_participant(session_id, None, f"user-{index}", socket_id)
+    
+    events = accepted = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        session_id = session_ids[events % len(session_ids)]
+        pair_programming.apply_presence(session_id, {socket_id: {"position": {"line": events % 40, "ch": 0}}})
+        pair_programming.get_username(session_id, socket_id)
+        state = pair_programming.get_code_state(session_id)
+        code = state["code"]
+        for entry in state["operations"]:
+            code = text_ot.apply(code, entry["ops"])
+        # Other processes may get in first; the store transforms the insert past them
+        pair_programming.apply_code_operation(session_id, state["revision"], ["x", len(code)], socket_id)
+        accepted += 1
+        events += 4
+    results.put((events, accepted))
+
+
+def _start_fake_redis() -> str:
+    import fakeredis
+    
+    class Server(fakeredis.TcpFakeServer):
+        def get_request(self):
+            # Without this, pipelined replies wait on delayed ACKs (~40 ms each)
+            sock, addr = super().get_request()
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return sock, addr
+    
+    server = Server(("127.0.0.1", 0))
+    server.daemon_threads = True  # Don't wait for open connections at exit
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"redis://127.0.0.1:{server.server_address[1]}/0"
+
+
+def run(url: str, processes: int, rooms: int, duration: float) -> tuple:
+    """Run the event mix in ``processes`` processes; return (events/s, lost operations)."""
+    pair_programming.store = create_pair_session_store(url)
+    pair_programming.store.client.flushdb()
+    session_ids = [pair_programming.create_session(host_username="bench") for _ in range(rooms)]
+    
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=_worker, args=(url, session_ids, i, duration, results))
+        for i in range(processes)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    counts = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    
+    accepted = sum(count[1] for count in counts)
+    revisions = sum(pair_programming.get_code_state(session_id)["revision"] for session_id in session_ids)
+    return sum(count[0] for count in counts) / elapsed, accepted - revisions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the shared pair session store across processes")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4], help="Process counts to test")
+    parser.add_argument("--rooms", type=int, default=8, help="Rooms shared by all processes")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds per run")
+    parser.add_argument("--redis-url", help="Redis server to use (its database is flushed!)")
+    args = parser.parse_args()
+    
+    url = args.redis_url or _start_fake_redis()
+    
+    print(f"{args.rooms} rooms, {args.duration:.1f} s per run, {multiprocessing.cpu_count()} CPUs, store {url}")
+    print(f"{'processes':>9} {'events/s':>12} {'lost ops':>9}")
+    for processes in args.processes:
+        rate, lost = run(url, processes, args.rooms, args.duration)
+        print(f"{processes:>9} {rate:>12,.0f} {lost:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the pair-programming session store.
+
+Each room gets a few worker threads that replay a realistic event mix
+(presence batches, username lookups, code operations, chat) against
+``backend.services.pair_programming``. Throughput is reported per room
+count, once with the store's per-session locks and once with every call
+serialized behind a single global lock, which is how the store used to work.
+
+``--hold-ms`` simulates extra time spent inside the session lock (for
+example a slow storage backend) by sleeping in a presence update, which
+makes lock contention visible despite the GIL.
+
+Run from the repository root:
+    python -m benchmarks.bench_pair_sessions --rooms 1 2 4 8 --threads-per-room 2
+"""
+import argparse
+import threading
+import time
+from contextlib import nullcontext
+
+from backend.services import pair_programming
+
+
+def _worker(session_id: str, socket_id: str, stop: threading.Event, counts: list,
+            index: int, global_lock, hold: float):
+    ops = 0
+    while not stop.is_set():
+        with global_lock:
+            pair_programming.apply_presence(session_id, {socket_id: {"position": {"line": ops % 40, "ch": 0}}})
+            if hold:
+                with pair_programming._locked_session(session_id):
+                    time.sleep(hold)
+        with global_lock:
+            pair_programming.get_username(session_id, socket_id)
+        with global_lock:
+            code = pair_programming.get_code_state(session_id)
+            revision = code["revision"]
+            length = len(pair_programming.get_code(session_id))
+        try:
+            with global_lock:
+                pair_programming.apply_code_operation(session_id, revision, [length, "x"], socket_id)
+        except ValueError:
+            pass
+        if ops % 10 == 0:
+            with global_lock:
+                pair_programming.add_message(session_id, socket_id, "hi", socket_id)
+        ops += 5
+    counts[index] = ops
+
+
+def run(rooms: int, threads_per_room: int, duration: float, single_lock: bool, hold: float) -> float:
+    """Run the event mix and return operations per second."""
+    global_lock = threading.Lock() if single_lock else nullcontext()
+    session_ids = []
+    for _ in range(rooms):
+        session_id = pair_programming.create_session(host_username="bench")
+        pair_programming.update_session_code(session_id, "")
+        session_ids.append(session_id)
+    
+    stop = threading.Event()
+    counts = [0] * (rooms * threads_per_room)
+    threads = []
+    for r, session_id in enumerate(session_ids):
+        for t in range(threads_per_room):
+            socket_id = f"sock-{r}-{t}"
+            pair_programming.add_participant(session_id, None, f"user-{t}", socket_id)
+            index = r * threads_per_room + t
+            threads.append(threading.Thread(
+                target=_worker,
+                args=(session_id, socket_id, stop, counts, index, global_lock, hold),
+                daemon=True
+            ))
+    
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    
+    for session_id in session_ids:
+        pair_programming.delete_session(session_id)
+    return sum(counts) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pair-programming session store concurrency")
+    parser.add_argument("--rooms", type=int, nargs="+", default=[1, 2, 4, 8], help="Room counts to test")
+    parser.add_argument("--threads-per-room", type=int, default=2, help="Worker threads per room")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds per run")
+    parser.add_argument("--hold-ms", type=float, default=0.0,
+                        help="Simulated milliseconds spent inside the session lock per presence update")
+    args = parser.parse_args()
+    
+    hold = args.hold_ms / 1000
+    print(f"{args.threads_per_room} threads per room, {args.duration:.1f} s per run, hold {args.hold_ms} ms")
+    print(f"{'rooms':>6} {'per-session ops/s':>18} {'single-lock ops/s':>18} {'speedup':>8}")
+    for rooms in args.rooms:
+        per_session = run(rooms, args.threads_per_room, args.duration, single_lock=False, hold=hold)
+        single = run(rooms, args.threads_per_room, args.duration, single_lock=True, hold=hold)
+        print(f"{rooms:>6} {per_session:>18,.0f} {single:>18,.0f} {per_session / single:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
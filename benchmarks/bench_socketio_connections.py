@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Connection-scaling benchmark for the Socket.IO server's async modes.
+
+For each mode, ``python -m backend.serve`` is started in a subprocess and
+``--connections`` WebSocket clients join ``--rooms`` pair-programming
+sessions. The report shows the server's memory and OS thread count per
+connection, then the chat broadcast latency: the time from sending a message
+until the last client in the room receives it.
+
+Clients run on one asyncio loop in this process, so on a small machine the
+client side also limits the latency figures. Use them to compare modes, not
+as absolute numbers.
+
+Run from the repository root:
+    python -m benchmarks.bench_socketio_connections --modes threading gevent --connections 100 500
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+import psutil
+import socketio
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(mode: str, port: int) -> subprocess.Popen:
+    env = {**os.environ, "SOCKETIO_ASYNC_MODE": mode, "PORT": str(port), "HOST": "127.0.0.1"}
+    server = subprocess.Popen([sys.executable, "-m", "backend.serve"], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/pair-programming/sessions", timeout=1)
+            return server
+        except httpx.TransportError:
+            if server.poll() is not None:
+                break
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"Server in {mode} mode did not start")
+
+
+async def _connect(url: str, session_id: str, index: int, received: dict) -> socketio.AsyncClient:
+    client = socketio.AsyncClient(reconnection=False)
+    joined = asyncio.Event()
+    client.on("session_state", lambda data: joined.set())
+    
+    def on_chat(data):
+        latencies = received.setdefault(data["message"], [])
+        latencies.append(time.time() - float(data["message"]))
+    client.on("chat_message", on_chat)
+    
+    # The server only accepts the frontend's origins
+    await client.connect(url, transports=["websocket"], headers={"Origin": "http://localhost:5173"})
+    await client.emit("join_session", {"session_id": session_id, "username": f"user-{index}"})
+    await asyncio.wait_for(joined.wait(), timeout=30)
+    return client
+
+
+async def _measure(mode: str, connections: int, rooms: int, broadcasts: int) -> dict:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = _start_server(mode, port)
+    process = psutil.Process(server.pid)
+    clients = []
+    try:
+        async with httpx.AsyncClient() as http:
+            session_ids = [
+                (await http.post(f"{url}/api/pair-programming/create", json={"host_username": "bench"})).json()["session_id"]
+                for _ in range(rooms)
+            ]
+        base_rss = process.memory_info().rss
+        base_threads = process.num_threads()
+        
+        received: dict = {}
+        start = time.perf_counter()
+        for batch in range(0, connections, 50):
+            clients += await asyncio.gather(*(
+                _connect(url, session_ids[i % rooms], i, received)
+                for i in range(batch, min(batch + 50, connections))
+            ))
+        connect_time = time.perf_counter() - start
+        await asyncio.sleep(1)
+        rss = process.memory_info().rss
+        threads = process.num_threads()
+        
+        room_sizes = [len(range(r, connections, rooms)) for r in range(rooms)]
+        fanout = []
+        for i in range(broadcasts):
+            room = i % rooms
+            message = repr(time.time())
+            await clients[room].emit("chat_message", {"session_id": session_ids[room], "message": message})
+            deadline = time.monotonic() + 10
+            while len(received.get(message, ())) < room_sizes[room] and time.monotonic() < deadline:
+                await asyncio.sleep(0.001)
+            if len(received.get(message, ())) == room_sizes[room]:
+                fanout.append(max(received[message]))
+        return {
+            "connect_s": connect_time,
+            "kb_per_conn": (rss - base_rss) / 1024 / connections,
+            "threads": threads - base_threads,
+            "p50_ms": statistics.median(fanout) * 1000 if fanout else float("nan"),
+            "p95_ms": statistics.quantiles(fanout, n=20)[-1] * 1000 if len(fanout) > 1 else float("nan"),
+            "lost": broadcasts - len(fanout)
+        }
+    finally:
+        await asyncio.gather(*(client.disconnect() for client in clients), return_exceptions=True)
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Socket.IO async modes under many connections")
+    parser.add_argument("--modes", nargs="+", default=["threading", "gevent"], help="Async modes to test (threading, gevent, eventlet)")
+    parser.add_argument("--connections", type=int, nargs="+", default=[100, 500], help="Connection counts to test")
+    parser.add_argument("--rooms", type=int, default=10, help="Pair sessions the clients are spread over")
+    parser.add_argument("--broadcasts", type=int, default=50, help="Chat messages sent per run")
+    args = parser.parse_args()
+    
+    print(f"{args.rooms} rooms, {args.broadcasts} broadcasts per run, {psutil.cpu_count()} CPUs")
+    print(f"{'mode':>10} {'conns':>6} {'connect s':>10} {'KiB/conn':>9} {'+threads':>9} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'lost':>5}")
+    for mode in args.modes:
+        for connections in args.connections:
+            result = asyncio.run(_measure(mode, connections, args.rooms, args.broadcasts))
+            print(f"{mode:>10} {connections:>6} {result['connect_s']:>10.2f} {result['kb_per_conn']:>9.1f} "
+                  f"{result['threads']:>9} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['lost']:>5}")
+
+
+if __name__ == "__main__":
+    main()
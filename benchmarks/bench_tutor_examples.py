@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for picking the code example in a tutor answer.
+
+Compares two ways of choosing an example for a question:
+- legacy: the old hard-coded path, which rebuilt a language -> code dict on
+  every call and checked the question with a chain of substring tests
+- catalog: the example catalog loaded once from backend/services/tutor_examples,
+  scoring every topic with one compiled pattern and a per-word lookup table
+
+Also reports how long loading the catalog takes and on which questions the
+two disagree (the legacy substring tests match "oop" inside "loop", "map"
+inside "bitmap" and so on).
+
+Run from the repository root:
+    python -m benchmarks.bench_tutor_examples [--calls N] [--repeat N]
+"""
+import argparse
+import time
+from typing import Callable, Dict, List, Tuple
+
+from backend.services.example_catalog import BUILTIN_DIR, ExampleCatalog
+
+LANGUAGES = ["Python", "JavaScript", "TypeScript", "Java", "C++", "Go", "Rust"]
+QUESTIONS = [
+    "How do I define a function with default arguments?",
+    "What is a class and how do objects work?",
+    "How do I iterate over a list with a for loop?",
+    "How do I sort an array of numbers?",
+    "How do I merge two dictionaries?",
+    "How does async and await work?",
+    "How should I handle exceptions?",
+    "What is recursion?",
+    "How do I write a loop?",
+    "What is a bitmap?",
+    "Explain the difference between a stack and a queue in detail, with time complexity for each operation",
+]
+
+CATALOG = ExampleCatalog([BUILTIN_DIR])
+
+
+def _legacy_topic(topic: str, lang: str) -> str:
+    # The old _get_*_example helpers: a fresh two-language dict per call
+    examples = {
+        "python": CATALOG.examples[("python", topic)],
+        "javascript": CATALOG.examples[("javascript", topic)],
+    }
+    return examples.get(lang, examples.get("python", ""))
+
+
+def legacy_example(language: str, question: str = "") -> str:
+    """Faithful copy of the old TutorService._generate_example_code control flow."""
+    lang_lower = language.lower()
+    question_lower = question.lower() if question else ""
+    
+    if "function" in question_lower or "def" in question_lower:
+        return _legacy_topic("function", lang_lower)
+    elif "class" in question_lower or "object" in question_lower or "oop" in question_lower:
+        return _legacy_topic("class", lang_lower)
+    elif "loop" in question_lower or "iterate" in question_lower or "for" in question_lower:
+        return _legacy_topic("loop", lang_lower)
+    elif "list" in question_lower or "array" in question_lower:
+        return _legacy_topic("list", lang_lower)
+    elif "dictionary" in question_lower or "dict" in question_lower or "map" in question_lower:
+        return _legacy_topic("dict", lang_lower)
+    elif "async" in question_lower or "await" in question_lower or "asynchronous" in question_lower:
+        return _legacy_topic("async", lang_lower)
+    elif "error" in question_lower or "exception" in question_lower or "try" in question_lower:
+        return _legacy_topic("error_handling", lang_lower)
+    
+    examples = {
+        language: CATALOG.examples[(language, "basics")]
+        for language in ("python", "javascript", "java", "cpp", "c", "go", "rust", "typescript")
+    }
+    return examples.get(lang_lower, examples.get("python", "# Code example here"))
+
+
+def measure(fn: Callable[[str, str], str], cases: List[Tuple[str, str]], calls: int, repeat: int) -> float:
+    """Best per-call time in microseconds over ``repeat`` runs of ``calls`` calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(calls):
+            language, question = cases[i % len(cases)]
+            fn(language, question)
+        best = min(best, time.perf_counter() - start)
+    return best / calls * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tutor example selection")
+    parser.add_argument("--calls", type=int, default=200_000, help="Example lookups per timed run")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per path")
+    args = parser.parse_args()
+    
+    cases = [(language, question) for language in LANGUAGES for question in QUESTIONS]
+    
+    start = time.perf_counter()
+    ExampleCatalog([BUILTIN_DIR])
+    load_ms = (time.perf_counter() - start) * 1000
+    print(f"Catalog load: {load_ms:.2f} ms ({len(CATALOG.examples)} examples, {len(CATALOG.topics)} topics)")
+    
+    results: Dict[str, float] = {}
+    for name, fn in (("legacy", legacy_example), ("catalog", CATALOG.example)):
+        results[name] = measure(fn, cases, args.calls, args.repeat)
+        print(f"{name:>8}: {results[name]:6.2f} us/call")
+    print(f"catalog / legacy: {results['catalog'] / results['legacy']:.2f}x")
+    
+    topic_of = {code: topic for (language, topic), code in CATALOG.examples.items() if language == "python"}
+    disagreements = [question for question in QUESTIONS
+                     if legacy_example("Python", question) != CATALOG.example("Python", question)]
+    print(f"Questions picking a different Python example ({len(disagreements)}):")
+    for question in disagreements:
+        print(f"  {question!r}: legacy {topic_of[legacy_example('Python', question)]}, "
+              f"catalog {topic_of[CATALOG.example('Python', question)]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Local stand-in for the Notion API, served through an ``httpx.MockTransport``.
+
+Implements the two endpoints ``NotionSyncService`` uses, with pagination:
+- ``POST /v1/databases/{id}/query``
+- ``GET /v1/blocks/{id}/children``
+
+Workspaces are generated deterministically from a seed, so nothing has to be
+stored up front. Per-request latency and a random share of ``429`` responses
+can be configured to exercise concurrency and retry behaviour.
+
+Usage:
+    workspace = FakeNotionWorkspace(pages=500, latency=0.05, rate_limit_ratio=0.02)
+    service = NotionSyncService(client=workspace.client(), api_key='fake', database_id='db')
+"""
+import asyncio
+import json
+import random
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+
+class FakeNotionWorkspace:
+    """A synthetic Notion workspace with one database of pages."""
+    
+    def __init__(self, pages: int = 100, blocks_per_page: int = 50, nested_every: int = 10,
+                 children_per_block: int = 3, latency: float = 0.0, rate_limit_ratio: float = 0.0,
+                 retry_after: Optional[float] = 0, page_size: int = 100, seed: int = 0):
+        self.pages = pages
+        self.blocks_per_page = blocks_per_page
+        self.nested_every = nested_every  # Every Nth block has children (0 disables)
+        self.children_per_block = children_per_block
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.page_size = page_size
+        self.seed = seed
+        self._random = random.Random(seed)
+        self.stats = {'requests': 0, 'rate_limited': 0, 'database_queries': 0, 'block_requests': 0}
+    
+    def client(self) -> httpx.AsyncClient:
+        """Return an async client whose requests are answered by this workspace."""
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+    
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        """Answer one request, after the configured latency."""
+        self.stats['requests'] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        
+        if self.rate_limit_ratio and self._random.random() < self.rate_limit_ratio:
+            self.stats['rate_limited'] += 1
+            headers = {}
+            if self.retry_after is not None:
+                headers['Retry-After'] = str(self.retry_after)
+            return self._error(429, 'rate_limited', 'Rate limited', headers)
+        
+        parts = request.url.path.strip('/').split('/')
+        if request.method == 'POST' and len(parts) == 4 and parts[1:4:2] == ['databases', 'query']:
+            self.stats['database_queries'] += 1
+            body = json.loads(request.content or b'{}')
+            return self._query_database(body.get('start_cursor'), body.get('page_size'))
+        if request.method == 'GET' and len(parts) == 4 and parts[1:4:2] == ['blocks', 'children']:
+            self.stats['block_requests'] += 1
+            return self._block_children(
+                parts[2],
+                request.url.params.get('start_cursor'),
+                request.url.params.get('page_size')
+            )
+        return self._error(404, 'object_not_found', f'No route for {request.method} {request.url.path}')
+    
+    def _error(self, status: int, code: str, message: str,
+               headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        return httpx.Response(status, headers=headers, json={
+            'object': 'error', 'status': status, 'code': code, 'message': message
+        })
+    
+    def _paginate(self, items: List[Any], start_cursor: Optional[str],
+                  page_size: Optional[str]) -> httpx.Response:
+        """Slice ``items`` like Notion does, using the item offset as the cursor."""
+        start = int(start_cursor or 0)
+        size = min(int(page_size or self.page_size), self.page_size)
+        end = start + size
+        has_more = end < len(items)
+        return httpx.Response(200, json={
+            'object': 'list',
+            'results': items[start:end],
+            'has_more': has_more,
+            'next_cursor': str(end) if has_more else None
+        })
+    
+    def _query_database(self, start_cursor: Optional[str], page_size: Optional[str]) -> httpx.Response:
+        return self._paginate([self.page(n) for n in range(self.pages)], start_cursor, page_size)
+    
+    def _block_children(self, block_id: str, start_cursor: Optional[str],
+                        page_size: Optional[str]) -> httpx.Response:
+        if block_id.startswith('page-') and '-block-' not in block_id:
+            count = self.blocks_per_page
+            children = [self.block(f'{block_id}-block-{m}', m, nested=True) for m in range(count)]
+        else:
+            children = [
+                self.block(f'{block_id}-child-{k}', k, nested=False)
+                for k in range(self.children_per_block)
+            ]
+        return self._paginate(children, start_cursor, page_size)
+    
+    def page(self, n: int) -> Dict[str, Any]:
+        """Build the database entry for page ``n``."""
+        page_id = f'page-{n}'
+        return {
+            'object': 'page',
+            'id': page_id,
+            'url': f'https://www.notion.so/{page_id}',
+            'properties': {
+                'Name': {'type': 'title', 'title': [{'plain_text': f'Synthetic page {n}'}]},
+                'Category': {'type': 'select', 'select': {'name': ('Python', 'Web Dev', 'Tools')[n % 3]}}
+            }
+        }
+    
+    def block(self, block_id: str, m: int, nested: bool) -> Dict[str, Any]:
+        """Build block ``m``; top-level blocks periodically get nested children."""
+        has_children = nested and self.nested_every > 0 and m % self.nested_every == 0
+        if has_children:
+            block_type = 'bulleted_list_item'
+        else:
+            block_type = ('paragraph', 'heading_2', 'bulleted_list_item', 'code', 'quote')[m % 5]
+        data: Dict[str, Any] = {'rich_text': [{
+            'plain_text': f'Block {block_id} with some explanatory text.',
+            'annotations': {'bold': m % 7 == 0}
+        }]}
+        if block_type == 'code':
+            data['language'] = 'python'
+        return {
+            'object': 'block',
+            'id': block_id,
+            'type': block_type,
+            'has_children': has_children,
+            block_type: data
+        }
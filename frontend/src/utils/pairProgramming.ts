@@ -1,4 +1,5 @@
 import { io, Socket } from 'socket.io-client'
+import { apply, baseLength, compose, diff, isNoop, transform, type Operation } from './textOperation'
 
 export interface PairProgrammingSession {
   session_id: string
@@ -21,7 +22,9 @@ export interface ChatMessage {
 }
 
 export interface PairProgrammingCallbacks {
-  onCodeUpdate?: (code: string, from: string) => void
+  // ops is the edit that turned the previous code into code, when there is
+  // one; after a resync only the full code is given
+  onCodeUpdate?: (code: string, from: string, ops?: Operation) => void
   onOutputUpdate?: (output: string) => void
   onParticipantJoined?: (username: string, participants: any[]) => void
   onParticipantLeft?: (participants: any[]) => void
@@ -30,6 +33,8 @@ export interface PairProgrammingCallbacks {
   onTypingStart?: (username: string) => void
   onTypingStop?: (username: string) => void
   onChatMessage?: (message: ChatMessage) => void
+  // Older messages requested with loadChatHistory, oldest first
+  onChatHistory?: (messages: ChatMessage[], hasMore: boolean) => void
   onError?: (message: string) => void
 }
 
@@ -40,6 +45,18 @@ class PairProgrammingClient {
   private username: string = 'Anonymous'
   private userId: number | null = null
 
+  // Edits are sent as operations against the last server revision we have
+  // seen. At most one operation is in flight; edits made while waiting for
+  // its ack are composed into a buffer and sent once it is acknowledged.
+  private document: string = ''
+  private revision: number = 0
+  private outstanding: Operation | null = null
+  private buffer: Operation | null = null
+  // Server messages that arrived ahead of a revision we haven't seen yet
+  private pendingRevisions = new Map<number, () => void>()
+  // Id of the oldest chat message we have; older pages are requested before it
+  private chatCursor: number | null = null
+
   connect() {
     if (this.socket?.connected) {
       return
@@ -105,31 +122,42 @@ class PairProgrammingClient {
     })
 
     this.socket.on('session_state', (data: any) => {
-      if (this.callbacks.onCodeUpdate) {
-        this.callbacks.onCodeUpdate(data.code, '')
-      }
+      this.resetDocument(data.code, data.revision || 0, data.operations || [])
       if (this.callbacks.onOutputUpdate) {
         this.callbacks.onOutputUpdate(data.output)
       }
-      // Load chat messages from session state
+      // Load the latest chat messages; older ones are paged in on request
+      this.chatCursor = data.chat_cursor ?? null
       if (data.messages && Array.isArray(data.messages) && this.callbacks.onChatMessage) {
         data.messages.forEach((msg: any) => {
-          this.callbacks.onChatMessage!({
-            id: Date.now().toString() + Math.random(),
-            username: msg.username,
-            message: msg.message,
-            timestamp: new Date(msg.timestamp)
-          })
+          this.callbacks.onChatMessage!(this.toChatMessage(msg))
         })
       }
     })
 
-    this.socket.on('code_updated', (data: any) => {
-      if (this.callbacks.onCodeUpdate) {
-        this.callbacks.onCodeUpdate(data.code, data.from)
+    this.socket.on('chat_history', (data: any) => {
+      this.chatCursor = data.cursor ?? null
+      if (this.callbacks.onChatHistory) {
+        this.callbacks.onChatHistory(
+          (data.messages || []).map((msg: any) => this.toChatMessage(msg)),
+          this.chatCursor !== null
+        )
       }
     })
 
+    this.socket.on('code_operation', (data: any) => {
+      this.receiveRevision(data.revision, () => this.applyRemoteOperation(data.ops, data.from))
+    })
+
+    this.socket.on('code_ack', (data: any) => {
+      this.receiveRevision(data.revision, () => this.acknowledge())
+    })
+
+    this.socket.on('code_resync', (data: any) => {
+      console.warn('Resyncing code with server:', data.reason)
+      this.resetDocument(data.code, data.snapshot_revision || 0, data.operations || [])
+    })
+
     this.socket.on('output_updated', (data: any) => {
       if (this.callbacks.onOutputUpdate) {
         this.callbacks.onOutputUpdate(data.output)
@@ -148,38 +176,39 @@ class PairProgrammingClient {
       }
     })
 
-    this.socket.on('cursor_updated', (data: any) => {
-      if (this.callbacks.onCursorUpdate) {
-        this.callbacks.onCursorUpdate(data.position, data.username, data.socket_id)
-      }
-    })
-
-    this.socket.on('selection_updated', (data: any) => {
-      if (this.callbacks.onSelectionUpdate) {
-        this.callbacks.onSelectionUpdate(data.selection, data.username, data.socket_id)
-      }
-    })
-
-    this.socket.on('typing_start', (data: any) => {
-      if (this.callbacks.onTypingStart) {
-        this.callbacks.onTypingStart(data.username)
+    // Cursor, selection and typing changes arrive batched, with only the
+    // latest state per participant since the previous batch
+    this.socket.on('presence_updated', (data: any) => {
+      for (const update of data.updates || []) {
+        if (update.socket_id === this.socket?.id) {
+          continue
+        }
+        if ('position' in update && this.callbacks.onCursorUpdate) {
+          this.callbacks.onCursorUpdate(update.position, update.username, update.socket_id)
+        }
+        if ('selection' in update && this.callbacks.onSelectionUpdate) {
+          this.callbacks.onSelectionUpdate(update.selection, update.username, update.socket_id)
+        }
+        if ('is_typing' in update) {
+          const callback = update.is_typing ? this.callbacks.onTypingStart : this.callbacks.onTypingStop
+          if (callback) {
+            callback(update.username)
+          }
+        }
       }
     })
 
-    this.socket.on('typing_stop', (data: any) => {
-      if (this.callbacks.onTypingStop) {
-        this.callbacks.onTypingStop(data.username)
+    this.socket.on('chat_message', (data: any) => {
+      if (this.callbacks.onChatMessage) {
+        this.callbacks.onChatMessage(this.toChatMessage(data))
       }
     })
 
-    this.socket.on('chat_message', (data: any) => {
-      if (this.callbacks.onChatMessage) {
-        this.callbacks.onChatMessage({
-          id: data.id || Date.now().toString(),
-          username: data.username,
-          message: data.message,
-          timestamp: new Date(data.timestamp || Date.now())
-        })
+    this.socket.on('session_expired', () => {
+      this.sessionId = null
+      this.clearSessionStorage()
+      if (this.callbacks.onError) {
+        this.callbacks.onError('This pair programming session has expired.')
       }
     })
 
@@ -272,13 +301,96 @@ class PairProgrammingClient {
     }
   }
 
-  sendCodeChange(code: string) {
-    if (this.socket && this.sessionId) {
-      this.socket.emit('code_change', {
-        session_id: this.sessionId,
-        code: code,
-        username: this.username
-      })
+  // Send a local edit. Pass the editor's own change as ops so it is sent as
+  // made; without it (or if it doesn't fit) the edit is diffed from the text.
+  sendCodeChange(code: string, ops?: Operation) {
+    if (!this.socket || !this.sessionId) {
+      return
+    }
+    if (!ops || baseLength(ops) !== this.document.length || apply(this.document, ops) !== code) {
+      ops = diff(this.document, code)
+    }
+    this.document = code
+    if (isNoop(ops)) {
+      return
+    }
+    if (this.outstanding) {
+      this.buffer = this.buffer ? compose(this.buffer, ops) : ops
+    } else {
+      this.outstanding = ops
+      this.emitOperation(ops)
+    }
+  }
+
+  private emitOperation(ops: Operation) {
+    this.socket?.emit('code_operation', {
+      session_id: this.sessionId,
+      revision: this.revision,
+      ops: ops,
+      username: this.username
+    })
+  }
+
+  // Server events for revision N must be handled after N - 1. Socket.IO
+  // keeps order per connection, but broadcasts from concurrent handlers can
+  // still arrive out of order, so early ones wait for the gap to fill.
+  private receiveRevision(revision: number, handler: () => void) {
+    if (revision <= this.revision) {
+      return
+    }
+    this.pendingRevisions.set(revision, handler)
+    let next = this.pendingRevisions.get(this.revision + 1)
+    while (next) {
+      this.pendingRevisions.delete(this.revision + 1)
+      next()
+      next = this.pendingRevisions.get(this.revision + 1)
+    }
+  }
+
+  private acknowledge() {
+    this.revision++
+    this.outstanding = this.buffer
+    this.buffer = null
+    if (this.outstanding) {
+      this.emitOperation(this.outstanding)
+    }
+  }
+
+  private applyRemoteOperation(ops: Operation, from: string) {
+    this.revision++
+    try {
+      if (this.outstanding) {
+        ;[this.outstanding, ops] = transform(this.outstanding, ops)
+      }
+      if (this.buffer) {
+        ;[this.buffer, ops] = transform(this.buffer, ops)
+      }
+      this.document = apply(this.document, ops)
+    } catch (error) {
+      console.error('Failed to apply remote edit, rejoining session:', error)
+      if (this.sessionId) {
+        this.joinSession(this.sessionId)
+      }
+      return
+    }
+    if (this.callbacks.onCodeUpdate) {
+      this.callbacks.onCodeUpdate(this.document, from, ops)
+    }
+  }
+
+  private resetDocument(code: string, revision: number, operations: Array<{ revision: number, ops: Operation }>) {
+    let document = code
+    for (const entry of operations) {
+      document = apply(document, entry.ops)
+      revision = entry.revision
+    }
+    this.document = document
+    this.revision = revision
+    this.outstanding = null
+    this.buffer = null
+    this.pendingRevisions.clear()
+    if (this.callbacks.onCodeUpdate) {
+      this.callbacks.onCodeUpdate(document, '')
     }
   }
 
@@ -321,6 +433,29 @@ class PairProgrammingClient {
     }
   }
 
+  hasOlderMessages(): boolean {
+    return this.chatCursor !== null
+  }
+
+  loadChatHistory(limit: number = 50) {
+    if (this.socket && this.sessionId && this.chatCursor !== null) {
+      this.socket.emit('chat_history', {
+        session_id: this.sessionId,
+        before: this.chatCursor,
+        limit: limit
+      })
+    }
+  }
+
+  private toChatMessage(msg: any): ChatMessage {
+    return {
+      id: msg.id !== undefined ? String(msg.id) : Date.now().toString() + Math.random(),
+      username: msg.username,
+      message: msg.message,
+      timestamp: new Date(msg.timestamp || Date.now())
+    }
+  }
+
   sendTypingStart() {
     if (this.socket && this.sessionId) {
       this.socket.emit('typing_start', {
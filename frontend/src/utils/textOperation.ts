@@ -0,0 +1,265 @@
+// Text operations for collaborative editing, in the same format the server
+// uses (backend/services/text_ot.py): a positive number retains that many
+// characters, a string inserts it and a negative number deletes that many.
+// Lengths are JavaScript string lengths (UTF-16 code units).
+
+export type Operation = Array<number | string>
+
+const isRetain = (op: number | string | undefined): op is number => typeof op === 'number' && op > 0
+const isDelete = (op: number | string | undefined): op is number => typeof op === 'number' && op < 0
+const isInsert = (op: number | string | undefined): op is string => typeof op === 'string'
+
+function retain(ops: Operation, n: number) {
+  if (n <= 0) return
+  const last = ops[ops.length - 1]
+  if (isRetain(last)) {
+    ops[ops.length - 1] = last + n
+  } else {
+    ops.push(n)
+  }
+}
+
+function insert(ops: Operation, text: string) {
+  if (!text) return
+  const last = ops[ops.length - 1]
+  if (isInsert(last)) {
+    ops[ops.length - 1] = last + text
+  } else if (isDelete(last)) {
+    // Keep inserts before deletes so equivalent operations compare equal
+    const beforeLast = ops[ops.length - 2]
+    if (isInsert(beforeLast)) {
+      ops[ops.length - 2] = beforeLast + text
+    } else {
+      ops.splice(ops.length - 1, 0, text)
+    }
+  } else {
+    ops.push(text)
+  }
+}
+
+function remove(ops: Operation, n: number) {
+  if (n <= 0) return
+  const last = ops[ops.length - 1]
+  if (isDelete(last)) {
+    ops[ops.length - 1] = last - n
+  } else {
+    ops.push(-n)
+  }
+}
+
+export function baseLength(ops: Operation): number {
+  return ops.reduce<number>((total, op) => (typeof op === 'number' ? total + Math.abs(op) : total), 0)
+}
+
+export function targetLength(ops: Operation): number {
+  return ops.reduce<number>((total, op) => {
+    if (isInsert(op)) return total + op.length
+    return isRetain(op) ? total + op : total
+  }, 0)
+}
+
+export function apply(text: string, ops: Operation): string {
+  if (baseLength(ops) !== text.length) {
+    throw new Error("Operation's base length does not match the document length")
+  }
+  const parts: string[] = []
+  let index = 0
+  for (const op of ops) {
+    if (isInsert(op)) {
+      parts.push(op)
+    } else if (isRetain(op)) {
+      parts.push(text.slice(index, index + op))
+      index += op
+    } else {
+      index -= op
+    }
+  }
+  return parts.join('')
+}
+
+// Transform concurrent operations a and b into [a', b'] so that
+// apply(apply(s, a), b') === apply(apply(s, b), a'). a's inserts go first.
+export function transform(a: Operation, b: Operation): [Operation, Operation] {
+  if (baseLength(a) !== baseLength(b)) {
+    throw new Error('Both operations must have the same base length')
+  }
+  const aPrime: Operation = []
+  const bPrime: Operation = []
+  let i1 = 0
+  let i2 = 0
+  let op1 = a[i1++]
+  let op2 = b[i2++]
+
+  while (op1 !== undefined || op2 !== undefined) {
+    if (isInsert(op1)) {
+      insert(aPrime, op1)
+      retain(bPrime, op1.length)
+      op1 = a[i1++]
+      continue
+    }
+    if (isInsert(op2)) {
+      retain(aPrime, op2.length)
+      insert(bPrime, op2)
+      op2 = b[i2++]
+      continue
+    }
+    if (op1 === undefined || op2 === undefined) {
+      throw new Error('Operations are not compatible')
+    }
+
+    let length: number
+    if (isRetain(op1) && isRetain(op2)) {
+      length = Math.min(op1, op2)
+      retain(aPrime, length)
+      retain(bPrime, length)
+    } else if (isDelete(op1) && isDelete(op2)) {
+      length = Math.min(-op1, -op2)
+    } else if (isDelete(op1)) {
+      length = Math.min(-op1, op2 as number)
+      remove(aPrime, length)
+    } else {
+      length = Math.min(op1 as number, -(op2 as number))
+      remove(bPrime, length)
+    }
+
+    op1 = (op1 as number) > 0 ? (op1 as number) - length : (op1 as number) + length
+    op2 = (op2 as number) > 0 ? (op2 as number) - length : (op2 as number) + length
+    if (op1 === 0) op1 = a[i1++]
+    if (op2 === 0) op2 = b[i2++]
+  }
+  return [aPrime, bPrime]
+}
+
+// Combine a followed by b into one operation with the same effect.
+export function compose(a: Operation, b: Operation): Operation {
+  if (targetLength(a) !== baseLength(b)) {
+    throw new Error("The second operation's base length must match the first's target length")
+  }
+  const result: Operation = []
+  let i1 = 0
+  let i2 = 0
+  let op1 = a[i1++]
+  let op2 = b[i2++]
+
+  while (op1 !== undefined || op2 !== undefined) {
+    if (isDelete(op1)) {
+      remove(result, -op1)
+      op1 = a[i1++]
+      continue
+    }
+    if (isInsert(op2)) {
+      insert(result, op2)
+      op2 = b[i2++]
+      continue
+    }
+    if (op1 === undefined || op2 === undefined) {
+      throw new Error('Operations are not compatible')
+    }
+
+    if (isRetain(op1) && isRetain(op2)) {
+      const length = Math.min(op1, op2)
+      retain(result, length)
+      op1 = op1 - length
+      op2 = op2 - length
+    } else if (isInsert(op1) && isDelete(op2)) {
+      const length = Math.min(op1.length, -op2)
+      op1 = op1.slice(length)
+      op2 = op2 + length
+    } else if (isInsert(op1) && isRetain(op2)) {
+      const length = Math.min(op1.length, op2)
+      insert(result, op1.slice(0, length))
+      op1 = op1.slice(length)
+      op2 = op2 - length
+    } else {
+      // Retain followed by delete
+      const length = Math.min(op1 as number, -(op2 as number))
+      remove(result, length)
+      op1 = (op1 as number) - length
+      op2 = (op2 as number) + length
+    }
+    if (op1 === 0 || op1 === '') op1 = a[i1++]
+    if (op2 === 0) op2 = b[i2++]
+  }
+  return result
+}
+
+// Build an operation turning oldText into newText from their common prefix
+// and suffix, which is exact for a single contiguous editor change.
+export function diff(oldText: string, newText: string): Operation {
+  const ops: Operation = []
+  if (oldText === newText) {
+    retain(ops, oldText.length)
+    return ops
+  }
+  const limit = Math.min(oldText.length, newText.length)
+  let prefix = 0
+  while (prefix < limit && oldText[prefix] === newText[prefix]) prefix++
+  let suffix = 0
+  while (
+    suffix < limit - prefix &&
+    oldText[oldText.length - 1 - suffix] === newText[newText.length - 1 - suffix]
+  ) {
+    suffix++
+  }
+  // Don't split a surrogate pair between the edit and the retained text
+  const isLowSurrogate = (code: number) => code >= 0xdc00 && code <= 0xdfff
+  if (prefix > 0 && isLowSurrogate(oldText.charCodeAt(prefix))) prefix--
+  if (suffix > 0 && isLowSurrogate(oldText.charCodeAt(oldText.length - suffix))) suffix--
+
+  retain(ops, prefix)
+  insert(ops, newText.slice(prefix, newText.length - suffix))
+  remove(ops, oldText.length - prefix - suffix)
+  retain(ops, suffix)
+  return ops
+}
+
+// A replacement of the text between from and to, positions in the document
+// before any of the replacements, as editors such as CodeMirror describe changes.
+export interface Replacement {
+  from: number
+  to: number
+  insert: string
+}
+
+// Build an operation from ordered, non-overlapping replacements on a
+// document of the given length.
+export function fromReplacements(length: number, replacements: Replacement[]): Operation {
+  const ops: Operation = []
+  let index = 0
+  for (const replacement of replacements) {
+    retain(ops, replacement.from - index)
+    insert(ops, replacement.insert)
+    remove(ops, replacement.to - replacement.from)
+    index = replacement.to
+  }
+  retain(ops, length - index)
+  return ops
+}
+
+// The replacements an operation makes, for applying it to an editor in place.
+export function toReplacements(ops: Operation): Replacement[] {
+  const replacements: Replacement[] = []
+  let index = 0
+  for (const op of ops) {
+    if (isRetain(op)) {
+      index += op
+      continue
+    }
+    let last = replacements[replacements.length - 1]
+    if (!last || last.to !== index) {
+      last = { from: index, to: index, insert: '' }
+      replacements.push(last)
+    }
+    if (isInsert(op)) {
+      last.insert += op
+    } else {
+      last.to -= op
+      index -= op
+    }
+  }
+  return replacements
+}
+
+export function isNoop(ops: Operation): boolean {
+  return ops.every(op => isRetain(op))
+}
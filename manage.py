@@ -20,6 +20,12 @@ def start_backend():
     env["PYTHONPATH"] = os.getcwd()
     subprocess.run([sys.executable, "backend/main.py"], cwd=".", env=env)
 
+def serve_backend():
+    print("Starting production backend server on http://localhost:5001...")
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.getcwd()
+    subprocess.run([sys.executable, "-m", "backend.serve"], cwd=".", env=env)
+
 def start_frontend():
     print("Starting frontend dev server on http://localhost:5173...")
     subprocess.run(["npm", "run", "dev"], cwd="frontend")
@@ -48,7 +54,7 @@ def dev_mode():
 
 def main():
     parser = argparse.ArgumentParser(description="StudyHall Management Tool")
-    parser.add_argument("action", choices=["build", "run", "dev"], help="Action to perform")
+    parser.add_argument("action", choices=["build", "run", "serve", "dev"], help="Action to perform")
     
     args = parser.parse_args()
     
@@ -56,6 +62,8 @@ def main():
         build_frontend()
     elif args.action == "run":
         start_backend()
+    elif args.action == "serve":
+        serve_backend()
     elif args.action == "dev":
         dev_mode()
 
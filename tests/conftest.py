@@ -16,6 +16,16 @@ test_engine = create_engine(
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
 
 
+@pytest.fixture(autouse=True)
+def no_pair_persistence():
+    """Keep pair sessions, recordings and chat out of the database unless a test opts in."""
+    from backend.services import pair_programming
+    with patch.object(pair_programming, "persistence", None), \
+         patch.object(pair_programming, "recorder", None), \
+         patch.object(pair_programming, "chat_archive", None):
+        yield
+
+
 @pytest.fixture(scope="function")
 def db():
     """Create a fresh database for each test."""
@@ -31,7 +41,9 @@ def db():
 @pytest.fixture(scope="function")
 def db_patch():
     """Patch SessionLocal to use test database."""
-    with patch('backend.main.SessionLocal', TestingSessionLocal):
+    from backend.services.notion_sync_worker import notion_sync_worker
+    with patch('backend.main.SessionLocal', TestingSessionLocal), \
+         patch.object(notion_sync_worker, 'session_factory', TestingSessionLocal):
         yield
 
 
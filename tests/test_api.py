@@ -1,5 +1,6 @@
 import pytest
 import json
+from datetime import datetime
 from backend.models import Student, Material
 
 
@@ -169,6 +170,20 @@ class TestMaterialsEndpoints:
         assert None not in data
 
 
+def _run_sync_job(client):
+    """Start a Notion sync through the API and return the finished job."""
+    from backend.services.notion_sync_worker import notion_sync_worker
+    
+    response = client.post("/api/materials/sync-notion")
+    assert response.status_code == 202
+    job_id = json.loads(response.data)["job_id"]
+    notion_sync_worker.wait(job_id, timeout=10)
+    
+    response = client.get(f"/api/materials/sync-notion/{job_id}")
+    assert response.status_code == 200
+    return json.loads(response.data)
+
+
 class TestNotionSyncEndpoint:
     """Test Notion sync endpoint."""
     
@@ -176,10 +191,48 @@ class TestNotionSyncEndpoint:
         """Test syncing when Notion API key is missing."""
         monkeypatch.setenv("NOTION_API_KEY", "")
         
-        response = client.post("/api/materials/sync-notion")
+        job = _run_sync_job(client)
         
         # Should handle gracefully
-        assert response.status_code in [200, 500]
+        assert job["status"] == "completed"
+    
+    def test_sync_notion_returns_job_id(self, client, db):
+        """Test that starting a sync returns immediately with a job ID."""
+        import threading
+        from unittest.mock import patch, AsyncMock
+        from backend.services.notion_sync_worker import notion_sync_worker
+        
+        release = threading.Event()
+        
+        async def slow_fetch():
+            import asyncio
+            while not release.is_set():
+                await asyncio.sleep(0.01)
+            return []
+        
+        with patch('backend.services.notion_sync.notion_service.fetch_pages', new_callable=AsyncMock) as mock_fetch:
+            mock_fetch.side_effect = slow_fetch
+            
+            first = json.loads(client.post("/api/materials/sync-notion").data)
+            second = json.loads(client.post("/api/materials/sync-notion").data)
+            
+            # Overlapping syncs share the running job
+            assert first["success"] is True
+            assert first["deduplicated"] is False
+            assert second["job_id"] == first["job_id"]
+            assert second["deduplicated"] is True
+            
+            release.set()
+            job = notion_sync_worker.wait(first["job_id"], timeout=10)
+        
+        assert job["status"] == "completed"
+        assert job["pages_total"] == 0
+    
+    def test_sync_notion_unknown_job(self, client):
+        """Test getting the status of a job that doesn't exist."""
+        response = client.get("/api/materials/sync-notion/does-not-exist")
+        
+        assert response.status_code == 404
     
     def test_sync_notion_success(self, client, db, monkeypatch):
         """Test successful Notion sync."""
@@ -212,10 +265,10 @@ class TestNotionSyncEndpoint:
         with patch('backend.services.notion_sync.notion_service.fetch_pages', new_callable=AsyncMock) as mock_fetch:
             mock_fetch.return_value = mock_pages
             
-            response = client.post("/api/materials/sync-notion")
+            job = _run_sync_job(client)
             
-            assert response.status_code == 200
-            data = json.loads(response.data)
+            assert job["status"] == "completed"
+            data = job["result"]
             assert data["success"] is True
             assert data["synced"] == 2
     
@@ -259,10 +312,10 @@ class TestNotionSyncEndpoint:
         with patch('backend.services.notion_sync.notion_service.fetch_pages', new_callable=AsyncMock) as mock_fetch:
             mock_fetch.return_value = mock_pages
             
-            response = client.post("/api/materials/sync-notion")
+            job = _run_sync_job(client)
             
-            assert response.status_code == 200
-            data = json.loads(response.data)
+            assert job["status"] == "completed"
+            data = job["result"]
             assert data["success"] is True
             assert data["synced"] == 1  # Only new page synced
     
@@ -276,10 +329,10 @@ class TestNotionSyncEndpoint:
         with patch('backend.services.notion_sync.notion_service.fetch_pages', new_callable=AsyncMock) as mock_fetch:
             mock_fetch.return_value = []
             
-            response = client.post("/api/materials/sync-notion")
+            job = _run_sync_job(client)
             
-            assert response.status_code == 200
-            data = json.loads(response.data)
+            assert job["status"] == "completed"
+            data = job["result"]
             assert data["success"] is True
             assert data["synced"] == 0
     
@@ -301,10 +354,10 @@ class TestNotionSyncEndpoint:
         with patch('backend.services.notion_sync.notion_service.fetch_pages', new_callable=AsyncMock) as mock_fetch:
             mock_fetch.return_value = mock_pages
             
-            response = client.post("/api/materials/sync-notion")
+            job = _run_sync_job(client)
             
-            assert response.status_code == 200
-            data = json.loads(response.data)
+            assert job["status"] == "completed"
+            data = job["result"]
             assert data["success"] is True
             assert data["synced"] == 1
             
@@ -416,3 +469,74 @@ class TestExportEndpoint:
         
         # Should handle gracefully
         assert response.status_code in [400, 500]
+
+
+class TestMaterialHtmlFormat:
+    """Test pre-rendered HTML content for materials."""
+    
+    def test_get_material_html(self, client, db, sample_material):
+        """Test getting a material as rendered HTML."""
+        sample_material.content = "# Heading\n\n<script>alert(1)</script>"
+        db.commit()
+        
+        response = client.get(f"/api/materials/{sample_material.id}?format=html")
+        
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data["format"] == "html"
+        assert "<h1>Heading</h1>" in data["content"]
+        assert "<script" not in data["content"]
+    
+    def test_get_materials_html(self, client, db, multiple_materials):
+        """Test listing materials as rendered HTML."""
+        response = client.get("/api/materials?format=html")
+        
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert all(m["format"] == "html" for m in data)
+        assert all(m["content"].startswith("<p>") for m in data)
+    
+    def test_get_material_markdown_by_default(self, client, db, sample_material):
+        """Test that markdown remains the default format."""
+        response = client.get(f"/api/materials/{sample_material.id}")
+        
+        data = json.loads(response.data)
+        assert data["format"] == "markdown"
+        assert data["content"] == sample_material.content
+    
+    def test_stale_render_rebuilt_on_read(self, client, db, sample_material):
+        """Test that a render from an older version is rebuilt when read as HTML."""
+        sample_material.content_html = "<p>old</p>"
+        sample_material.html_render_version = 0
+        db.commit()
+        
+        response = client.get(f"/api/materials/{sample_material.id}?format=html")
+        
+        data = json.loads(response.data)
+        assert data["content"] == "<p>This is test content</p>"
+        db.expire_all()
+        assert db.get(Material, sample_material.id).html_render_version >= 1
+    
+    @pytest.mark.parametrize("detail", [True, False])
+    def test_stale_render_rebuild_keeps_updated_at(self, client, db, sample_material, detail):
+        """Test that rebuilding a render on read doesn't count as an edit."""
+        edited = datetime(2024, 1, 1, 9, 0, 0)
+        sample_material.html_render_version = 0
+        sample_material.updated_at = edited
+        db.commit()
+        
+        url = f"/api/materials/{sample_material.id}" if detail else "/api/materials"
+        response = client.get(f"{url}?format=html")
+        
+        assert response.status_code == 200
+        
+        db.expire_all()
+        material = db.get(Material, sample_material.id)
+        assert material.html_render_version >= 1
+        assert material.updated_at == edited
+    
+    def test_invalid_format(self, client, db, sample_material):
+        """Test that an unknown format is rejected."""
+        response = client.get(f"/api/materials/{sample_material.id}?format=pdf")
+        
+        assert response.status_code == 400
@@ -0,0 +1,78 @@
+import pytest
+from unittest.mock import patch
+from backend.models import Material
+from backend.services import markdown_render
+from backend.services.markdown_render import (
+    RENDER_VERSION, render_markdown, render_markdown_async, ensure_rendered, is_render_stale
+)
+
+
+class TestRenderMarkdown:
+    """Test markdown rendering and sanitization."""
+    
+    def test_renders_markdown(self):
+        """Test headings, lists, code and tables are rendered."""
+        html = render_markdown(
+            "# Title\n\n- one\n- two\n\n```python\nprint(1)\n```\n\n| a | b |\n| --- | --- |\n| 1 | 2 |\n"
+        )
+        
+        assert "<h1>Title</h1>" in html
+        assert "<li>one</li>" in html
+        assert '<code class="language-python">' in html
+        assert "<table>" in html
+    
+    def test_strips_unsafe_html(self):
+        """Test that scripts, event handlers and javascript: links are removed."""
+        html = render_markdown(
+            '<script>alert(1)</script>\n\n<img src="x.png" onerror="alert(1)">\n\n[x](javascript:alert(1))'
+        )
+        
+        assert "<script" not in html
+        assert "onerror" not in html
+        assert "javascript:" not in html
+        assert 'src="x.png"' in html
+    
+    def test_empty_content(self):
+        """Test that empty content renders to an empty string."""
+        assert render_markdown(None) == ""
+        assert render_markdown("") == ""
+    
+    async def test_render_async_matches_sync(self):
+        """Test that rendering on the worker pool gives the same result."""
+        assert await render_markdown_async("**bold**") == render_markdown("**bold**")
+
+
+class TestMaterialRenderCache:
+    """Test rendered HTML stored on materials."""
+    
+    def test_render_on_insert(self, db):
+        """Test that HTML is rendered when a material is created."""
+        material = Material(title="T", content="## Hello")
+        db.add(material)
+        db.commit()
+        
+        assert material.content_html == "<h2>Hello</h2>"
+        assert material.html_render_version == RENDER_VERSION
+    
+    def test_render_on_content_update(self, db):
+        """Test that HTML is re-rendered when content changes."""
+        material = Material(title="T", content="## Hello")
+        db.add(material)
+        db.commit()
+        
+        material.content = "## Goodbye"
+        db.commit()
+        
+        assert material.content_html == "<h2>Goodbye</h2>"
+    
+    def test_stale_render_is_rebuilt(self, db):
+        """Test that renders from an older renderer version are rebuilt lazily."""
+        material = Material(title="T", content="*hi*")
+        db.add(material)
+        db.commit()
+        
+        with patch.object(markdown_render, "RENDER_VERSION", RENDER_VERSION + 1):
+            assert is_render_stale(material)
+            assert ensure_rendered(material) is True
+            assert material.html_render_version == RENDER_VERSION + 1
+            assert ensure_rendered(material) is False
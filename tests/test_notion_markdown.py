@@ -0,0 +1,141 @@
+import pytest
+from backend.services.notion_markdown import MarkdownWriter, blocks_to_markdown, render_rich_text
+
+
+def _text(content, href=None, **annotations):
+    """Build a Notion rich text item."""
+    return {"plain_text": content, "href": href, "annotations": annotations}
+
+
+def _block(block_type, rich_text=None, children=None, **data):
+    """Build a Notion block with the given type data."""
+    block = {"type": block_type, block_type: {"rich_text": rich_text or [], **data}}
+    if children is not None:
+        block["children"] = children
+    return block
+
+
+class TestRenderRichText:
+    """Test rich text rendering."""
+    
+    def test_plain_text(self):
+        """Test rendering text without annotations."""
+        assert render_rich_text([_text("Hello "), _text("world")]) == "Hello world"
+    
+    def test_annotations(self):
+        """Test that annotations are applied."""
+        assert render_rich_text([_text("b", bold=True)]) == "**b**"
+        assert render_rich_text([_text("i", italic=True)]) == "*i*"
+        assert render_rich_text([_text("s", strikethrough=True)]) == "~~s~~"
+        assert render_rich_text([_text("c", code=True)]) == "`c`"
+        assert render_rich_text([_text("x", bold=True, code=True)]) == "**`x`**"
+    
+    def test_links(self):
+        """Test that links wrap the formatted text."""
+        assert render_rich_text([_text("docs", href="https://python.org", bold=True)]) == \
+            "[**docs**](https://python.org)"
+        item = {"plain_text": "site", "text": {"content": "site", "link": {"url": "https://a.b"}}}
+        assert render_rich_text([item]) == "[site](https://a.b)"
+
+
+class TestMarkdownWriter:
+    """Test block-to-markdown conversion."""
+    
+    def test_basic_blocks(self):
+        """Test the common block types."""
+        blocks = [
+            _block("heading_1", [_text("Title")]),
+            _block("paragraph", [_text("Some "), _text("bold", bold=True)]),
+            _block("bulleted_list_item", [_text("Item")]),
+            _block("numbered_list_item", [_text("Step")]),
+            _block("to_do", [_text("Done")], checked=True),
+            _block("quote", [_text("Quoted")]),
+            {"type": "divider", "divider": {}},
+            _block("code", [_text("print('hi')", bold=True)], language="python"),
+        ]
+        
+        assert blocks_to_markdown(blocks) == (
+            "# Title\n\n"
+            "Some **bold**\n\n"
+            "- Item\n"
+            "1. Step\n"
+            "- [x] Done\n"
+            "> Quoted\n\n"
+            "---\n\n"
+            "```python\nprint('hi')\n```\n\n"
+        )
+    
+    def test_headings_apply_annotations(self):
+        """Test that annotations apply to every block type, not just paragraphs."""
+        blocks = [_block("heading_2", [_text("Big", italic=True)])]
+        
+        assert blocks_to_markdown(blocks) == "## *Big*\n\n"
+    
+    def test_callout(self):
+        """Test callouts render as quotes with their icon."""
+        blocks = [_block("callout", [_text("Note this")], icon={"type": "emoji", "emoji": "💡"})]
+        
+        assert blocks_to_markdown(blocks) == "> 💡 Note this\n\n"
+    
+    def test_toggle_wraps_children(self):
+        """Test toggles render as details with their children inside."""
+        blocks = [_block("toggle", [_text("More")], children=[_block("paragraph", [_text("Hidden")])])]
+        
+        assert blocks_to_markdown(blocks) == (
+            "<details>\n<summary>More</summary>\n\nHidden\n\n</details>\n\n"
+        )
+    
+    def test_image_and_bookmark(self):
+        """Test media blocks."""
+        blocks = [
+            {"type": "image", "image": {"type": "external", "external": {"url": "https://img/x.png"},
+                                        "caption": [_text("Diagram")]}},
+            {"type": "image", "image": {"type": "file", "file": {"url": "https://s3/y.png"}}},
+            {"type": "bookmark", "bookmark": {"url": "https://python.org", "caption": []}},
+        ]
+        
+        assert blocks_to_markdown(blocks) == (
+            "![Diagram](https://img/x.png)\n\n"
+            "![](https://s3/y.png)\n\n"
+            "[https://python.org](https://python.org)\n\n"
+        )
+    
+    def test_table(self):
+        """Test tables render with a header separator and escaped pipes."""
+        def row(*cells):
+            return {"type": "table_row", "table_row": {"cells": [[_text(c)] for c in cells]}}
+        
+        blocks = [{
+            "type": "table",
+            "table": {"table_width": 2, "has_column_header": True},
+            "children": [row("Name", "Value"), row("a|b", "1")],
+        }]
+        
+        assert blocks_to_markdown(blocks) == (
+            "| Name | Value |\n| --- | --- |\n| a\\|b | 1 |\n\n"
+        )
+    
+    def test_nested_children_are_indented(self):
+        """Test nesting under list items and flat layout containers."""
+        blocks = [
+            _block("bulleted_list_item", [_text("Parent")], children=[
+                _block("bulleted_list_item", [_text("Child")]),
+            ]),
+            {"type": "column_list", "column_list": {}, "children": [
+                {"type": "column", "column": {}, "children": [_block("paragraph", [_text("In column")])]},
+            ]},
+        ]
+        
+        assert blocks_to_markdown(blocks) == "- Parent\n    - Child\nIn column\n\n"
+    
+    def test_unknown_block_types_are_skipped(self):
+        """Test that unsupported blocks produce no output."""
+        assert blocks_to_markdown([{"type": "unsupported", "unsupported": {}}]) == ""
+    
+    def test_streaming_writes_accumulate(self):
+        """Test that blocks written in chunks produce one document."""
+        writer = MarkdownWriter()
+        writer.write_blocks([_block("paragraph", [_text("One")])])
+        writer.write_blocks([_block("paragraph", [_text("Two")])])
+        
+        assert writer.getvalue() == "One\n\nTwo\n\n"
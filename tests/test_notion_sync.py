@@ -1,6 +1,6 @@
 import pytest
 from unittest.mock import Mock, patch, AsyncMock
-from backend.services.notion_sync import NotionSyncService, notion_service
+from backend.services.notion_sync import NotionSyncService, notion_service, compute_content_hash
 
 
 class TestNotionSyncService:
@@ -256,3 +256,300 @@ class TestNotionSyncIntegration:
         assert service.headers["Content-Type"] == "application/json"
         assert "Notion-Version" in service.headers
         assert service.headers["Notion-Version"] == "2022-06-28"
+
+
+def _page(page_id, title, category=None):
+    """Build a minimal Notion page payload."""
+    properties = {"Name": {"type": "title", "title": [{"plain_text": title}]}}
+    if category:
+        properties["Category"] = {"type": "select", "select": {"name": category}}
+    return {"id": page_id, "url": f"https://notion.so/{page_id}", "properties": properties}
+
+
+class TestSyncToDatabase:
+    """Test batched syncing of Notion pages into the database."""
+    
+    async def test_sync_inserts_new_pages(self, db):
+        """Test that new pages are inserted and counted as synced."""
+        from backend.models import Material
+        
+        service = NotionSyncService()
+        pages = [_page("page-1", "One", "Python"), _page("page-2", "Two")]
+        
+        with patch.object(service, 'fetch_pages', new_callable=AsyncMock) as mock_fetch, \
+             patch.object(service, '_get_page_content', new_callable=AsyncMock) as mock_content:
+            mock_fetch.return_value = pages
+            mock_content.return_value = "Body"
+            
+            result = await service.sync_to_database(db, batch_size=1)
+        
+        assert result == {
+            'success': True, 'synced': 2, 'updated': 0, 'unchanged': 0, 'skipped': 0,
+            'errors': 0, 'total': 2
+        }
+        materials = db.query(Material).order_by(Material.notion_page_id).all()
+        assert [m.title for m in materials] == ["One", "Two"]
+        assert materials[0].category == "Python"
+    
+    async def test_sync_counts_updated_and_unchanged(self, db):
+        """Test that existing pages are reported as updated or unchanged."""
+        from backend.models import Material
+        
+        db.add(Material(title="Same", content="Body", notion_page_id="page-1",
+                        notion_url="https://notion.so/page-1", category="Python"))
+        db.add(Material(title="Old title", content="Body", notion_page_id="page-2",
+                        notion_url="https://notion.so/page-2", category="Python"))
+        db.commit()
+        
+        service = NotionSyncService()
+        pages = [_page("page-1", "Same"), _page("page-2", "New title")]
+        
+        with patch.object(service, 'fetch_pages', new_callable=AsyncMock) as mock_fetch, \
+             patch.object(service, '_get_page_content', new_callable=AsyncMock) as mock_content:
+            mock_fetch.return_value = pages
+            mock_content.return_value = "Body"
+            
+            result = await service.sync_to_database(db)
+        
+        assert result['synced'] == 0
+        assert result['updated'] == 1
+        assert result['unchanged'] == 1
+        assert result['errors'] == 0
+        updated = db.query(Material).filter(Material.notion_page_id == "page-2").one()
+        assert updated.title == "New title"
+        assert updated.category == "Python"  # Kept when the page has no category
+        # Rows synced before content hashing get their hash backfilled
+        assert all(m.content_hash for m in db.query(Material).all())
+    
+    async def test_resync_skips_pages_with_matching_hash(self, db):
+        """Test that re-syncing identical pages skips the write entirely."""
+        from backend.models import Material
+        
+        service = NotionSyncService()
+        pages = [_page("page-1", "One", "Python"), _page("page-2", "Two")]
+        
+        with patch.object(service, 'fetch_pages', new_callable=AsyncMock) as mock_fetch, \
+             patch.object(service, '_get_page_content', new_callable=AsyncMock) as mock_content:
+            mock_fetch.return_value = pages
+            mock_content.return_value = "Body"
+            
+            await service.sync_to_database(db)
+            result = await service.sync_to_database(db)
+            
+            assert result['skipped'] == 2
+            assert result['synced'] == 0
+            assert result['updated'] == 0
+            assert all(m.updated_at is None for m in db.query(Material).all())
+            
+            mock_content.return_value = "Edited body"
+            result = await service.sync_to_database(db)
+        
+        assert result['updated'] == 2
+        assert result['skipped'] == 0
+        assert {m.content for m in db.query(Material).all()} == {"Edited body"}
+    
+    async def test_sync_bad_page_does_not_roll_back_batch(self, db):
+        """Test that a failing page is counted as an error and the rest are kept."""
+        from backend.models import Material
+        
+        service = NotionSyncService()
+        pages = [_page("page-1", "One"), _page("page-2", None), _page("page-3", "Three")]
+        
+        with patch.object(service, 'fetch_pages', new_callable=AsyncMock) as mock_fetch, \
+             patch.object(service, '_get_page_content', new_callable=AsyncMock) as mock_content, \
+             patch.object(service, '_extract_title', side_effect=lambda props: (
+                 props["Name"]["title"][0]["plain_text"])):
+            mock_fetch.return_value = pages
+            mock_content.return_value = "Body"
+            
+            # A NULL title violates the NOT NULL constraint at flush time
+            result = await service.sync_to_database(db, batch_size=10)
+        
+        assert result['synced'] == 2
+        assert result['errors'] == 1
+        assert result['total'] == 3
+        page_ids = {m.notion_page_id for m in db.query(Material).all()}
+        assert page_ids == {"page-1", "page-3"}
+    
+    async def test_sync_duplicate_page_ids_update_same_row(self, db):
+        """Test that a page ID seen twice in one run becomes an update."""
+        from backend.models import Material
+        
+        service = NotionSyncService()
+        pages = [_page("page-1", "First"), _page("page-1", "Second")]
+        
+        with patch.object(service, 'fetch_pages', new_callable=AsyncMock) as mock_fetch, \
+             patch.object(service, '_get_page_content', new_callable=AsyncMock) as mock_content:
+            mock_fetch.return_value = pages
+            mock_content.return_value = "Body"
+            
+            result = await service.sync_to_database(db)
+        
+        assert result['synced'] == 1
+        assert result['updated'] == 1
+        assert db.query(Material).one().title == "Second"
+
+
+class TestContentHash:
+    """Test content hashing for change detection."""
+    
+    def test_hash_is_stable(self):
+        """Test that identical input produces the same hash."""
+        assert compute_content_hash("T", "Python", "Body") == compute_content_hash("T", "Python", "Body")
+    
+    def test_hash_covers_every_field(self):
+        """Test that changing any field changes the hash."""
+        base = compute_content_hash("T", "Python", "Body")
+        assert compute_content_hash("T2", "Python", "Body") != base
+        assert compute_content_hash("T", "Web", "Body") != base
+        assert compute_content_hash("T", "Python", "Body!") != base
+        # Field boundaries are part of the digest
+        assert compute_content_hash("ab", None, "c") != compute_content_hash("a", None, "bc")
+
+
+def _block(block_id, block_type, text="", has_children=False):
+    """Build a minimal Notion block payload."""
+    return {
+        "id": block_id,
+        "type": block_type,
+        "has_children": has_children,
+        block_type: {"rich_text": [{"plain_text": text}]}
+    }
+
+
+def _children_response(tree, url):
+    """Return a mocked children response for the block named in the URL."""
+    block_id = url.split("/blocks/")[1].split("/")[0]
+    response = Mock()
+    response.json.return_value = {"results": tree.get(block_id, []), "has_more": False}
+    response.raise_for_status = Mock()
+    return response
+
+
+class TestNestedBlocks:
+    """Test recursive fetching and rendering of nested blocks."""
+    
+    @staticmethod
+    def _tree():
+        """Build a fresh block tree; fetching attaches children in place."""
+        return {
+            "page": [
+                _block("b1", "bulleted_list_item", "Parent", has_children=True),
+                _block("sub", "child_page", "Sub page", has_children=True),
+                _block("p1", "paragraph", "After"),
+            ],
+            "b1": [_block("b2", "bulleted_list_item", "Child", has_children=True)],
+            "b2": [_block("b3", "bulleted_list_item", "Grandchild")],
+            "sub": [_block("x", "paragraph", "Should not be fetched")],
+        }
+    
+    async def test_fetch_expands_nested_children(self):
+        """Test that children are attached level by level."""
+        service = NotionSyncService()
+        tree = self._tree()
+        
+        with patch.object(service.client, 'get', new_callable=AsyncMock) as mock_get:
+            mock_get.side_effect = lambda url, **kwargs: _children_response(tree, url)
+            
+            blocks = await service._fetch_page_blocks("page")
+        
+        assert blocks[0]["children"][0]["id"] == "b2"
+        assert blocks[0]["children"][0]["children"][0]["id"] == "b3"
+        # Child pages are separate materials and are never expanded
+        assert "children" not in blocks[1]
+        assert mock_get.call_count == 3
+    
+    async def test_fetch_respects_depth_limit(self):
+        """Test that expansion stops at the configured depth."""
+        service = NotionSyncService()
+        tree = self._tree()
+        
+        with patch.object(service.client, 'get', new_callable=AsyncMock) as mock_get:
+            mock_get.side_effect = lambda url, **kwargs: _children_response(tree, url)
+            
+            blocks = await service._fetch_page_blocks("page", max_depth=1)
+        
+        assert blocks[0]["children"][0]["id"] == "b2"
+        assert "children" not in blocks[0]["children"][0]
+        assert mock_get.call_count == 2
+    
+    async def test_fetch_respects_request_budget(self):
+        """Test that no more requests are made than the budget allows."""
+        service = NotionSyncService()
+        tree = self._tree()
+        
+        with patch.object(service.client, 'get', new_callable=AsyncMock) as mock_get:
+            mock_get.side_effect = lambda url, **kwargs: _children_response(tree, url)
+            
+            blocks = await service._fetch_page_blocks("page", request_budget=2)
+        
+        assert mock_get.call_count == 2
+        assert blocks[0]["children"][0]["id"] == "b2"
+        assert blocks[0]["children"][0]["children"] == []
+    
+    async def test_page_content_preserves_nesting(self):
+        """Test that nested blocks are indented under their parent."""
+        service = NotionSyncService()
+        tree = self._tree()
+        
+        with patch.object(service.client, 'get', new_callable=AsyncMock) as mock_get:
+            mock_get.side_effect = lambda url, **kwargs: _children_response(tree, url)
+            
+            content = await service._get_page_content("page")
+        
+        assert content == "- Parent\n    - Child\n        - Grandchild\nAfter"
+
+
+class TestSyncAgainstFakeWorkspace:
+    """Test the full sync against the local fake Notion API."""
+    
+    async def test_sync_fake_workspace(self, db):
+        """Test syncing a paginated workspace with nested blocks."""
+        from backend.models import Material
+        from benchmarks.fake_notion import FakeNotionWorkspace
+        
+        workspace = FakeNotionWorkspace(pages=5, blocks_per_page=12, nested_every=4, page_size=5)
+        service = NotionSyncService(client=workspace.client(), api_key="fake", database_id="db")
+        
+        result = await service.sync_to_database(db)
+        await service.close()
+        
+        assert result['synced'] == 5
+        assert result['errors'] == 0
+        material = db.query(Material).filter(Material.notion_page_id == "page-0").one()
+        assert material.title == "Synthetic page 0"
+        assert material.category == "Python"
+        # Nested children are fetched and indented under their parent
+        assert "\n    - Block page-0-block-4-child-2 with" in material.content
+        # HTML is rendered during the sync, not on first read
+        assert "<li>" in material.content_html
+    
+    async def test_rate_limited_requests_are_retried(self, db):
+        """Test that 429 responses are retried instead of dropping pages."""
+        from backend.models import Material
+        from benchmarks.fake_notion import FakeNotionWorkspace
+        
+        workspace = FakeNotionWorkspace(pages=10, blocks_per_page=5, rate_limit_ratio=0.3, seed=1)
+        service = NotionSyncService(client=workspace.client(), api_key="fake", database_id="db")
+        
+        with patch('backend.services.notion_sync.MAX_RETRIES', 20):
+            result = await service.sync_to_database(db)
+        await service.close()
+        
+        assert workspace.stats['rate_limited'] > 0
+        assert result['synced'] == 10
+        assert db.query(Material).count() == 10
+    
+    async def test_retries_give_up_after_limit(self):
+        """Test that a persistently rate-limited request eventually fails."""
+        from benchmarks.fake_notion import FakeNotionWorkspace
+        
+        workspace = FakeNotionWorkspace(pages=1, rate_limit_ratio=1.0)
+        service = NotionSyncService(client=workspace.client(), api_key="fake", database_id="db")
+        
+        with patch('backend.services.notion_sync.MAX_RETRIES', 2):
+            pages = await service.fetch_pages()
+        await service.close()
+        
+        assert pages == []
+        assert workspace.stats['requests'] == 3
@@ -0,0 +1,44 @@
+import threading
+
+import pytest
+from flask import Flask, request
+from unittest.mock import patch
+
+from backend.services import offload
+
+
+class TestRunBlocking:
+    """Test handing blocking calls to the event loop's thread pool."""
+    
+    def test_threading_mode_calls_directly(self):
+        """Test that threading mode runs the call on the current thread."""
+        with patch.object(offload, "ASYNC_MODE", "threading"):
+            assert offload.run_blocking(threading.get_ident) == threading.get_ident()
+    
+    def test_gevent_mode_uses_thread_pool(self):
+        """Test that gevent mode runs the call on a native worker thread."""
+        pytest.importorskip("gevent")
+        with patch.object(offload, "ASYNC_MODE", "gevent"):
+            assert offload.run_blocking(threading.get_ident) != threading.get_ident()
+            assert offload.run_blocking(divmod, 7, 2) == (3, 1)
+    
+    def test_nested_call_runs_on_the_same_worker(self):
+        """Test that offloading from a worker thread runs the call there instead of queueing it."""
+        pytest.importorskip("gevent")
+        with patch.object(offload, "ASYNC_MODE", "gevent"):
+            outer, inner = offload.run_blocking(lambda: (threading.get_ident(), offload.run_blocking(threading.get_ident)))
+            assert outer == inner != threading.get_ident()
+    
+    def test_offloaded_view_keeps_request_context(self):
+        """Test that an offloaded view can still read the request."""
+        pytest.importorskip("gevent")
+        app = Flask(__name__)
+        
+        @offload.offload
+        def view():
+            return request.args["q"], threading.get_ident()
+        
+        with patch.object(offload, "ASYNC_MODE", "gevent"), app.test_request_context("/?q=trees"):
+            query, ident = view()
+        assert query == "trees"
+        assert ident != threading.get_ident()
@@ -0,0 +1,101 @@
+import pytest
+from unittest.mock import patch
+
+from backend.models import PairChatMessage
+from backend.services import pair_programming
+from backend.services.pair_chat import ChatArchive
+from backend.services.session_store import InMemoryPairSessionStore
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture
+def archive(db):
+    """Archive chat to the test database, with a five-message buffer."""
+    archive = ChatArchive(session_factory=TestingSessionLocal)
+    with patch.object(pair_programming, "store", InMemoryPairSessionStore()), \
+         patch.object(pair_programming, "chat_archive", archive), \
+         patch.object(pair_programming, "CHAT_BUFFER_SIZE", 5):
+        yield archive
+
+
+def _chat(session_id, count):
+    for i in range(1, count + 1):
+        pair_programming.add_message(session_id, "alice", f"message {i}", "sock-a")
+
+
+class TestChatArchive:
+    """Test archiving chat overflow and paging across it."""
+    
+    def test_overflow_is_written_in_one_batch(self, archive, db):
+        """Test that messages pushed out of the buffer are archived together."""
+        session_id = pair_programming.create_session()
+        _chat(session_id, 12)
+        
+        assert db.query(PairChatMessage).count() == 0
+        assert archive.flush() == 7
+        assert archive.stats["flushes"] == 1
+        seqs = [row.seq for row in db.query(PairChatMessage).order_by(PairChatMessage.seq)]
+        assert seqs == list(range(1, 8))
+    
+    def test_pages_span_buffer_and_archive(self, archive):
+        """Test paging back from the buffer into archived messages."""
+        session_id = pair_programming.create_session()
+        _chat(session_id, 12)
+        
+        page = pair_programming.get_messages(session_id, limit=4)
+        assert [m["id"] for m in page["messages"]] == [9, 10, 11, 12]
+        
+        page = pair_programming.get_messages(session_id, before=page["cursor"], limit=4)
+        assert [m["id"] for m in page["messages"]] == [5, 6, 7, 8]
+        assert page["messages"][0]["message"] == "message 5"
+        
+        page = pair_programming.get_messages(session_id, before=page["cursor"], limit=10)
+        assert [m["id"] for m in page["messages"]] == [1, 2, 3, 4]
+        assert page["cursor"] is None
+    
+    def test_paging_writes_only_that_session(self, archive, db):
+        """Test that reading one session's history leaves other sessions' messages queued."""
+        first = pair_programming.create_session()
+        second = pair_programming.create_session()
+        _chat(first, 8)
+        _chat(second, 9)
+        
+        assert [m["id"] for m in archive.get_page(first, before=6, limit=10)] == [1, 2, 3]
+        assert db.query(PairChatMessage).filter_by(session_id=second).count() == 0
+        assert archive.flush() == 4
+    
+    def test_deleted_session_drops_archive(self, archive, db):
+        """Test that deleting a session removes its archived and queued messages."""
+        session_id = pair_programming.create_session()
+        _chat(session_id, 8)
+        archive.flush()
+        _chat(session_id, 2)
+        
+        pair_programming.delete_session(session_id)
+        archive.flush()
+        
+        assert db.query(PairChatMessage).count() == 0
+    
+    def test_rearchived_message_is_not_duplicated(self, archive, db):
+        """Test that archiving the same message twice keeps one row."""
+        session_id = pair_programming.create_session()
+        _chat(session_id, 6)
+        archive.flush()
+        message = {"id": 1, "username": "alice", "message": "message 1",
+                   "timestamp": db.query(PairChatMessage).one().timestamp}
+        
+        archive.append(session_id, message)
+        archive.flush()
+        
+        assert db.query(PairChatMessage).count() == 1
+    
+    def test_failed_flush_is_retried(self, archive, db):
+        """Test that messages stay queued when the write fails."""
+        session_id = pair_programming.create_session()
+        _chat(session_id, 7)
+        with patch.object(archive, "_write", side_effect=RuntimeError("database down")):
+            with pytest.raises(RuntimeError):
+                archive.flush()
+        
+        assert archive.flush() == 2
+        assert db.query(PairChatMessage).count() == 2
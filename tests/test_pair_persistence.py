@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+
+import pytest
+from unittest.mock import patch
+
+from backend.models import PairSessionSnapshot
+from backend.services import pair_programming
+from backend.services.pair_persistence import PairSessionPersister
+from backend.services.session_store import InMemoryPairSessionStore
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture
+def persister(db):
+    """Enable persistence to the test database with a fresh in-memory store."""
+    persister = PairSessionPersister(session_factory=TestingSessionLocal)
+    with patch.object(pair_programming, "store", InMemoryPairSessionStore()), \
+         patch.object(pair_programming, "persistence", persister):
+        yield persister
+
+
+def _restart():
+    """Simulate a restart by swapping in an empty store."""
+    pair_programming.store = InMemoryPairSessionStore()
+
+
+class TestPairSessionPersister:
+    """Test write-behind snapshots and lazy restore of pair sessions."""
+    
+    def test_edits_are_coalesced(self, persister, db):
+        """Test that many edits between flushes cost one write."""
+        session_id = pair_programming.create_session(host_username="Host")
+        for i in range(10):
+            pair_programming.update_session_code(session_id, f"x = {i}")
+        
+        assert persister.flush() == 1
+        assert persister.flush() == 0
+        row = db.get(PairSessionSnapshot, session_id)
+        assert row.revision == 10
+        assert persister.stats["marked"] == 11
+        assert persister.stats["written"] == 1
+    
+    def test_restored_on_first_access(self, persister):
+        """Test that a session survives a restart without its participants."""
+        session_id = pair_programming.create_session(host_username="Host")
+        pair_programming.add_participant(session_id, None, "alice", "sock-a")
+        pair_programming.update_session_code(session_id, "x = 1")
+        pair_programming.add_message(session_id, "alice", "hi", "sock-a")
+        persister.flush()
+        
+        _restart()
+        
+        assert pair_programming.get_code(session_id) == "x = 1"
+        assert pair_programming.get_participants(session_id) == []
+        session = pair_programming.get_session(session_id)
+        assert session["revision"] == 1
+        assert session["messages"][0]["message"] == "hi"
+        assert isinstance(session["messages"][0]["timestamp"], datetime)
+        assert pair_programming.apply_code_operation(session_id, 1, [5, "0"])["revision"] == 2
+        assert persister.stats["restored"] == 1
+    
+    def test_live_socket_state_is_not_written(self, persister):
+        """Test that presence and joins don't queue writes."""
+        session_id = pair_programming.create_session()
+        persister.flush()
+        
+        pair_programming.add_participant(session_id, None, "alice", "sock-a")
+        pair_programming.update_cursor(session_id, "sock-a", {"line": 1})
+        pair_programming.remove_participant(session_id, "sock-a")
+        
+        assert persister.flush() == 0
+    
+    def test_deleted_session_is_not_restored(self, persister, db):
+        """Test that deleting a session removes its snapshot."""
+        session_id = pair_programming.create_session()
+        persister.flush()
+        
+        pair_programming.delete_session(session_id)
+        assert not pair_programming.session_exists(session_id)
+        persister.flush()
+        
+        assert db.get(PairSessionSnapshot, session_id) is None
+        _restart()
+        assert pair_programming.get_code(session_id) is None
+    
+    def test_expired_snapshot_is_not_restored(self, persister):
+        """Test that sessions that expired while down stay gone."""
+        session_id = pair_programming.create_session()
+        with pair_programming.store.locked(session_id) as session:
+            session["expires_at"] = datetime.now() + timedelta(milliseconds=50)
+        pair_programming.update_session_output(session_id, "done")
+        persister.flush()
+        
+        _restart()
+        with patch("backend.services.pair_persistence.datetime") as fake_datetime:
+            fake_datetime.now.return_value = datetime.now() + timedelta(seconds=1)
+            assert not persister.restore(session_id)
+    
+    def test_missing_sessions_are_cached(self, persister):
+        """Test that unknown ids only hit the database once."""
+        with patch.object(persister, "_load", wraps=persister._load) as load:
+            assert pair_programming.get_code("unknown") is None
+            assert not pair_programming.session_exists("unknown")
+        assert load.call_count == 1
+    
+    def test_failed_flush_is_retried(self, persister, db):
+        """Test that sessions stay queued when the write fails."""
+        session_id = pair_programming.create_session()
+        with patch.object(persister, "_write", side_effect=RuntimeError("database down")):
+            with pytest.raises(RuntimeError):
+                persister.flush()
+        
+        assert persister.flush() == 1
+        assert db.get(PairSessionSnapshot, session_id) is not None
@@ -0,0 +1,448 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from unittest.mock import patch
+
+from backend.main import app as flask_app, socketio, presence_aggregator
+from backend.services import pair_programming, text_ot
+from backend.services.session_store import InMemoryPairSessionStore, RedisPairSessionStore
+
+
+@pytest.fixture(autouse=True, params=["memory", "redis"])
+def store(request):
+    """Run every test against the in-memory store and the Redis store."""
+    if request.param == "memory":
+        backend = InMemoryPairSessionStore()
+    else:
+        fakeredis = pytest.importorskip("fakeredis")
+        backend = RedisPairSessionStore(fakeredis.FakeRedis(decode_responses=True))
+    with patch.object(pair_programming, "store", backend):
+        yield backend
+
+
+@pytest.fixture
+def session_id():
+    """Create a pair programming session and remove it afterwards."""
+    sid = pair_programming.create_session(host_username="Host")
+    yield sid
+    pair_programming.delete_session(sid)
+
+
+class TestSessionStore:
+    """Test the session store's accessors and locking."""
+    
+    def test_participants_keyed_by_socket(self, session_id):
+        """Test that rejoining on the same socket doesn't duplicate a participant."""
+        pair_programming.add_participant(session_id, 1, "alice", "sock-a")
+        pair_programming.add_participant(session_id, 1, "alice", "sock-a")
+        pair_programming.add_participant(session_id, None, "bob", "sock-b")
+        
+        assert [p["username"] for p in pair_programming.get_participants(session_id)] == ["alice", "bob"]
+        assert pair_programming.get_username(session_id, "sock-b") == "bob"
+        assert pair_programming.get_username(session_id, "sock-x") is None
+        
+        pair_programming.remove_participant(session_id, "sock-a")
+        assert pair_programming.get_username(session_id, "sock-a") is None
+    
+    def test_narrow_accessors(self, session_id):
+        """Test reading single fields without copying the session."""
+        pair_programming.update_session_code(session_id, "x = 1")
+        
+        assert pair_programming.get_code(session_id) == "x = 1"
+        assert pair_programming.session_exists(session_id)
+        assert pair_programming.get_code("missing") is None
+        assert not pair_programming.session_exists("missing")
+        
+        summary = pair_programming.get_summary(session_id)
+        assert summary["code"] == "x = 1"
+        assert summary["host_username"] == "Host"
+        assert "messages" not in summary
+    
+    def test_expired_session_is_removed(self, session_id, store):
+        """Test that an expired session is deleted when accessed."""
+        with store.locked(session_id) as session:
+            session["expires_at"] = datetime.now() - timedelta(seconds=1)
+        
+        assert pair_programming.get_code(session_id) is None
+        assert session_id not in store.session_ids()
+    
+    def test_sessions_lock_independently(self, session_id, store):
+        """Test that a busy session doesn't block work in another one."""
+        other = pair_programming.create_session()
+        result = []
+        try:
+            with store.locked(session_id):
+                worker = threading.Thread(target=lambda: result.append(pair_programming.get_code(other)))
+                worker.start()
+                worker.join(timeout=2)
+                assert not worker.is_alive()
+        finally:
+            pair_programming.delete_session(other)
+        assert result == ['print("Hello, StudyHall!")']
+
+
+class TestReaper:
+    """Test expiry, idle-participant reaping and disconnect cleanup."""
+    
+    def test_expired_session_is_reaped(self, session_id, store):
+        """Test that the reaper deletes sessions past their expiry."""
+        later = datetime.now() + timedelta(hours=25)
+        
+        reaped = pair_programming.reap_expired(now=later)
+        
+        assert session_id in reaped["sessions"]
+        assert session_id not in store.session_ids()
+    
+    def test_extended_session_survives(self, session_id):
+        """Test that the stale expiry check of an extended session is ignored."""
+        pair_programming.extend_session(session_id, hours=48)
+        
+        reaped = pair_programming.reap_expired(now=datetime.now() + timedelta(hours=25))
+        
+        assert session_id not in reaped["sessions"]
+        assert pair_programming.session_exists(session_id)
+    
+    def test_idle_participant_is_dropped(self, session_id, store):
+        """Test that participants idle past the timeout are removed."""
+        pair_programming.add_participant(session_id, None, "alice", "sock-idle")
+        pair_programming.update_cursor(session_id, "sock-idle", {"line": 1})
+        later = datetime.now() + pair_programming.PARTICIPANT_IDLE_TIMEOUT + timedelta(seconds=1)
+        
+        reaped = pair_programming.reap_expired(now=later)
+        
+        assert reaped["participants"] == {session_id: ["sock-idle"]}
+        assert pair_programming.get_participants(session_id) == []
+        assert "sock-idle" not in pair_programming.get_session(session_id)["cursors"]
+        assert store.socket_sessions("sock-idle") == set()
+    
+    def test_active_participant_is_kept(self, session_id, store):
+        """Test that a participant active since joining is rescheduled, not dropped."""
+        pair_programming.add_participant(session_id, None, "alice", "sock-busy")
+        timeout = pair_programming.PARTICIPANT_IDLE_TIMEOUT
+        first_check = datetime.now() + timeout + timedelta(seconds=1)
+        with store.locked(session_id) as session:
+            session["participants"]["sock-busy"]["last_seen"] = first_check
+        
+        assert pair_programming.reap_expired(now=first_check)["participants"] == {}
+        assert pair_programming.get_username(session_id, "sock-busy") == "alice"
+        
+        reaped = pair_programming.reap_expired(now=first_check + timeout + timedelta(seconds=1))
+        assert reaped["participants"] == {session_id: ["sock-busy"]}
+    
+    def test_disconnect_leaves_every_session(self, session_id, store):
+        """Test that a disconnect removes the socket from all of its sessions."""
+        other = pair_programming.create_session()
+        try:
+            for sid in (session_id, other):
+                pair_programming.add_participant(sid, None, "alice", "sock-d")
+            pair_programming.update_selection(session_id, "sock-d", {"from": 0, "to": 1})
+            
+            left = pair_programming.disconnect_socket("sock-d")
+            
+            assert sorted(left) == sorted([session_id, other])
+            assert pair_programming.get_participants(other) == []
+            assert pair_programming.get_session(session_id)["selections"] == {}
+            assert store.socket_sessions("sock-d") == set()
+            assert pair_programming.disconnect_socket("sock-d") == []
+        finally:
+            pair_programming.delete_session(other)
+    
+    def test_memory_stats(self, session_id):
+        """Test that memory metrics cover each session."""
+        pair_programming.add_participant(session_id, None, "alice", "sock-m")
+        
+        stats = pair_programming.get_memory_stats()
+        
+        entry = next(item for item in stats["largest_sessions"] if item["session_id"] == session_id)
+        assert entry["bytes"] > 0
+        assert entry["participants"] == 1
+        assert stats["total_bytes"] >= entry["bytes"]
+        assert stats["indexed_sockets"] >= 1
+
+
+class TestCodeOperations:
+    """Test revisioned code edits."""
+    
+    def test_apply_at_head(self, session_id):
+        """Test that an operation at the current revision is applied as is."""
+        code = pair_programming.get_session(session_id)["code"]
+        entry = pair_programming.apply_code_operation(session_id, 0, [len(code), "\n"], "sid-a")
+        
+        assert entry["revision"] == 1
+        assert entry["ops"] == [len(code), "\n"]
+        assert pair_programming.get_session(session_id)["code"] == code + "\n"
+    
+    def test_concurrent_operations_are_transformed(self, session_id):
+        """Test that two edits against the same revision both survive."""
+        pair_programming.update_session_code(session_id, "abc")
+        base = pair_programming.get_session(session_id)["revision"]
+        
+        pair_programming.apply_code_operation(session_id, base, ["X", 3], "sid-a")
+        entry = pair_programming.apply_code_operation(session_id, base, [3, "Y"], "sid-b")
+        
+        assert entry["ops"] == [4, "Y"]
+        assert pair_programming.get_session(session_id)["code"] == "XabcY"
+    
+    def test_invalid_operation(self, session_id):
+        """Test that an operation not matching the document is rejected."""
+        with pytest.raises(ValueError):
+            pair_programming.apply_code_operation(session_id, 0, ["x", 1], "sid-a")
+        assert pair_programming.get_session(session_id)["revision"] == 0
+    
+    def test_future_revision(self, session_id):
+        """Test that a revision the server hasn't reached is rejected."""
+        with pytest.raises(ValueError):
+            pair_programming.apply_code_operation(session_id, 5, ["x"], "sid-a")
+    
+    def test_stale_revision(self, session_id):
+        """Test that a base revision older than the history raises."""
+        with patch.object(pair_programming, "OP_HISTORY_LIMIT", 2):
+            for n in range(4):
+                pair_programming.update_session_code(session_id, f"v{n}")
+            with pytest.raises(pair_programming.StaleRevisionError):
+                pair_programming.apply_code_operation(session_id, 0, ["x", 26], "sid-a")
+    
+    def test_missing_session(self):
+        """Test that operations for unknown sessions return None."""
+        assert pair_programming.apply_code_operation("missing", 0, [], "sid-a") is None
+
+
+class TestCodeState:
+    """Test snapshot compaction and the state sent to joining clients."""
+    
+    def test_snapshot_plus_tail(self, session_id):
+        """Test that the snapshot and its tail rebuild the current code."""
+        with patch.object(pair_programming, "OP_COMPACT_INTERVAL", 3):
+            for n in range(7):
+                pair_programming.update_session_code(session_id, "x" * (n + 1))
+        
+        state = pair_programming.get_code_state(session_id)
+        assert state["snapshot_revision"] == 6
+        assert state["revision"] == 7
+        assert [entry["revision"] for entry in state["operations"]] == [7]
+        
+        code = state["code"]
+        for entry in state["operations"]:
+            code = text_ot.apply(code, entry["ops"])
+        assert code == pair_programming.get_session(session_id)["code"] == "x" * 7
+    
+    def test_history_is_bounded(self, session_id):
+        """Test that old operations are dropped but the tail is kept."""
+        with patch.object(pair_programming, "OP_HISTORY_LIMIT", 4), \
+             patch.object(pair_programming, "OP_COMPACT_INTERVAL", 10):
+            for n in range(9):
+                pair_programming.update_session_code(session_id, "y" * (n + 1))
+        
+        session = pair_programming.get_session(session_id)
+        state = pair_programming.get_code_state(session_id)
+        assert len(session["operations"]) == 4
+        code = state["code"]
+        for entry in state["operations"]:
+            code = text_ot.apply(code, entry["ops"])
+        assert code == "y" * 9
+
+
+class TestCodeSocketEvents:
+    """Test the code sync socket events."""
+    
+    @pytest.fixture
+    def clients(self, session_id):
+        """Connect two socket clients to the same session."""
+        flask_app.config['TESTING'] = True
+        first = socketio.test_client(flask_app)
+        second = socketio.test_client(flask_app)
+        for client, name in ((first, "alice"), (second, "bob")):
+            client.emit('join_session', {'session_id': session_id, 'username': name})
+        first.get_received()
+        second.get_received()
+        yield first, second
+        for client in (first, second):
+            if client.is_connected():
+                client.disconnect()
+    
+    def test_operation_is_acked_and_broadcast(self, session_id, clients):
+        """Test that the sender gets an ack and others get only the delta."""
+        first, second = clients
+        code = pair_programming.get_session(session_id)["code"]
+        
+        first.emit('code_operation', {
+            'session_id': session_id, 'revision': 0, 'ops': [len(code), '#'], 'username': 'alice'
+        })
+        
+        sent = first.get_received()
+        assert [(m['name'], m['args'][0]) for m in sent] == [('code_ack', {'revision': 1})]
+        received = second.get_received()
+        assert len(received) == 1
+        assert received[0]['name'] == 'code_operation'
+        assert received[0]['args'][0]['ops'] == [len(code), '#']
+        assert received[0]['args'][0]['revision'] == 1
+        assert 'code' not in received[0]['args'][0]
+    
+    def test_invalid_operation_resyncs(self, session_id, clients):
+        """Test that a diverged client is sent the current state."""
+        first, second = clients
+        
+        first.emit('code_operation', {'session_id': session_id, 'revision': 0, 'ops': ['x', 1]})
+        
+        sent = first.get_received()
+        assert sent[0]['name'] == 'code_resync'
+        assert sent[0]['args'][0]['revision'] == 0
+        assert second.get_received() == []
+    
+    def test_join_receives_snapshot_and_tail(self, session_id):
+        """Test that a late joiner gets the snapshot plus recent operations."""
+        pair_programming.update_session_code(session_id, "changed")
+        client = socketio.test_client(flask_app)
+        client.emit('join_session', {'session_id': session_id, 'username': 'carol'})
+        
+        state = next(m['args'][0] for m in client.get_received() if m['name'] == 'session_state')
+        code = state['code']
+        for entry in state['operations']:
+            code = text_ot.apply(code, entry['ops'])
+        assert code == "changed"
+        assert state['operations'][-1]['revision'] == 1
+        client.disconnect()
+    
+    def test_presence_is_batched(self, session_id, clients):
+        """Test that cursor and typing events reach others in one message."""
+        first, second = clients
+        with patch.object(presence_aggregator, 'start'):
+            for line in range(3):
+                first.emit('cursor_change', {'session_id': session_id, 'position': {'line': line, 'ch': 0}})
+            first.emit('typing_start', {'session_id': session_id})
+            assert second.get_received() == []
+            
+            presence_aggregator.flush()
+        
+        received = second.get_received()
+        assert [m['name'] for m in received] == ['presence_updated']
+        payload = received[0]['args'][0]
+        assert payload['coalesced'] == 2
+        assert len(payload['updates']) == 1
+        assert payload['updates'][0]['username'] == 'alice'
+        assert payload['updates'][0]['position'] == {'line': 2, 'ch': 0}
+        assert payload['updates'][0]['is_typing'] is True
+    
+    def test_disconnect_notifies_room(self, session_id, clients):
+        """Test that a dropped socket is removed and the room is told."""
+        first, second = clients
+        
+        first.disconnect()
+        
+        received = second.get_received()
+        assert [m['name'] for m in received] == ['participant_left']
+        assert [p['username'] for p in received[0]['args'][0]['participants']] == ['bob']
+        assert [p['username'] for p in pair_programming.get_participants(session_id)] == ['bob']
+
+
+class TestChat:
+    """Test the chat ring buffer and paging without an archive."""
+    
+    @pytest.fixture
+    def session_id(self):
+        """Create a session with a five-message chat buffer."""
+        with patch.object(pair_programming, "CHAT_BUFFER_SIZE", 5), \
+             patch.object(pair_programming, "CHAT_JOIN_LIMIT", 2):
+            sid = pair_programming.create_session()
+            for i in range(1, 8):
+                pair_programming.add_message(sid, "alice", f"message {i}", "sock-c")
+            yield sid
+            pair_programming.delete_session(sid)
+    
+    def test_buffer_is_bounded(self, session_id):
+        """Test that only the latest messages are kept, with increasing ids."""
+        messages = pair_programming.get_session(session_id)["messages"]
+        
+        assert [m["id"] for m in messages] == [3, 4, 5, 6, 7]
+        assert messages[-1]["message"] == "message 7"
+    
+    def test_join_gets_head_and_cursor(self, session_id):
+        """Test that joining returns a small head and a cursor to page back from."""
+        state = pair_programming.get_join_state(session_id)
+        
+        assert [m["id"] for m in state["messages"]] == [6, 7]
+        assert state["chat_cursor"] == 6
+        assert "socket_id" not in state["messages"][0]
+    
+    def test_page_through_buffer(self, session_id):
+        """Test paging back through the buffered messages."""
+        page = pair_programming.get_messages(session_id, before=6, limit=2)
+        assert [m["id"] for m in page["messages"]] == [4, 5]
+        
+        page = pair_programming.get_messages(session_id, before=page["cursor"], limit=2)
+        assert [m["id"] for m in page["messages"]] == [3]
+        
+        assert pair_programming.get_messages(session_id, before=3)["messages"] == []
+        assert pair_programming.get_messages("missing") is None
+    
+    def test_chat_history_event(self, session_id):
+        """Test that the chat_history event sends the page to the requester only."""
+        flask_app.config['TESTING'] = True
+        client = socketio.test_client(flask_app)
+        client.get_received()
+        
+        client.emit('chat_history', {'session_id': session_id, 'before': 6, 'limit': 2})
+        
+        received = client.get_received()
+        assert [m['name'] for m in received] == ['chat_history']
+        payload = received[0]['args'][0]
+        assert [m['id'] for m in payload['messages']] == [4, 5]
+        assert payload['cursor'] == 4
+        
+        client.emit('chat_history', {'session_id': session_id, 'limit': 0})
+        assert client.get_received()[0]['name'] == 'error'
+        client.disconnect()
+    
+    def test_chat_message_is_broadcast_with_id(self, session_id):
+        """Test that broadcast chat messages carry the stored id."""
+        flask_app.config['TESTING'] = True
+        client = socketio.test_client(flask_app)
+        client.emit('join_session', {'session_id': session_id, 'username': 'dave'})
+        client.get_received()
+        
+        client.emit('chat_message', {'session_id': session_id, 'message': 'hello', 'username': 'dave'})
+        
+        received = client.get_received()
+        assert [m['name'] for m in received] == ['chat_message']
+        assert received[0]['args'][0]['id'] == 8
+        client.disconnect()
+
+
+class TestPairProgrammingApi:
+    """Test the pair programming REST endpoints."""
+    
+    def test_list_sessions(self, client, session_id):
+        """Test that the session list reports participant counts."""
+        pair_programming.add_participant(session_id, None, "alice", "sock-l")
+        
+        response = client.get('/api/pair-programming/sessions')
+        
+        assert response.status_code == 200
+        entry = next(s for s in response.get_json()['sessions'] if s['session_id'] == session_id)
+        assert entry['participant_count'] == 1
+        assert entry['host_username'] == 'Host'
+    
+    def test_metrics(self, client, session_id):
+        """Test that memory and presence metrics are exposed."""
+        response = client.get('/api/pair-programming/metrics')
+        
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['success'] is True
+        assert data['memory']['sessions'] >= 1
+        assert 'coalesced' in data['presence']
+    
+    def test_messages_page(self, client, session_id):
+        """Test paging chat messages over REST."""
+        for i in range(3):
+            pair_programming.add_message(session_id, "alice", f"message {i}", "sock-r")
+        
+        response = client.get(f'/api/pair-programming/{session_id}/messages?before=3&limit=1')
+        
+        assert response.status_code == 200
+        data = response.get_json()
+        assert [m['message'] for m in data['messages']] == ['message 1']
+        assert data['cursor'] == 2
+        assert client.get(f'/api/pair-programming/{session_id}/messages?limit=abc').status_code == 400
+        assert client.get('/api/pair-programming/missing/messages').status_code == 404
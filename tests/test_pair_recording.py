@@ -0,0 +1,210 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from unittest.mock import patch
+
+from backend.models import PairRecordingSegment
+from backend.services import pair_programming
+from backend.services.pair_recording import SessionRecorder
+from backend.services.session_store import InMemoryPairSessionStore
+from tests.conftest import TestingSessionLocal
+
+
+START = datetime(2026, 1, 5, 9, 0, 0)
+
+
+@pytest.fixture
+def clock():
+    """Freeze the recorder's clock; tests move it with ``clock.tick``."""
+    class Clock:
+        now = START
+        
+        def tick(self, seconds):
+            self.now += timedelta(seconds=seconds)
+    
+    clock = Clock()
+    with patch("backend.services.pair_recording.datetime") as fake_datetime:
+        fake_datetime.now.side_effect = lambda: clock.now
+        yield clock
+
+
+@pytest.fixture
+def recorder(db, clock):
+    """Record into the test database with a fresh in-memory store."""
+    recorder = SessionRecorder(session_factory=TestingSessionLocal, checkpoint_interval=3)
+    with patch.object(pair_programming, "store", InMemoryPairSessionStore()), \
+         patch.object(pair_programming, "recorder", recorder):
+        yield recorder
+
+
+def _type(session_id, clock, lines):
+    """Append one line per second, returning the code after each edit."""
+    code = pair_programming.get_code(session_id)
+    versions = []
+    for line in lines:
+        clock.tick(1)
+        code += f"\n{line}"
+        pair_programming.update_session_code(session_id, code)
+        versions.append(code)
+    return versions
+
+
+class TestSessionRecorder:
+    """Test recording edits and seeking through them."""
+    
+    def test_edits_are_batched_into_segments(self, recorder, clock, db):
+        """Test that edits are written per segment, not per edit."""
+        session_id = pair_programming.create_session()
+        _type(session_id, clock, [f"x = {i}" for i in range(7)])
+        
+        assert recorder.stats["segments_written"] == 0
+        assert recorder.flush() == 3
+        rows = db.query(PairRecordingSegment).order_by(PairRecordingSegment.base_revision).all()
+        assert [(row.base_revision, row.end_revision) for row in rows] == [(0, 3), (3, 6), (6, 7)]
+        assert rows[0].checkpoint == 'print("Hello, StudyHall!")'
+        assert recorder.stats["recorded"] == 7
+    
+    def test_seek_returns_code_at_time(self, recorder, clock):
+        """Test seeking to any moment, including between segments."""
+        session_id = pair_programming.create_session()
+        versions = _type(session_id, clock, [f"x = {i}" for i in range(7)])
+        
+        for i, code in enumerate(versions):
+            state = recorder.seek(session_id, START + timedelta(seconds=i + 1, milliseconds=500))
+            assert state["code"] == code
+            assert state["revision"] == i + 1
+        assert recorder.seek(session_id, START) is None
+        assert recorder.seek(session_id, START + timedelta(hours=1))["code"] == versions[-1]
+    
+    def test_seek_accepts_timezone_aware_time(self, recorder, clock):
+        """Test that an aware time is converted to the recording's local time."""
+        session_id = pair_programming.create_session()
+        versions = _type(session_id, clock, ["x = 1", "x = 2"])
+        
+        at = (START + timedelta(seconds=1, milliseconds=500)).astimezone().astimezone(timezone.utc)
+        state = recorder.seek(session_id, at)
+        assert state["code"] == versions[0]
+        assert state["timestamp"].tzinfo is None
+    
+    def test_get_edits_plays_forward(self, recorder, clock):
+        """Test that edits after a seek rebuild the later code."""
+        session_id = pair_programming.create_session()
+        pair_programming.add_participant(session_id, None, "alice", "sock-a")
+        versions = _type(session_id, clock, [f"x = {i}" for i in range(7)])
+        
+        state = recorder.seek(session_id, START + timedelta(seconds=2))
+        edits = recorder.get_edits(session_id, state["revision"], limit=4)
+        
+        assert [edit["revision"] for edit in edits] == [3, 4, 5, 6]
+        code = state["code"]
+        for edit in edits:
+            code = pair_programming.text_ot.apply(code, edit["ops"])
+        assert code == versions[5]
+    
+    def test_operations_record_username(self, recorder, clock):
+        """Test that edits from a participant keep their username."""
+        session_id = pair_programming.create_session()
+        pair_programming.add_participant(session_id, None, "alice", "sock-a")
+        pair_programming.apply_code_operation(session_id, 0, [26, "!"], "sock-a")
+        
+        assert recorder.get_edits(session_id)[0]["username"] == "alice"
+    
+    def test_revision_gap_starts_new_segment(self, recorder, clock):
+        """Test that edits recorded by another process don't break seeking."""
+        recorder.record("shared", 1, ["a"], "")
+        recorder.record("shared", 3, [2, "c"], "ab")
+        recorder.flush()
+        
+        assert [segment["base_revision"] for segment in recorder.get_timeline("shared")] == [0, 2]
+        assert recorder.seek("shared", START)["code"] == "abc"
+    
+    def test_reads_write_only_that_session(self, recorder, clock, db):
+        """Test that reading one session's recording leaves other sessions' edits queued."""
+        first = pair_programming.create_session()
+        second = pair_programming.create_session()
+        _type(first, clock, ["x = 1", "x = 2"])
+        _type(second, clock, ["y = 1"])
+        
+        assert [segment["end_revision"] for segment in recorder.get_timeline(first)] == [2]
+        assert db.query(PairRecordingSegment).filter_by(session_id=second).count() == 0
+        assert recorder.flush() == 1
+    
+    def test_deleted_session_is_written_and_dropped(self, recorder, clock):
+        """Test that deleting a session keeps its recording but frees memory."""
+        session_id = pair_programming.create_session()
+        _type(session_id, clock, ["x = 1"])
+        pair_programming.delete_session(session_id)
+        
+        assert recorder.flush() == 1
+        assert recorder.flush() == 0
+        assert recorder.seek(session_id, clock.now)["revision"] == 1
+    
+    def test_failed_flush_is_retried(self, recorder, clock):
+        """Test that segments stay queued when the write fails."""
+        session_id = pair_programming.create_session()
+        _type(session_id, clock, ["x = 1", "x = 2", "x = 3", "x = 4"])
+        with patch.object(recorder, "_write", side_effect=RuntimeError("database down")):
+            with pytest.raises(RuntimeError):
+                recorder.flush()
+        
+        assert recorder.flush() == 2
+
+
+class TestRecordingAPI:
+    """Test the recording REST routes."""
+    
+    @pytest.fixture(autouse=True)
+    def app_recorder(self, recorder):
+        """Serve the routes from the test recorder."""
+        with patch("backend.main.pair_recorder", recorder):
+            yield recorder
+    
+    @pytest.fixture
+    def session_id(self, clock):
+        """Record a short session."""
+        session_id = pair_programming.create_session()
+        _type(session_id, clock, ["x = 1", "x = 2"])
+        return session_id
+    
+    def test_timeline(self, client, session_id):
+        """Test listing recorded segments."""
+        response = client.get(f'/api/pair-programming/{session_id}/recording')
+        
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['revision'] == 2
+        assert data['segments'][0]['base_revision'] == 0
+    
+    def test_seek(self, client, session_id):
+        """Test fetching the code at a point in time."""
+        at = (START + timedelta(seconds=1, milliseconds=500)).isoformat()
+        response = client.get(f'/api/pair-programming/{session_id}/recording/seek?at={at}')
+        
+        assert response.status_code == 200
+        assert response.get_json()['code'].endswith("x = 1")
+    
+    def test_seek_with_utc_offset(self, client, session_id):
+        """Test that a time with a UTC offset is accepted."""
+        at = (START + timedelta(seconds=1, milliseconds=500)).astimezone().astimezone(timezone.utc).isoformat()
+        response = client.get(f'/api/pair-programming/{session_id}/recording/seek', query_string={'at': at})
+        
+        assert response.status_code == 200
+        assert response.get_json()['code'].endswith("x = 1")
+    
+    def test_seek_invalid_time(self, client, session_id):
+        """Test that a malformed time is rejected."""
+        response = client.get(f'/api/pair-programming/{session_id}/recording/seek?at=yesterday')
+        assert response.status_code == 400
+    
+    def test_edits(self, client, session_id):
+        """Test paging through recorded edits."""
+        response = client.get(f'/api/pair-programming/{session_id}/recording/edits?after_revision=1')
+        
+        assert response.status_code == 200
+        edits = response.get_json()['edits']
+        assert [edit['revision'] for edit in edits] == [2]
+    
+    def test_missing_recording(self, client):
+        """Test that sessions without a recording return 404."""
+        response = client.get('/api/pair-programming/nope/recording')
+        assert response.status_code == 404
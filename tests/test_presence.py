@@ -0,0 +1,109 @@
+import pytest
+
+from backend.services import pair_programming
+from backend.services.presence import PresenceAggregator
+
+
+@pytest.fixture
+def session_id():
+    """Create a session with two participants and remove it afterwards."""
+    sid = pair_programming.create_session(host_username="Host")
+    pair_programming.add_participant(sid, None, "alice", "sock-a")
+    pair_programming.add_participant(sid, None, "bob", "sock-b")
+    yield sid
+    pair_programming.delete_session(sid)
+
+
+@pytest.fixture
+def sent():
+    """Collect (room, payload) pairs emitted by the aggregator."""
+    return []
+
+
+@pytest.fixture
+def aggregator(sent):
+    """Create an aggregator that records what it emits."""
+    return PresenceAggregator(lambda room, payload: sent.append((room, payload)))
+
+
+class TestPresenceAggregator:
+    """Test coalescing and batched flushing of presence events."""
+    
+    def test_keeps_latest_state_per_socket(self, session_id, aggregator, sent):
+        """Test that repeated cursor moves collapse into the last one."""
+        for line in range(5):
+            aggregator.update(session_id, "sock-a", position={"line": line, "ch": 0})
+        
+        assert aggregator.flush() == 1
+        room, payload = sent[0]
+        assert room == session_id
+        assert payload["coalesced"] == 4
+        assert payload["updates"] == [
+            {"socket_id": "sock-a", "username": "alice", "position": {"line": 4, "ch": 0}}
+        ]
+        assert aggregator.stats["events"] == 5
+        assert aggregator.stats["coalesced"] == 4
+    
+    def test_one_message_per_room(self, session_id, aggregator, sent):
+        """Test that all sockets in a room share one batched message."""
+        aggregator.update(session_id, "sock-a", position={"line": 1})
+        aggregator.update(session_id, "sock-b", selection={"from": 0, "to": 3})
+        aggregator.update(session_id, "sock-b", is_typing=True)
+        
+        aggregator.flush()
+        
+        assert len(sent) == 1
+        updates = {u["socket_id"]: u for u in sent[0][1]["updates"]}
+        assert updates["sock-b"] == {
+            "socket_id": "sock-b", "username": "bob",
+            "selection": {"from": 0, "to": 3}, "is_typing": True
+        }
+        assert sent[0][1]["coalesced"] == 0
+    
+    def test_flush_writes_session_state(self, session_id, aggregator):
+        """Test that flushed presence is stored for joining clients."""
+        aggregator.update(session_id, "sock-a", position={"line": 2})
+        aggregator.update(session_id, "sock-a", is_typing=True)
+        aggregator.update(session_id, "sock-b", selection=None)
+        
+        aggregator.flush()
+        
+        session = pair_programming.get_session(session_id)
+        assert session["cursors"]["sock-a"]["line"] == 2
+        assert "sock-b" not in session["selections"]
+        typing = {p["socket_id"]: p["is_typing"] for p in session["participants"]}
+        assert typing == {"sock-a": True, "sock-b": False}
+    
+    def test_empty_flush(self, aggregator, sent):
+        """Test that nothing is sent when there is nothing pending."""
+        assert aggregator.flush() == 0
+        assert sent == []
+    
+    def test_discard_and_missing_session(self, session_id, aggregator, sent):
+        """Test that departed sockets and deleted sessions are not broadcast."""
+        aggregator.update(session_id, "sock-a", position={"line": 1})
+        aggregator.discard(session_id, "sock-a")
+        aggregator.update("gone", "sock-x", position={"line": 1})
+        
+        assert aggregator.flush() == 0
+        assert sent == []
+    
+    def test_non_participants_are_ignored(self, session_id, aggregator, sent):
+        """Test that sockets outside the session can't store or broadcast presence."""
+        aggregator.update(session_id, "sock-a", position={"line": 1})
+        aggregator.update(session_id, "sock-stranger", position={"line": 9}, selection={"from": 0, "to": 1})
+        pair_programming.remove_participant(session_id, "sock-b")
+        aggregator.update(session_id, "sock-b", position={"line": 3})
+        
+        assert aggregator.flush() == 1
+        assert [u["socket_id"] for u in sent[0][1]["updates"]] == ["sock-a"]
+        session = pair_programming.get_session(session_id)
+        assert set(session["cursors"]) == {"sock-a"}
+        assert session["selections"] == {}
+    
+    def test_start_is_idempotent(self, aggregator):
+        """Test that the flush loop is only started once."""
+        started = []
+        aggregator.start(lambda fn, sleep: started.append(fn), sleep=lambda s: None)
+        aggregator.start(lambda fn, sleep: started.append(fn), sleep=lambda s: None)
+        assert len(started) == 1
@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.services.session_store import (
+    PairSessionStore, RedisPairSessionStore, RedisTokenStore, create_pair_session_store, create_token_store,
+    InMemoryPairSessionStore, InMemoryTokenStore, decode_value, encode_value
+)
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def server():
+    """Create a fake Redis server that several clients can share."""
+    return fakeredis.FakeServer()
+
+
+def _redis_store(server, **kwargs):
+    return RedisPairSessionStore(fakeredis.FakeRedis(server=server, decode_responses=True), **kwargs)
+
+
+def _session(**fields):
+    now = datetime.now()
+    return {"participants": {}, "code": "", "created_at": now, "expires_at": now + timedelta(hours=1), **fields}
+
+
+class TestEncoding:
+    """Test the JSON encoding used for stored values."""
+    
+    def test_datetimes_round_trip(self):
+        """Test that nested datetimes survive encoding."""
+        value = {"joined": [datetime(2024, 5, 1, 12, 30, 15, 250)], "name": "alice"}
+        assert decode_value(encode_value(value)) == value
+
+
+class TestPairSessionStore:
+    """Test the pair session store interface."""
+    
+    def test_incomplete_store_fails_on_creation(self):
+        """Test that a store missing a method can't be created."""
+        methods = {name: getattr(InMemoryPairSessionStore, name)
+                   for name in PairSessionStore.__abstractmethods__ if name != "stats"}
+        NoStats = type("NoStats", (PairSessionStore,), methods)
+        
+        with pytest.raises(TypeError, match="stats"):
+            NoStats()
+    
+    def test_in_memory_failed_block_keeps_changes(self):
+        """Test that the in-memory store, unlike Redis, keeps changes made before an exception."""
+        store = InMemoryPairSessionStore()
+        store.add("s1", _session())
+        
+        with pytest.raises(ValueError):
+            with store.locked("s1") as session:
+                session["code"] = "half done"
+                raise ValueError("boom")
+        
+        with store.snapshot("s1") as session:
+            assert session["code"] == "half done"
+
+
+class TestRedisPairSessionStore:
+    """Test the Redis-backed pair session store."""
+    
+    def test_locked_saves_changes(self, server):
+        """Test that changes made under the lock are visible to other processes."""
+        store = _redis_store(server)
+        store.add("s1", _session())
+        
+        with store.locked("s1") as session:
+            session["code"] = "x = 1"
+            session["participants"]["sock-a"] = {"username": "alice", "last_seen": datetime(2024, 1, 1)}
+        
+        with _redis_store(server).snapshot("s1") as session:
+            assert session["code"] == "x = 1"
+            assert session["participants"]["sock-a"]["last_seen"] == datetime(2024, 1, 1)
+    
+    def test_failed_block_is_not_saved(self, server):
+        """Test that an exception discards changes and releases the lock."""
+        store = _redis_store(server, lock_timeout=0.1)
+        store.add("s1", _session())
+        
+        with pytest.raises(ValueError):
+            with store.locked("s1") as session:
+                session["code"] = "half done"
+                raise ValueError("boom")
+        
+        with store.locked("s1") as session:
+            assert session["code"] == ""
+    
+    def test_lock_is_exclusive_across_clients(self, server):
+        """Test that a session held by one process times out for another."""
+        first = _redis_store(server)
+        second = _redis_store(server, lock_timeout=0.05)
+        first.add("s1", _session())
+        
+        with first.locked("s1"):
+            with pytest.raises(TimeoutError):
+                with second.locked("s1"):
+                    pass
+        with second.locked("s1") as session:
+            assert session is not None
+    
+    def test_missing_session(self, server):
+        """Test that missing sessions yield None and removal is safe."""
+        store = _redis_store(server)
+        with store.locked("missing") as session:
+            assert session is None
+        assert store.remove("missing") is None
+    
+    def test_due_entries_are_claimed_once(self, server):
+        """Test that two reapers never both handle the same entry."""
+        first, second = _redis_store(server), _redis_store(server)
+        now = datetime.now()
+        first.schedule_expiry("s1", now - timedelta(seconds=1))
+        first.schedule_expiry("s2", now + timedelta(hours=1))
+        first.schedule_idle("s1", "sock-a", now - timedelta(seconds=1))
+        
+        assert first.pop_due_expiries(now) == ["s1"]
+        assert second.pop_due_expiries(now) == []
+        assert second.pop_due_idle(now) == [("s1", "sock-a")]
+        assert first.pop_due_idle(now) == []
+    
+    def test_socket_index(self, server):
+        """Test indexing, unindexing and popping a socket's sessions."""
+        store = _redis_store(server)
+        store.index_socket("sock-a", "s1")
+        store.index_socket("sock-a", "s2")
+        store.unindex_socket("sock-a", "s1")
+        
+        assert store.socket_sessions("sock-a") == {"s2"}
+        assert store.stats()["indexed_sockets"] == 1
+        assert store.pop_socket("sock-a") == {"s2"}
+        assert store.pop_socket("sock-a") == set()
+        assert store.stats()["indexed_sockets"] == 0
+
+
+class TestTokenStores:
+    """Test login session stores and backend selection."""
+    
+    def test_redis_token_store(self, server):
+        """Test storing, reading and deleting a login session."""
+        store = RedisTokenStore(fakeredis.FakeRedis(server=server, decode_responses=True))
+        data = {"student_id": 7, "expires_at": datetime.now() + timedelta(days=1)}
+        
+        store.set("token", data)
+        assert store.get("token") == data
+        store.delete("token")
+        assert store.get("token") is None
+    
+    def test_backend_selection(self):
+        """Test that the URL scheme picks the backend."""
+        data = {}
+        assert isinstance(create_pair_session_store("memory://"), InMemoryPairSessionStore)
+        token_store = create_token_store("memory://", data)
+        assert isinstance(token_store, InMemoryTokenStore)
+        assert token_store.data is data
+        with pytest.raises(ValueError):
+            create_pair_session_store("mongodb://localhost")
@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+from backend.services import text_ot
+
+
+def _random_edit(rng, doc):
+    """Make a few random insertions/deletions and return the new document."""
+    chars = list(doc)
+    for _ in range(rng.randint(1, 3)):
+        pos = rng.randint(0, len(chars))
+        if chars and rng.random() < 0.5:
+            del chars[pos:pos + rng.randint(1, 3)]
+        else:
+            chars[pos:pos] = rng.choice(['a', 'bc', '\n', 'é', '😀'])
+    return ''.join(chars)
+
+
+class TestApply:
+    """Test applying operations to documents."""
+    
+    def test_insert_retain_delete(self):
+        """Test that each component kind is applied in order."""
+        assert text_ot.apply('hello world', [6, 'big ', -5]) == 'hello big '
+    
+    def test_base_length_mismatch(self):
+        """Test that an operation for a different document is rejected."""
+        with pytest.raises(ValueError):
+            text_ot.apply('abc', [2, 'x'])
+    
+    def test_utf16_offsets(self):
+        """Test that positions count UTF-16 code units like JavaScript."""
+        # The emoji is two code units, so retaining 3 keeps "😀a"
+        assert text_ot.apply('😀ab', [3, 'X', 1]) == '😀aXb'
+
+
+class TestNormalize:
+    """Test operation validation."""
+    
+    def test_merges_adjacent_components(self):
+        """Test that neighbouring components of one kind are merged."""
+        assert text_ot.normalize([1, 2, 'a', 'b', -1, -2]) == [3, 'ab', -3]
+    
+    @pytest.mark.parametrize("ops", ["abc", [1.5], [True], [None], [{'a': 1}]])
+    def test_rejects_invalid(self, ops):
+        """Test that malformed operations raise ValueError."""
+        with pytest.raises(ValueError):
+            text_ot.normalize(ops)
+
+
+class TestTransform:
+    """Test transforming concurrent operations."""
+    
+    def test_concurrent_inserts(self):
+        """Test that both inserts survive and the first operation wins ties."""
+        a = [3, 'A']
+        b = [3, 'B']
+        a_prime, b_prime = text_ot.transform(a, b)
+        assert text_ot.apply(text_ot.apply('abc', a), b_prime) == 'abcAB'
+        assert text_ot.apply(text_ot.apply('abc', b), a_prime) == 'abcAB'
+    
+    def test_overlapping_deletes(self):
+        """Test that text deleted by both sides is only deleted once."""
+        a = [1, -2, 1]
+        b = [2, -2]
+        a_prime, b_prime = text_ot.transform(a, b)
+        assert text_ot.apply(text_ot.apply('abcd', a), b_prime) == 'a'
+        assert text_ot.apply(text_ot.apply('abcd', b), a_prime) == 'a'
+    
+    def test_convergence_random(self):
+        """Test that transformed operations converge on random edits."""
+        rng = random.Random(42)
+        for _ in range(500):
+            doc = ''.join(rng.choice('ab\n😀') for _ in range(rng.randint(0, 12)))
+            a = text_ot.diff(doc, _random_edit(rng, doc))
+            b = text_ot.diff(doc, _random_edit(rng, doc))
+            a_prime, b_prime = text_ot.transform(a, b)
+            assert text_ot.apply(text_ot.apply(doc, a), b_prime) == text_ot.apply(text_ot.apply(doc, b), a_prime)
+
+
+class TestDiff:
+    """Test building operations from two versions of a document."""
+    
+    def test_single_edit(self):
+        """Test that only the changed span is sent."""
+        assert text_ot.diff('print(1)', 'print(12)') == [7, '2', 1]
+    
+    def test_unchanged(self):
+        """Test that identical documents give a no-op."""
+        ops = text_ot.diff('same', 'same')
+        assert text_ot.is_noop(ops)
+    
+    def test_round_trip_random(self):
+        """Test that applying the diff reproduces the new document."""
+        rng = random.Random(7)
+        for _ in range(300):
+            old = ''.join(rng.choice('xy😀é') for _ in range(rng.randint(0, 10)))
+            new = _random_edit(rng, old)
+            ops = text_ot.diff(old, new)
+            assert text_ot.apply(old, ops) == new
+            assert text_ot.target_length(ops) == len(new.encode('utf-16-le')) // 2
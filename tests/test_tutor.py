@@ -0,0 +1,791 @@
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+import pytest
+from unittest.mock import patch
+
+from backend.services import tutor as tutor_module
+from backend.services.cache import TTLCache
+from backend.services.circuit_breaker import CircuitBreaker
+from backend.services.example_catalog import BUILTIN_DIR, ExampleCatalog, example_catalog
+from backend.models import Material, Problem
+from backend.services.tutor import SECTION_ORDER, TutorService, index_terms, normalize_question
+from backend.services.tutor_index import LocalIndex, split_passages
+from backend.services.tutor_store import ResponseStore
+from tests.conftest import TestingSessionLocal
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def tutor():
+    """A tutor whose web search returns a canned answer and counts calls."""
+    service = TutorService()
+    answer = {"text": "A list comprehension builds a list from an iterable.", "source": "instant_answer",
+              "timed_out": False, "skipped": False, "errors": 0, "elapsed_ms": 120.0}
+    with patch.object(service, "search_web", return_value=answer) as search:
+        service.search = search
+        yield service
+    service.close()
+
+
+@pytest.fixture
+def client_tutor(client, tutor):
+    """Route the API's tutor through the patched service."""
+    with patch("backend.main.tutor_service", tutor):
+        yield tutor
+
+
+class TestNormalizeQuestion:
+    """Test the cache key normalization for tutor questions."""
+    
+    def test_case_punctuation_and_whitespace_are_ignored(self):
+        """Test that case, punctuation and spacing don't change the key."""
+        assert normalize_question("What is a List-Comprehension?") == \
+            normalize_question("  what is a   list comprehension ")
+    
+    def test_plurals_share_a_key(self):
+        """Test that simple word endings are stemmed."""
+        assert normalize_question("How do classes work", stemming=True) == "how do class work"
+        assert normalize_question("class", stemming=True) == "class"
+        assert normalize_question("dictionaries", stemming=True) == "dictionary"
+    
+    def test_stemming_can_be_disabled(self):
+        """Test that words are kept whole without stemming."""
+        assert normalize_question("lists", stemming=False) == "lists"
+    
+    def test_language_symbols_are_kept(self):
+        """Test that C++ and C# don't collapse to C."""
+        assert len({normalize_question(lang, stemming=False) for lang in ("C", "C++", "C#")}) == 3
+
+
+class TestTTLCache:
+    """Test the bounded LRU cache with per-entry expiry."""
+    
+    def test_least_recently_used_entry_is_evicted(self):
+        """Test that reading an entry protects it from eviction."""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        
+        assert "a" in cache and "c" in cache and "b" not in cache
+        assert cache.stats["evictions"] == 1
+    
+    def test_entries_expire(self):
+        """Test that an entry is dropped after its own TTL."""
+        clock = FakeClock()
+        cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+        cache.set("long", 1)
+        cache.set("short", 2, ttl=5)
+        clock.now += 10
+        
+        assert cache.get("short") is None
+        assert cache.get("long") == 1
+        assert cache.stats == {"hits": 1, "misses": 1, "evictions": 0, "expirations": 1}
+    
+    def test_zero_size_disables_caching(self):
+        """Test that a cache with no room stores nothing."""
+        cache = TTLCache(maxsize=0)
+        cache.set("a", 1)
+        
+        assert len(cache) == 0
+
+
+class TestTutorSearchCache:
+    """Test reusing web search results across tutor requests."""
+    
+    def test_repeated_question_skips_search(self, tutor):
+        """Test that equivalent questions only search once."""
+        first = tutor.create_tutor_response("What is a list comprehension?", "Python")
+        second = tutor.create_tutor_response("what is a LIST comprehension", "python")
+        
+        assert tutor.search.call_count == 1
+        assert "A list comprehension builds a list" in second["markdown"]
+        assert first["session_id"] != second["session_id"]
+        assert first["search"]["cached"] is False and second["search"]["cached"] is True
+        assert second["search"]["source"] == "instant_answer"
+        tutor.discard_response(first["session_id"])
+        tutor.discard_response(second["session_id"])
+    
+    def test_language_is_part_of_the_key(self, tutor):
+        """Test that the same question in another language searches again."""
+        tutor.generate_tutor_response("What is a list comprehension?", "Python")
+        tutor.generate_tutor_response("What is a list comprehension?", "JavaScript")
+        
+        assert tutor.search.call_count == 2
+    
+    def test_markdown_header_is_rendered_fresh(self, tutor):
+        """Test that a cached answer still gets the current timestamp."""
+        with patch.object(tutor_module, "datetime") as fake_datetime:
+            fake_datetime.now.return_value.strftime.return_value = "2024-01-01 09:00:00"
+            first = tutor.generate_tutor_response("What is a list?", "Python")
+            fake_datetime.now.return_value.strftime.return_value = "2024-01-01 10:00:00"
+            second = tutor.generate_tutor_response("What is a list?", "Python")
+        
+        assert "*Generated on 2024-01-01 09:00:00*" in first
+        assert "*Generated on 2024-01-01 10:00:00*" in second
+        assert tutor.search.call_count == 1
+    
+    def test_empty_results_are_retried_sooner(self, tutor):
+        """Test that a search that found nothing is only cached briefly."""
+        clock = FakeClock()
+        tutor.search_cache.clock = clock
+        tutor.search.return_value = {"text": "", "source": None, "timed_out": True, "skipped": False,
+                                     "errors": 0, "elapsed_ms": 8000}
+        tutor.generate_tutor_response("What is a tuple?", "Python")
+        clock.now += tutor_module.SEARCH_CACHE_EMPTY_TTL + 1
+        tutor.generate_tutor_response("What is a tuple?", "Python")
+        
+        assert tutor.search.call_count == 2
+    
+    def test_metrics_endpoint(self, client, client_tutor):
+        """Test that the metrics endpoint reports cache hits."""
+        for _ in range(3):
+            response = client.post("/api/tutor/ask", json={"question": "What is a set?", "language": "Python"})
+            client_tutor.discard_response(response.get_json()["session_id"])
+        
+        data = client.get("/api/tutor/metrics").get_json()
+        assert data["search_cache"]["hits"] == 2
+        assert data["search_cache"]["misses"] == 1
+        assert data["search_cache"]["size"] == 1
+
+
+def _source(text, delay, calls=None, error=None):
+    """A fake search source answering ``text`` after ``delay`` seconds."""
+    async def search(query):
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if calls is not None:
+                calls.append("cancelled")
+            raise
+        if error:
+            raise error
+        return text
+    return search
+
+
+@pytest.fixture
+def racer():
+    """A tutor whose search sources are replaced by fakes per test."""
+    service = TutorService()
+    yield service
+    service.close()
+
+
+class TestHedgedSearch:
+    """Test racing the search sources against a deadline."""
+    
+    def test_first_useful_answer_wins_and_loser_is_cancelled(self, racer):
+        """Test that the faster source answers and the slower one is cancelled."""
+        calls = []
+        racer.search_sources = {"instant_answer": _source("slow answer", 5, calls), "html": _source("fast answer", 0.01)}
+        started = time.perf_counter()
+        result = racer.search_web("list comprehension", "Python")
+        
+        assert result["text"] == "fast answer"
+        assert result["source"] == "html"
+        assert time.perf_counter() - started < 1
+        time.sleep(0.05)
+        assert calls == ["cancelled"]
+        assert racer.search_stats["html"] == 1
+    
+    def test_empty_and_failed_sources_are_skipped(self, racer):
+        """Test that a quick empty or failing answer doesn't end the race."""
+        racer.search_sources = {
+            "instant_answer": _source("", 0),
+            "html": _source("", 0, error=RuntimeError("blocked")),
+            "late": _source("late answer", 0.05)
+        }
+        result = racer.search_web("list comprehension", "Python")
+        
+        assert result["source"] == "late"
+        assert racer.search_stats["errors"] == 1
+    
+    def test_budget_bounds_the_search(self, racer):
+        """Test that no answer within the budget gives an empty result."""
+        racer.search_sources = {"instant_answer": _source("too late", 5), "html": _source("", 0)}
+        result = racer.search_web("list comprehension", "Python", budget=0.1)
+        
+        assert result["text"] == "" and result["source"] is None
+        assert result["timed_out"] is True
+        assert result["elapsed_ms"] < 1000
+        assert racer.search_stats["timeouts"] == 1
+    
+    def test_ties_prefer_instant_answer(self, racer):
+        """Test that the instant answer wins when both finish together."""
+        racer.search_sources = {"instant_answer": _source("instant", 0), "html": _source("html", 0)}
+        
+        assert racer.search_web("list comprehension")["source"] == "instant_answer"
+    
+    def test_real_sources_parse_duckduckgo_responses(self, racer):
+        """Test both DuckDuckGo parsers against canned HTTP responses."""
+        def handler(request):
+            if request.url.host == "api.duckduckgo.com":
+                return httpx.Response(200, json={"AbstractText": "", "RelatedTopics": []})
+            return httpx.Response(200, text="<div><b>List</b>   comprehensions</div>")
+        racer.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        result = racer.search_web("list comprehension", "Python")
+        
+        assert result == {"text": "List comprehensions", "source": "html", "timed_out": False,
+                          "skipped": False, "errors": 0, "elapsed_ms": result["elapsed_ms"]}
+        assert racer.search_stats["instant_answer"] == 0
+
+
+@pytest.fixture
+def breaker():
+    """A breaker on a fake clock: opens at 2 of 4 failed calls, 30 s cooldown."""
+    return CircuitBreaker("test", window=60, min_calls=4, failure_rate=0.5, slow_call=5, cooldown=30, clock=FakeClock())
+
+
+def _calls(breaker, *failures):
+    for failed in failures:
+        assert breaker.allow()
+        breaker.record(failed)
+
+
+class TestCircuitBreaker:
+    """Test the closed, open and half-open breaker states."""
+    
+    def test_opens_when_failure_rate_is_reached(self, breaker):
+        """Test that the breaker opens once enough calls in the window failed."""
+        _calls(breaker, False, True, False)
+        assert breaker.state == "closed"
+        _calls(breaker, True)
+        
+        assert breaker.state == "open"
+        assert not breaker.allow()
+        assert breaker.get_stats()["rejected"] == 1
+    
+    def test_slow_calls_count_as_failures(self, breaker):
+        """Test that calls slower than the threshold open the breaker."""
+        for _ in range(4):
+            breaker.allow()
+            breaker.record(False, duration=6)
+        
+        assert breaker.state == "open"
+        assert breaker.stats["slow_calls"] == 4
+    
+    def test_old_failures_leave_the_window(self, breaker):
+        """Test that failures older than the window are forgotten."""
+        _calls(breaker, True, True, True)
+        breaker.clock.now += 61
+        _calls(breaker, True, False, False)
+        
+        assert breaker.state == "closed"
+        assert breaker.get_stats()["window_calls"] == 3
+    
+    def test_half_open_probe_closes_the_breaker(self, breaker):
+        """Test that one probe is let through after the cooldown and closes the breaker on success."""
+        _calls(breaker, True, True, True, True)
+        breaker.clock.now += 31
+        
+        assert breaker.allow()
+        assert breaker.state == "half_open"
+        assert not breaker.allow()  # Only one probe at a time
+        breaker.record(False)
+        
+        assert breaker.state == "closed"
+        assert [t["to"] for t in breaker.get_stats()["transitions"]] == ["open", "half_open", "closed"]
+    
+    def test_failed_probe_reopens(self, breaker):
+        """Test that a failed probe restarts the cooldown."""
+        _calls(breaker, True, True, True, True)
+        breaker.clock.now += 31
+        _calls(breaker, True)
+        
+        assert breaker.state == "open"
+        breaker.clock.now += 10
+        assert not breaker.allow()
+        assert breaker.stats["opened"] == 2
+
+
+class TestTutorSearchBreaker:
+    """Test falling back without network waits during search outages."""
+    
+    def test_open_breaker_skips_search(self, racer):
+        """Test that failing searches open the breaker and later questions skip the network."""
+        calls = []
+        
+        async def down(query):
+            calls.append(query)
+            raise httpx.ConnectError("unreachable")
+        racer.search_sources = {"instant_answer": down, "html": down}
+        racer.breaker.min_calls = 2
+        
+        for i in range(2):
+            racer.create_tutor_response(f"What is thing {i}?", "Python")
+        result = racer.create_tutor_response("What is a list?", "Python")
+        
+        assert len(calls) == 4
+        assert result["search"]["skipped"] is True
+        assert "## Explanation" in result["markdown"]
+        assert racer.breaker.state == "open"
+        racer.discard_response(result["session_id"])
+    
+    def test_skipped_search_is_not_cached(self, racer):
+        """Test that the offline fallback isn't remembered once the breaker closes."""
+        racer.breaker.state = "open"
+        racer.breaker._opened_at = racer.breaker.clock()
+        racer.search_sources = {"instant_answer": _source("an answer", 0)}
+        
+        assert racer.cached_search("What is a list?", "Python")["skipped"] is True
+        racer.breaker.state = "closed"
+        assert racer.cached_search("What is a list?", "Python")["text"] == "an answer"
+
+
+def _ask_concurrently(tutor, questions):
+    """Ask each question on its own thread while the search is held back."""
+    release = threading.Event()
+    answer = tutor.search.return_value
+    
+    def held_search(query, language=""):
+        release.wait(5)
+        return answer
+    tutor.search.side_effect = held_search
+    
+    results, errors = [None] * len(questions), []
+    
+    def ask(i):
+        try:
+            results[i] = tutor.create_tutor_response(questions[i], "Python")
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(len(questions))]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while tutor.get_flight_stats()["waiting"] < len(questions) - 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+class TestSingleFlight:
+    """Test sharing one answer between concurrent identical questions."""
+    
+    def test_concurrent_identical_questions_share_one_search(self, tutor):
+        """Test that equivalent questions asked together are answered once."""
+        questions = ["What is a list comprehension?", "what is a list comprehension",
+                     "What is a LIST comprehension!", "what  is a list comprehension?"]
+        results, errors = _ask_concurrently(tutor, questions)
+        
+        assert not errors
+        assert tutor.search.call_count == 1
+        assert len({result["session_id"] for result in results}) == 4
+        assert len({result["markdown"] for result in results}) == 4
+        assert sorted(result["search"]["coalesced"] for result in results) == [False, True, True, True]
+        assert tutor.get_flight_stats() == {"computed": 1, "coalesced": 3, "in_flight": 0, "waiting": 0}
+        for result in results:
+            assert tutor.discard_response(result["session_id"])
+    
+    def test_different_questions_are_not_coalesced(self, tutor):
+        """Test that unrelated questions each get their own search."""
+        tutor.create_tutor_response("What is a list?", "Python")
+        tutor.create_tutor_response("What is a dict?", "Python")
+        
+        assert tutor.search.call_count == 2
+        assert tutor.flight_stats["coalesced"] == 0
+    
+    def test_coalesced_answers_are_rendered_per_caller(self, tutor):
+        """Test that a caller sharing another's search gets an answer headed by their own question."""
+        results, errors = _ask_concurrently(tutor, ["What is a list?", "WHAT IS A LIST!!"])
+        
+        assert not errors
+        assert tutor.search.call_count == 1
+        headers = {result["markdown"].splitlines()[0] for result in results}
+        assert any("What is a list?" in header for header in headers)
+        assert any("WHAT IS A LIST!!" in header for header in headers)
+        for result in results:
+            assert tutor.discard_response(result["session_id"])
+    
+    def test_waiters_share_the_error(self, tutor):
+        """Test that callers waiting on a failed computation get its exception."""
+        with patch.object(tutor, "cached_search", side_effect=RuntimeError("search failed")):
+            results, errors = _ask_concurrently(tutor, ["What is a set?"] * 3)
+        
+        assert [str(e) for e in errors] == ["search failed"] * 3
+        assert tutor.get_flight_stats()["in_flight"] == 0
+
+
+def _answer(i):
+    return {"question": f"Question {i}?", "language": "Python", "markdown": f"# Answer {i}\n" * 50,
+            "created_at": "2024-01-01T09:00:00"}
+
+
+def _session(i):
+    return f"00000000-0000-0000-0000-{i:012d}"
+
+
+@pytest.fixture
+def spill_store(tmp_path):
+    """A store keeping two answers in memory and three on disk, on a fake clock."""
+    return ResponseStore(maxsize=2, ttl=60, spill_dir=str(tmp_path / "spill"), spill_size=3, clock=FakeClock())
+
+
+class TestResponseStore:
+    """Test the bounded, expiring store for tutor answers."""
+    
+    def test_memory_only_store_evicts_oldest(self):
+        """Test that without a spill directory old answers are dropped."""
+        store = ResponseStore(maxsize=2, ttl=60, spill_dir="")
+        for i in range(3):
+            store.put(_session(i), _answer(i))
+        
+        assert store.get(_session(0)) is None
+        assert store.get(_session(2))["question"] == "Question 2?"
+        stats = store.get_stats()
+        assert stats["memory_entries"] == 2 and stats["evictions"] == 1
+        assert stats["memory_bytes"] == 2 * len(_answer(0)["markdown"])
+    
+    def test_answers_expire(self):
+        """Test that answers are gone after the TTL."""
+        store = ResponseStore(maxsize=10, ttl=60, spill_dir="", clock=FakeClock())
+        store.put(_session(1), _answer(1))
+        store.memory.clock.now += 61
+        
+        assert store.pop(_session(1)) is None
+        assert store.get_stats()["memory_entries"] == 0
+    
+    def test_evicted_answers_spill_compressed(self, spill_store, tmp_path):
+        """Test that answers pushed out of memory are written compressed and read back."""
+        for i in range(4):
+            spill_store.put(_session(i), _answer(i))
+        
+        files = sorted(p.name for p in (tmp_path / "spill").iterdir())
+        assert files == [f"{_session(0)}.json.gz", f"{_session(1)}.json.gz"]
+        stats = spill_store.get_stats()
+        assert stats["spilled"] == 2 and stats["disk_entries"] == 2
+        assert 0 < stats["disk_bytes"] < 2 * len(_answer(0)["markdown"])
+        assert spill_store.get(_session(0)) == _answer(0)
+        assert spill_store.pop(_session(1)) == _answer(1)
+        assert not (tmp_path / "spill" / f"{_session(1)}.json.gz").exists()
+    
+    def test_disk_is_bounded_and_expires(self, spill_store, tmp_path):
+        """Test that the oldest spilled answers are deleted past the limit or the TTL."""
+        for i in range(7):
+            spill_store.put(_session(i), _answer(i))
+        
+        assert spill_store.get(_session(0)) is None
+        assert spill_store.get_stats()["disk_evictions"] == 2
+        spill_store.clock.now += 61
+        assert spill_store.get(_session(4)) is None
+        assert spill_store.get_stats()["disk_entries"] == 0
+        assert list((tmp_path / "spill").iterdir()) == []
+    
+    def test_spilled_answers_survive_a_restart(self, spill_store, tmp_path):
+        """Test that a new store picks up answers already on disk."""
+        for i in range(3):
+            spill_store.put(_session(i), _answer(i))
+        
+        restarted = ResponseStore(maxsize=2, ttl=60, spill_dir=str(tmp_path / "spill"), spill_size=3)
+        assert restarted.pop(_session(0)) == _answer(0)
+    
+    def test_unknown_session_ids_never_touch_disk(self, spill_store):
+        """Test that lookups only read files the store wrote."""
+        with patch("builtins.open") as fake_open:
+            assert spill_store.get("../../etc/passwd") is None
+            assert spill_store.pop(_session(9)) is None
+        fake_open.assert_not_called()
+    
+    def test_feedback_discards_the_answer(self, client, client_tutor):
+        """Test that feedback looks the answer up and removes it."""
+        session_id = client.post("/api/tutor/ask", json={"question": "What is a set?"}).get_json()["session_id"]
+        assert client_tutor.get_response(session_id)["question"] == "What is a set?"
+        
+        response = client.post("/api/tutor/feedback", json={"session_id": session_id, "feedback": "like"})
+        assert response.get_json()["deleted"] is True
+        assert client_tutor.get_response(session_id) is None
+        
+        response = client.post("/api/tutor/feedback", json={"session_id": session_id, "feedback": "like"})
+        assert response.get_json()["deleted"] is False
+        assert client.get("/api/tutor/metrics").get_json()["responses"]["memory_entries"] == 0
+
+
+def _events(chunks):
+    """Parse Server-Sent Events into (event, data) pairs."""
+    events = []
+    for message in b"".join(chunks).decode().split("\n\n"):
+        if message:
+            event, data = message.split("\n")
+            events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+class TestStreaming:
+    """Test streaming tutor answers section by section."""
+    
+    def test_static_sections_arrive_before_the_search(self, client, client_tutor):
+        """Test that everything but the explanation is sent while the search is still running."""
+        release = threading.Event()
+        answer = client_tutor.search.return_value
+        client_tutor.search.side_effect = lambda query, language="": release.wait(5) and answer
+        
+        response = client.post("/api/tutor/ask/stream", json={"question": "What is a list?", "language": "Python"})
+        assert response.mimetype == "text/event-stream"
+        chunks = response.response
+        early = [next(chunks) for _ in range(6)]
+        assert [data["section"] for _, data in _events(early)] == \
+            ["header", "introduction", "example", "best_practices", "resources", "closing"]
+        assert client_tutor.search.call_count == 0
+        
+        release.set()
+        events = _events(early + list(chunks))
+        assert [event for event, _ in events][-2:] == ["section", "done"]
+        sections = {data["section"]: data["markdown"] for event, data in events if event == "section"}
+        done = events[-1][1]
+        assert done["markdown"] == "".join(sections[name] for name in SECTION_ORDER)
+        assert "A list comprehension builds a list" in sections["explanation"]
+        assert client_tutor.get_response(done["session_id"])["markdown"] == done["markdown"]
+        assert done["timing"]["first_byte_ms"] <= done["timing"]["total_ms"]
+        assert done["search"]["source"] == "instant_answer"
+    
+    def test_streamed_answer_matches_the_regular_one(self, tutor):
+        """Test that the assembled stream is the same document as a regular answer."""
+        with patch.object(tutor_module, "datetime") as fake_datetime:
+            fake_datetime.now.return_value.strftime.return_value = "2024-01-01 09:00:00"
+            fake_datetime.now.return_value.isoformat.return_value = "2024-01-01T09:00:00"
+            events = list(tutor.stream_tutor_response("How do classes work?", "Python"))
+            regular = tutor.create_tutor_response("How do classes work?", "Python")
+        
+        assert events[-1][1]["markdown"] == regular["markdown"]
+        assert tutor.get_stream_stats()["streams"] == 1
+        assert tutor.get_stream_stats()["total_ms"]["max"] is not None
+    
+    def test_invalid_question_is_rejected_before_streaming(self, client, client_tutor):
+        """Test that validation errors are plain JSON responses."""
+        response = client.post("/api/tutor/ask/stream", json={"question": "", "language": "Python"})
+        
+        assert response.status_code == 400
+        assert response.get_json()["error"] == "Question is required"
+    
+    def test_failure_mid_stream_sends_an_error_event(self, client, client_tutor):
+        """Test that an error after streaming started ends the stream with an error event."""
+        client_tutor.search.side_effect = RuntimeError("search exploded")
+        
+        events = _events(client.post("/api/tutor/ask/stream", json={"question": "What is a list?"}).response)
+        
+        assert events[-1] == ("error", {"error": "search exploded"})
+
+
+COMPREHENSIONS = """# List comprehensions
+
+A list comprehension builds a new list by applying an expression to every item of an iterable,
+optionally filtering items with a condition: `[x * x for x in numbers if x > 0]`.
+
+## Dictionaries
+
+A dictionary maps keys to values and looks keys up in constant time."""
+
+
+@pytest.fixture
+def index(db):
+    """A local index following writes to the test database, with two materials and a problem."""
+    db.add(Material(title="Python Comprehensions", content=COMPREHENSIONS, category="Python"))
+    db.add(Material(title="Git Basics", content="Commit early and push your branch often.", category="Tools"))
+    db.add(Problem(title="Reverse a String", description="Write a function that reverses a string.",
+                   difficulty="beginner", tags=["Strings"], test_cases=[]))
+    db.commit()
+    index = LocalIndex(tokenize=index_terms)
+    index.watch(TestingSessionLocal)
+    yield index
+    index.unwatch()
+
+
+class TestLocalIndex:
+    """Test searching course materials and problems for tutor answers."""
+    
+    def test_passages_split_on_paragraphs(self):
+        """Test that headings are dropped and short paragraphs grouped."""
+        assert split_passages("# Title\n\nFirst.\n\nSecond.") == ["Title First. Second."]
+    
+    def test_question_finds_the_matching_passage(self, index):
+        """Test that the index is built on first search and ranks the covering passage first."""
+        results = index.search("What are list comprehensions?", "Python")
+        
+        assert results[0]["title"] == "Python Comprehensions"
+        assert "applying an expression" in results[0]["text"]
+        assert index.get_stats()["builds"] == 1
+        assert index.search("How do I reverse a string?", "Python")[0]["kind"] == "problem"
+    
+    def test_unrelated_question_finds_nothing(self, index):
+        """Test that passages covering too little of the question aren't returned."""
+        assert index.search("How do Python decorators wrap functions?", "Python") == []
+        assert index.search("What is a?", "Python") == []
+    
+    def test_writes_update_the_index(self, index, db):
+        """Test that inserts, updates and deletes are reflected after commit."""
+        index.ensure_built()
+        material = Material(title="Decorators", content="A decorator wraps a function to extend it.", category="Python")
+        db.add(material)
+        db.commit()
+        assert index.search("What does a decorator wrap?")[0]["title"] == "Decorators"
+        
+        material.content = "Generators yield values lazily."
+        db.commit()
+        assert index.search("What does a decorator wrap?") == []
+        assert index.search("How do generators yield values?")[0]["title"] == "Decorators"
+        
+        db.delete(material)
+        db.commit()
+        assert index.search("How do generators yield values?") == []
+        assert index.get_stats()["updates"] == 3
+    
+    def test_unchanged_rows_are_not_reindexed(self, index, db):
+        """Test that rows flushed without a real change aren't re-indexed on commit."""
+        index.ensure_built()
+        git, comprehensions = (db.query(Material).filter_by(title=title).one()
+                               for title in ("Git Basics", "Python Comprehensions"))
+        git.title = git.title  # Marks the row dirty without modifying it
+        comprehensions.category = "Python 3"
+        db.commit()
+        
+        assert index.get_stats()["updates"] == 1
+    
+    def test_rolled_back_writes_are_ignored(self, index, db):
+        """Test that writes rolled back, in full or in a savepoint, never reach the index."""
+        index.ensure_built()
+        db.add(Material(title="Closures", content="A closure captures variables.", category="Python"))
+        db.flush()
+        db.rollback()
+        
+        db.add(Material(title="Kept", content="Iterators produce items one at a time.", category="Python"))
+        savepoint = db.begin_nested()
+        db.add(Material(title="Dropped", content="Metaclasses create classes.", category="Python"))
+        db.flush()
+        savepoint.rollback()
+        db.commit()
+        
+        assert index.search("What does a closure capture?") == []
+        assert index.search("What do metaclasses create?") == []
+        assert index.search("What do iterators produce?")[0]["title"] == "Kept"
+    
+    def test_stats_report_size_and_latency(self, index):
+        """Test that size, build time and query latency are reported."""
+        index.search("What is a dictionary?")
+        stats = index.get_stats()
+        
+        assert stats["records"] == 3 and stats["passages"] == 3
+        assert stats["terms"] > 10 and stats["postings"] >= stats["terms"]
+        assert stats["build_ms"] is not None
+        assert stats["query_ms"]["p50"] < 50
+        assert stats["hits"] == 1
+
+
+class TestTutorLocalSearch:
+    """Test answering from local materials before the web."""
+    
+    def test_local_answer_skips_the_web(self, tutor, index):
+        """Test that a question covered by our materials is answered without searching the web."""
+        tutor.local_index = index
+        result = tutor.create_tutor_response("What is a list comprehension?", "Python")
+        
+        assert tutor.search.call_count == 0
+        assert result["search"]["source"] == "local"
+        assert result["search"]["passages"][0]["title"] == "Python Comprehensions"
+        assert "**Python Comprehensions**: List comprehensions A list comprehension builds" in result["markdown"]
+    
+    def test_uncovered_question_searches_the_web(self, tutor, index):
+        """Test that questions our materials don't cover still go to the web."""
+        tutor.local_index = index
+        result = tutor.create_tutor_response("How do Python decorators work?", "Python")
+        
+        assert tutor.search.call_count == 1
+        assert result["search"]["source"] == "instant_answer"
+        assert result["search"]["passages"] is None
+
+
+class TestExampleCatalog:
+    """Test picking code examples for tutor answers from the catalog."""
+    
+    def test_topic_keywords_pick_the_example(self):
+        """Test that questions get the example for their topic, in their language when there is one."""
+        assert example_catalog.match_topic("How do I define a function?") == "function"
+        assert example_catalog.match_topic("How should I handle exceptions?") == "error_handling"
+        assert "async def fetch_data" in example_catalog.example("Python", "How does await work?")
+        assert "async function fetchData" in example_catalog.example("JavaScript", "How does await work?")
+        # Topics without an example in the language fall back to the Python one
+        assert example_catalog.example("Go", "How do I merge dictionaries?") == \
+            example_catalog.example("Python", "How do I merge dictionaries?")
+    
+    def test_keywords_match_whole_words(self):
+        """Test that keywords inside other words don't pick a topic."""
+        assert example_catalog.match_topic("How do I write a loop?") == "loop"
+        assert example_catalog.match_topic("What is a bitmap?") is None
+        assert example_catalog.match_topic("What is an entry point?") is None
+        assert "Basic Python concept" in example_catalog.example("Python", "What is recursion?")
+    
+    def test_most_mentioned_topic_wins(self):
+        """Test that the topic with the most keyword hits wins, earlier topics winning ties."""
+        assert example_catalog.match_topic("Loop over a list, append to the list, then sort the list") == "list"
+        assert example_catalog.match_topic("How do I iterate over a dictionary?") == "loop"
+    
+    def test_language_aliases(self):
+        """Test that language names from the UI map to their example directory."""
+        assert "Basic C++ concept" in example_catalog.example("C++")
+        assert "Basic TypeScript concept" in example_catalog.example("ts")
+        assert "Basic Python concept" in example_catalog.example("Brainfuck")
+    
+    def test_extra_directory_extends_the_catalog(self, tmp_path):
+        """Test that another directory can add topics and examples and override built-in ones."""
+        (tmp_path / "catalog.json").write_text(json.dumps({
+            "topics": [{"name": "recursion", "keywords": ["recurs*"]}, {"name": "loop", "keywords": ["repeat*"]}]
+        }))
+        (tmp_path / "python").mkdir()
+        (tmp_path / "python" / "recursion.py").write_text("def fact(n):\n    return 1 if n < 2 else n * fact(n - 1)\n")
+        (tmp_path / "go").mkdir()
+        (tmp_path / "go" / "loop.go").write_text("for i := 0; i < 3; i++ {}\n")
+        catalog = ExampleCatalog([BUILTIN_DIR, str(tmp_path)])
+        
+        assert catalog.example("Python", "What is recursion?") == "def fact(n):\n    return 1 if n < 2 else n * fact(n - 1)"
+        assert catalog.example("Go", "How do I repeat something?") == "for i := 0; i < 3; i++ {}"
+        assert catalog.match_topic("How do I write a loop?") is None
+        assert catalog.get_stats()["topics"][-1] == "recursion"
+    
+    def test_broken_catalog_keeps_the_examples(self, tmp_path, capsys):
+        """Test that an unreadable catalog.json is reported and its directory's examples still load."""
+        (tmp_path / "catalog.json").write_text("{not json")
+        (tmp_path / "python").mkdir()
+        (tmp_path / "python" / "basics.py").write_text("print('custom')\n")
+        catalog = ExampleCatalog([BUILTIN_DIR, str(tmp_path)])
+        
+        assert "Error loading tutor example catalog" in capsys.readouterr().out
+        assert catalog.example("Python", "What is recursion?") == "print('custom')"
+        assert catalog.match_topic("How do I write a loop?") == "loop"
+    
+    def test_concurrent_picks_are_all_counted(self):
+        """Test that topic counters stay exact when many threads pick examples at once."""
+        catalog = ExampleCatalog([BUILTIN_DIR])
+        
+        def pick():
+            for _ in range(2000):
+                catalog.example("Python", "How do I write a loop?")
+        
+        threads = [threading.Thread(target=pick) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert catalog.get_stats()["matches"]["loop"] == 16000
+    
+    def test_answer_embeds_the_example(self, tutor):
+        """Test that the example section of an answer uses the catalog and counts the topic."""
+        before = tutor.examples.get_stats()["matches"]["class"]
+        result = tutor.create_tutor_response("How do classes work?", "JavaScript")
+        
+        assert "```javascript\nclass Person {" in result["markdown"]
+        assert tutor.examples.get_stats()["matches"]["class"] == before + 1